@@ -19,10 +19,14 @@
 import pandas as pd
 from datetime import datetime
 
+from advisor.lib.bond_engine import CASHFLOWS, BondEngine
+from advisor.lib.bond_risk import RISK_COLUMNS, bond_risk
 from advisor.lib.finance import Inflation
 from advisor.lib.math import price_normalization, face_value_inflation, \
-    by_inflation, ofz_bond_profit, ofz_bond_profit_percent, percent_year
+    by_inflation, cashflow_matrix, ofz_bond_profit, ofz_bond_profit_percent
 from advisor.lib.moex import MOEX
+from advisor.lib.spreads import SPREAD_COLUMNS, bond_spreads
+from advisor.lib.zero_curve import ZeroCurve
 
 
 def get_data(oTableData, sSECID):
@@ -53,7 +57,8 @@ def get_data(oTableData, sSECID):
 
 
 # TODO: Добавить возможность показа доходности с учетом инфляции, комиссий
-def bond_analysis(dTableData, oTableData, bInfl, fInflMedian5, fInflMedian10):
+def bond_analysis(dTableData, oTableData, bInfl, fInflMedian5, fInflMedian10,
+                  bRisk=False, bSpreads=False):
     """ Удаляет бумаги с амортизацией и формирует таблицу для показа на вкладке
 
     :param dTableData:
@@ -65,35 +70,36 @@ def bond_analysis(dTableData, oTableData, bInfl, fInflMedian5, fInflMedian10):
     :type fInflMedian5: float
     :param fInflMedian10: Медиана инфляции за 10 лет
     :type fInflMedian10: float
+    :param bRisk: Добавлять ли столбцы дюрации, выпуклости и DV01
+    :type bRisk: bool
+    :param bSpreads: Добавлять ли столбцы Z-спреда и G-спреда к КБД
+    :type bSpreads: bool
     :return: Возвращает таблицу облигаций в формате DataFrame Pandas
     :rtype: pd.DataFrame
     """
-    # IAPPY - Inflation-adjusted profit as a percentage in year
-    lIAPPY5Tax, lIAPPY10Tax = [], []
-    # Просматриваем все список и убираем из него бумаги с амортизацией
-    for sSECID in oTableData['SECID']:
-        bAmort = dTableData.get_check_amort(sSECID=sSECID)
-        if bAmort:
-            oTableData.drop(
-                oTableData[
-                    oTableData['SECID'] == sSECID].index, inplace=True
-            )
-            continue
-
-        if bInfl:
-            fIAPP5Tax, fIAPP10Tax, sMatDate = acc_inflation_bond(dTableData,
-                                                                 oTableData,
-                                                                 sSECID,
-                                                                 fInflMedian5,
-                                                                 fInflMedian10)
-            # считаем доход в процентах в год
-            lIAPPY5Tax.append(percent_year(fIAPP5Tax, sMatDate))
-            lIAPPY10Tax.append(percent_year(fIAPP10Tax, sMatDate))
+    # Убираем бумаги с амортизацией и считаем доход в процентах в год
+    # с учетом инфляции (IAPPY) сразу для всех бумаг
+    oEngine = BondEngine(dTableData)
+    oTableData = oEngine.analyse(oTableData, bInfl, fInflMedian5,
+                                 fInflMedian10)
+    oRisk = None
+    oSpreads = None
+    oCurve = ZeroCurve.from_db(dTableData.oReader) if bSpreads else None
+    if bRisk or oCurve is not None:
+        # выплаты загружаются и доходность решается один раз для риска и
+        # спредов
+        oIndex = pd.Index(oTableData['SECID'])
+        tMatrix = cashflow_matrix(oEngine.cashflows(oIndex), oIndex)
+        oYields = oEngine.ytm(oTableData, tMatrix=tMatrix)
+        if bRisk:
+            oRisk = bond_risk(oEngine, oTableData, tMatrix=tMatrix,
+                              oYields=oYields)
+        if oCurve is not None:
+            oSpreads = bond_spreads(oEngine, oTableData, oCurve,
+                                    tMatrix=tMatrix, oYields=oYields)
 
     # формируем новую таблицу с учетом показа значений с инфляцией и тд.
     if bInfl:
-        oTableData.insert(7, 'Процент (инфл 5) в год, %', lIAPPY5Tax)
-        oTableData.insert(8, 'Процент (инфл 10) в год, %', lIAPPY10Tax)
         oTableData = oTableData.drop(columns=['ISIN', 'FACEUNIT'])
 
         oTableData.columns = ['ID', 'Имя', 'Дата погашения', 'Цена, %',
@@ -117,6 +123,15 @@ def bond_analysis(dTableData, oTableData, bInfl, fInflMedian5, fInflMedian10):
                               'Начальный номинал', 'Текущий номинал',
                               'Уровень листинга', 'Эмитент']
 
+    if oRisk is not None:
+        for sColumn, sTitle in RISK_COLUMNS.items():
+            oTableData[sTitle] = oRisk[sColumn].reindex(
+                oTableData['ID']).round(2).to_numpy()
+    if oSpreads is not None:
+        for sColumn, sTitle in SPREAD_COLUMNS.items():
+            oTableData[sTitle] = oSpreads[sColumn].reindex(
+                oTableData['ID']).round(1).to_numpy()
+
     return oTableData
 
 
@@ -165,7 +180,10 @@ def bond_analysis_without(oConnector,
                           iMinPeriod=30,
                           iMaxPeriod=181,
                           fPercent=1,
-                          bInfl=True):
+                          bInfl=True,
+                          oReader=None,
+                          bRisk=False,
+                          bSpreads=False):
     """
 
     :param oConnector: Доступ к базе данных и API класса SQL
@@ -177,6 +195,13 @@ def bond_analysis_without(oConnector,
     :param fPercent:
     :param bInfl: Показывать ли доходность облигаций с учетом инфляции и др.
     :type bInfl: bool
+    :param oReader: Соединение для выборки облигаций (по умолчанию
+        oConnector)
+    :type oReader: advisor.lib.sql.SQL or None
+    :param bRisk: Добавлять ли столбцы дюрации, выпуклости и DV01
+    :type bRisk: bool
+    :param bSpreads: Добавлять ли столбцы Z-спреда и G-спреда к КБД
+    :type bSpreads: bool
     :return: Возвращает таблицу облигаций в формате DataFrame Pandas
     :rtype: pd.DataFrame
     """
@@ -189,7 +214,7 @@ def bond_analysis_without(oConnector,
         fInflMedian10 = oInflation.inflation_average_for_10()
 
     # Отбираем список облигаций
-    dTableData = BondAnalysis(oConnector)
+    dTableData = BondAnalysis(oConnector, oReader=oReader)
     oTableData = dTableData.get_bond_by_values(iMinPeriod=iMinPeriod,
                                                iMaxPeriod=iMaxPeriod,
                                                fPercent=fPercent)
@@ -197,18 +222,30 @@ def bond_analysis_without(oConnector,
                                oTableData=oTableData,
                                bInfl=bInfl,
                                fInflMedian5=fInflMedian5,
-                               fInflMedian10=fInflMedian10)
+                               fInflMedian10=fInflMedian10,
+                               bRisk=bRisk,
+                               bSpreads=bSpreads)
 
-    return oTableData.dropna()
+    # пустые показатели риска и спреды не убирают облигацию из таблицы
+    lOptional = [*RISK_COLUMNS.values(), *SPREAD_COLUMNS.values()]
+    return oTableData.dropna(subset=oTableData.columns.difference(lOptional))
 
 
-def bond_analysis_ofz(oConnector, bInfl=False):
+def bond_analysis_ofz(oConnector, bInfl=False, oReader=None, bRisk=False,
+                      bSpreads=False):
     """
 
     :param oConnector: Доступ к базе данных и API класса SQL
     :type oConnector: advisor.lib.sql.SQL
     :param bInfl: Показывать ли доходность облигаций с учетом инфляции и др.
     :type bInfl bool
+    :param oReader: Соединение для выборки облигаций (по умолчанию
+        oConnector)
+    :type oReader: advisor.lib.sql.SQL or None
+    :param bRisk: Добавлять ли столбцы дюрации, выпуклости и DV01
+    :type bRisk: bool
+    :param bSpreads: Добавлять ли столбцы Z-спреда и G-спреда к КБД
+    :type bSpreads: bool
     :return: Возвращает таблицу облигаций в формате DataFrame Pandas
     :rtype: pd.DataFrame
     """
@@ -221,28 +258,34 @@ def bond_analysis_ofz(oConnector, bInfl=False):
         fInflMedian10 = oInflation.inflation_average_for_10()
 
     # Отбираем список облигаций
-    dTableData = BondAnalysis(oConnector)
+    dTableData = BondAnalysis(oConnector, oReader=oReader)
     oTableData = dTableData.get_bond_by_values(bOFZ=True)
 
     oTableData = bond_analysis(dTableData=dTableData,
                                oTableData=oTableData,
                                bInfl=bInfl,
                                fInflMedian5=fInflMedian5,
-                               fInflMedian10=fInflMedian10)
+                               fInflMedian10=fInflMedian10,
+                               bRisk=bRisk,
+                               bSpreads=bSpreads)
 
     return oTableData
 
 
 class BondAnalysis:
-    def __init__(self, oConnector, oPD=pd):
+    def __init__(self, oConnector, oPD=pd, oReader=None):
         """
 
         :param oConnector: Доступ к API базы данных класса SQL.
         :type oConnector: advisor.lib.sql.SQL
         :param oPD:
         :type oPD: pd.DataFrame
+        :param oReader: Соединение для выборки облигаций, например, только
+            для чтения (по умолчанию oConnector).
+        :type oReader: advisor.lib.sql.SQL or None
         """
         self.oConnector = oConnector
+        self.oReader = oReader or oConnector
         self.oPD = oPD
         self.oQuery = MOEX(self.oConnector)
         self.sTime = datetime.today().strftime('%Y-%m-%d')
@@ -275,11 +318,10 @@ class BondAnalysis:
         if not qAnswer:
             oData = self.oQuery.get_bound_dates(sSECID, sField, self.oPD)
             oData.columns = sColumns.split(', ')
-            lData = oData.values.tolist()
-            for lValues in lData:
-                self.oConnector.insert_row(sTable,
-                                           f'SECID, {sColumns}',
-                                           [sSECID] + lValues)
+            self.oConnector.upsert_many(
+                sTable, f'SECID, {sColumns}',
+                ([sSECID] + lValues for lValues in oData.values.tolist()),
+                f'SECID, {sColumn}')
         else:
             oData = pd.DataFrame(qAnswer)
             oData.columns = sColumns.split(', ')
@@ -318,7 +360,7 @@ class BondAnalysis:
         запросу.
         :rtype: pd.DataFrame
         """
-        oQuery = self.oConnector.get_bonds_by_value(
+        oQuery = self.oReader.get_bonds_by_value(
             pd=self.oPD,
             iInitialFaceValue=iInitialFaceValue,
             sFaceUnit=sFaceUnit,
@@ -351,12 +393,51 @@ class BondAnalysis:
         амортизации облигации
         :rtype: bool
         """
-        oAmort = self.check_is_in_db(sSECID, 'amort')
+        oCounts = self.get_amort_counts([sSECID])
+
+        return bool(oCounts.get(sSECID, 0) > 1)
 
-        if len(oAmort.index) > 1:
-            return True
+    def get_amort_counts(self, lSECID):
+        """ Возвращает количество амортизаций для списка облигаций одним
+        запросом к базе данных. Облигации, которых нет в базе, сначала
+        получает с биржи одним пакетом запросов.
 
-        return False
+        :param lSECID: SECID ценных бумаг на мосбирже
+        :type lSECID: list or set or pd.Series
+        :return: Количество амортизаций по SECID
+        :rtype: pd.Series
+        """
+        dCounts, lMissing = self.oConnector.count_cashflows(
+            'BoundAmortizations', lSECID)
+        if lMissing:
+            self.prefetch(lMissing, 'amort')
+            dCounts, _ = self.oConnector.count_cashflows(
+                'BoundAmortizations', lSECID)
+
+        return pd.Series(dCounts, dtype='int64')
+
+    def prefetch(self, lSECID, sProperty):
+        """ Получает с биржи купоны или амортизации облигаций параллельными
+        запросами и записывает их в базу данных.
+
+        :param lSECID: SECID ценных бумаг на мосбирже
+        :type lSECID: list or set
+        :param sProperty: coupons или amort
+        :type sProperty: str
+        :return: Количество записанных строк
+        :rtype: int
+        """
+        sField, sTable, sColumns = CASHFLOWS[sProperty]
+        dDates = self.oQuery.get_bound_dates_many(lSECID, sField, self.oPD)
+        lRows = [[sSECID] + lValues
+                 for sSECID, oData in dDates.items()
+                 for lValues in oData.values.tolist()]
+        if not lRows:
+            return 0
+
+        return self.oConnector.upsert_many(
+            sTable, f'SECID, {sColumns}', lRows,
+            f'SECID, {sColumns.split(", ")[0]}')
 
     def get_future(self, sSECID, sWhat='coupons'):
         """ Возвращает информацию о будущих купонов или амортизации.
@@ -0,0 +1,354 @@
+#     This code is a part of program Advisor
+#     Copyright (C) 2022 contributors Advisor
+#     The full list is available at the link
+#     https://github.com/tagezi/advisor/blob/master/contributors.txt
+#
+#     This program is free software: you can redistribute it and/or modify
+#     it under the terms of the GNU General Public License as published by
+#     the Free Software Foundation, either version 3 of the License, or
+#     (at your option) any later version.
+#
+#     This program is distributed in the hope that it will be useful,
+#     but WITHOUT ANY WARRANTY; without even the implied warranty of
+#     MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#     GNU General Public License for more details.
+#
+#     You should have received a copy of the GNU General Public License
+#     along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+""" Расчёт показателей сразу для всех отобранных облигаций.
+
+Купоны и амортизации всех облигаций загружаются одним запросом в длинную
+таблицу (строка на выплату), показатели считаются групповыми операциями
+Pandas по SECID. Формулы те же, что в bond_analysis.acc_inflation_bond и
+функциях модуля math, но без цикла по облигациям.
+
+Class:
+    BondEngine
+
+Using:
+    oEngine = BondEngine(oBondAnalysis)
+    oTableData = oEngine.analyse(oTableData, True, fInfl5, fInfl10)
+"""
+
+import numpy as np
+import pandas as pd
+from dateutil.utils import today
+
+from advisor.lib.math import bond_ytm, cashflow_matrix, year_fractions
+
+# Столбцы таблиц купонов и амортизаций (первым идёт дата)
+COUPON_COLUMNS = 'coupon_date, face_value, coupon_value, valueprc'
+AMORT_COLUMNS = 'amort_date, face_value, valueprc, amort_value'
+# sProperty -> (поле ответа ISS, таблица, столбцы)
+CASHFLOWS = {'coupons': ('coupons', 'BoundCoupons', COUPON_COLUMNS),
+             'amort': ('amortizations', 'BoundAmortizations', AMORT_COLUMNS)}
+
+
+def round2(oValues):
+    """ Округляет до двух знаков так же, как round, которым пользуются
+    скалярные функции расчёта (np.round иногда округляет иначе).
+
+    :param oValues: Значения
+    :type oValues: pd.Series
+    :return: Округлённые значения
+    :rtype: pd.Series
+    """
+    return oValues.map(lambda fValue: round(fValue, 2))
+
+
+class BondEngine:
+    """ Считает показатели для всей выборки облигаций за один проход.
+
+    *Methods*
+        * load -- Загружает купоны или амортизации облигаций.
+        * amortized -- Определяет облигации с амортизацией.
+        * inflation_profit -- Доход в год с учётом инфляции и налога.
+        * cashflows -- Будущие выплаты облигаций одной таблицей.
+        * dirty_price -- Цена покупки в валюте с НКД и комиссией.
+        * ytm_flows -- Выплаты для доходности к погашению или оферте.
+        * ytm -- Доходность к погашению или оферте для своей цены, комиссии
+          и налога.
+        * analyse -- Убирает облигации с амортизацией и добавляет доходность
+          с учётом инфляции.
+    """
+
+    def __init__(self, oAnalysis, iDays=364, fTax=0.13, bFetch=True):
+        """
+
+        :param oAnalysis: Доступ к базе данных и бирже
+        :type oAnalysis: advisor.lib.bond_analysis.BondAnalysis
+        :param iDays: количество дней в году
+        :type iDays: int
+        :param fTax: налог
+        :type fTax: float
+        :param bFetch: Получать ли с биржи выплаты, которых нет в базе
+        :type bFetch: bool
+        """
+        self.oAnalysis = oAnalysis
+        self.oConnector = oAnalysis.oConnector
+        self.iDays = iDays
+        self.fTax = fTax
+        self.bFetch = bFetch
+        # «сегодня» одно на весь расчёт
+        self.oToday = pd.Timestamp(today())
+        self.sToday = self.oToday.strftime('%Y-%m-%d')
+
+    def years(self, oDates):
+        """ Количество лет от сегодняшнего дня до дат.
+
+        :param oDates: Даты в формате ГГГГ-ММ-ДД
+        :type oDates: pd.Series
+        :return: Доли лет
+        :rtype: pd.Series
+        """
+        return year_fractions(oDates, self.iDays, oToday=self.oToday)
+
+    def load(self, lSECID, sProperty='coupons'):
+        """ Загружает купоны или амортизации облигаций одним запросом.
+        Облигации, которых ещё нет в базе, сначала получает с биржи (если
+        это не запрещено bFetch).
+
+        :param lSECID: SECID облигаций
+        :type lSECID: list or pd.Series
+        :param sProperty: coupons или amort
+        :type sProperty: str
+        :return: Таблица выплат всех облигаций, упорядоченная по SECID и дате
+        :rtype: pd.DataFrame
+        """
+        _, sTable, sColumns = CASHFLOWS[sProperty]
+        oFlows = self.oConnector.get_cashflows(sTable, sColumns, lSECID)
+        setMissing = set(lSECID) - set(oFlows['SECID'])
+        if setMissing and self.bFetch:
+            self.oAnalysis.prefetch(setMissing, sProperty)
+            oFlows = self.oConnector.get_cashflows(sTable, sColumns, lSECID)
+
+        return oFlows
+
+    def amortized(self, lSECID):
+        """ Определяет облигации с амортизацией: больше одной записи
+        амортизации (одна запись — погашение в конце срока).
+
+        :param lSECID: SECID облигаций
+        :type lSECID: list or pd.Series
+        :return: Признак амортизации по SECID
+        :rtype: pd.Series
+        """
+        oCounts = self.oAnalysis.get_amort_counts(lSECID)
+        return oCounts.reindex(pd.Index(lSECID), fill_value=0) > 1
+
+    def inflation_profit(self, oBonds, oCoupons, fInfl):
+        """ Доход в процентах в год до погашения с учётом инфляции, налога
+        на купоны и (при сроке до трёх лет) на разницу цены и номинала.
+
+        :param oBonds: Облигации с индексом SECID и столбцами PRICE,
+            ACCRUEDINT, MATYEARS
+        :type oBonds: pd.DataFrame
+        :param oCoupons: Будущие купоны со столбцом YEARS
+        :type oCoupons: pd.DataFrame
+        :param fInfl: Инфляция
+        :type fInfl: float
+        :return: Доход в процентах в год по SECID
+        :rtype: pd.Series
+        """
+        oInflCoupons = oCoupons['coupon_value'] * \
+            (1 + fInfl) ** -oCoupons['YEARS']
+        oGroups = oCoupons.groupby('SECID', sort=False)
+        # сумма купонов; неизвестный купон делает неизвестной всю сумму
+        oSum = oInflCoupons.groupby(oCoupons['SECID'], sort=False).sum()
+        oSum = oSum.where(~oInflCoupons.isna().groupby(
+            oCoupons['SECID'], sort=False).any())
+        # номинал при последнем купоне
+        oLast = oGroups.nth(-1).set_index('SECID')
+        oFaceValue = oLast['face_value'] * (1 + fInfl) ** -oLast['YEARS']
+
+        oSum = oSum.reindex(oBonds.index) * (1 - self.fTax)
+        oProfit = oFaceValue.reindex(oBonds.index) - oBonds['PRICE']
+        oProfit = oProfit.where(oBonds['MATYEARS'] >= 3,
+                                oProfit * (1 - self.fTax))
+        oProfit = round2(oSum - oBonds['ACCRUEDINT'] + oProfit)
+        oPercent = round2(oProfit / oBonds['PRICE'] * 100)
+
+        return round2(oPercent / oBonds['MATYEARS'])
+
+    def cashflows(self, lSECID, fTax=0.0):
+        """ Будущие выплаты облигаций: купоны (за вычетом налога) и
+        амортизации одной длинной таблицей.
+
+        :param lSECID: SECID облигаций
+        :type lSECID: list or pd.Series
+        :param fTax: Налог на купоны
+        :type fTax: float
+        :return: Таблица со столбцами SECID, DATE, YEARS, value и AMORT
+            (признак амортизации)
+        :rtype: pd.DataFrame
+        """
+        oCoupons = self.load(lSECID, 'coupons')
+        oAmort = self.load(lSECID, 'amort')
+        oFlows = pd.concat([
+            pd.DataFrame({'SECID': oCoupons['SECID'],
+                          'DATE': oCoupons['coupon_date'],
+                          'value': oCoupons['coupon_value'] * (1 - fTax),
+                          'AMORT': False}),
+            pd.DataFrame({'SECID': oAmort['SECID'],
+                          'DATE': oAmort['amort_date'],
+                          'value': oAmort['amort_value'],
+                          'AMORT': True})],
+            ignore_index=True)
+        oFlows = oFlows[oFlows['DATE'] > self.sToday]
+        oFlows = oFlows.assign(YEARS=self.years(oFlows['DATE']))
+
+        return oFlows.sort_values(['SECID', 'DATE'], kind='stable')
+
+    def dirty_price(self, oTableData, oPrice=None, fFee=0.0):
+        """ Цена покупки облигаций в валюте номинала: цена от номинала с
+        комиссией плюс НКД.
+
+        :param oTableData: Таблица облигаций со столбцами FACEVALUE,
+            PREVPRICE, ACCRUEDINT
+        :type oTableData: pd.DataFrame
+        :param oPrice: Цены в процентах от номинала (по умолчанию PREVPRICE)
+        :type oPrice: pd.Series or np.ndarray or None
+        :param fFee: Комиссия от суммы сделки
+        :type fFee: float
+        :return: Цены в порядке строк таблицы
+        :rtype: np.ndarray
+        """
+        aPercent = oTableData['PREVPRICE'].to_numpy(dtype=float) \
+            if oPrice is None else np.asarray(oPrice, dtype=float)
+        return oTableData['FACEVALUE'].to_numpy(dtype=float) / 100 * \
+            aPercent * (1 + fFee) + \
+            oTableData['ACCRUEDINT'].to_numpy(dtype=float)
+
+    def ytm_flows(self, oTableData, fTax=0.0, bOffer=False):
+        """ Выплаты облигаций таблицы, по которым считается доходность.
+
+        При bOffer и наличии в таблице столбца OFFERDATE выплаты после
+        оферты отбрасываются, а в дату оферты непогашенный номинал
+        выкупается по BUYBACKPRICE (или по номиналу).
+
+        :param oTableData: Таблица облигаций со столбцами SECID, FACEVALUE
+        :type oTableData: pd.DataFrame
+        :param fTax: Налог на купоны
+        :type fTax: float
+        :param bOffer: Считать ли выплаты до оферты
+        :type bOffer: bool
+        :return: Выплаты как у cashflows
+        :rtype: pd.DataFrame
+        """
+        oIndex = pd.Index(oTableData['SECID'])
+        oFlows = self.cashflows(oIndex, fTax)
+        if bOffer and 'OFFERDATE' in oTableData:
+            oOffer = pd.Series(oTableData['OFFERDATE'].to_numpy(),
+                               index=oIndex).dropna()
+            oOffer = oOffer[oOffer > self.sToday]
+            oFlows = oFlows.assign(OFFERDATE=oFlows['SECID'].map(oOffer))
+            bAfter = oFlows['DATE'] > oFlows['OFFERDATE']
+            # номинал, который остаётся после амортизаций до оферты
+            oAmortBefore = oFlows[oFlows['AMORT'] & ~bAfter &
+                                  oFlows['OFFERDATE'].notna()]
+            oBuyBack = pd.Series(
+                oTableData['BUYBACKPRICE'].to_numpy(dtype=float)
+                if 'BUYBACKPRICE' in oTableData else 100.0,
+                index=oIndex).reindex(oOffer.index).fillna(100.0)
+            oFace = pd.Series(oTableData['FACEVALUE'].to_numpy(dtype=float),
+                              index=oIndex).reindex(oOffer.index)
+            oRest = oFace - oAmortBefore.groupby('SECID')['value'].sum(
+                ).reindex(oOffer.index, fill_value=0)
+            oFlows = pd.concat([
+                oFlows[~bAfter].drop(columns='OFFERDATE'),
+                pd.DataFrame({'SECID': oOffer.index, 'DATE': oOffer.values,
+                              'value': oRest.values * oBuyBack.values / 100,
+                              'AMORT': True,
+                              'YEARS': self.years(oOffer.values)})],
+                ignore_index=True)
+            oFlows = oFlows.sort_values(['SECID', 'DATE'], kind='stable')
+
+        return oFlows
+
+    def ytm(self, oTableData, oPrice=None, fFee=0.0, fTax=0.0,
+            bOffer=False, tMatrix=None):
+        """ Доходность к погашению для всех облигаций таблицы одним
+        расчётом. Цена может быть своей, комиссия увеличивает цену покупки,
+        налог уменьшает купоны.
+
+        При bOffer и наличии в таблице столбца OFFERDATE считается доходность
+        к оферте: выплаты после оферты отбрасываются, а в дату оферты
+        непогашенный номинал выкупается по BUYBACKPRICE (или по номиналу).
+
+        :param oTableData: Таблица облигаций со столбцами SECID, FACEVALUE,
+            PREVPRICE, ACCRUEDINT
+        :type oTableData: pd.DataFrame
+        :param oPrice: Цены в процентах от номинала (по умолчанию PREVPRICE)
+        :type oPrice: pd.Series or np.ndarray or None
+        :param fFee: Комиссия от суммы сделки
+        :type fFee: float
+        :param fTax: Налог на купоны
+        :type fTax: float
+        :param bOffer: Считать ли доходность к оферте
+        :type bOffer: bool
+        :param tMatrix: Матрицы сроков и сумм выплат (см. cashflow_matrix
+            и ytm_flows), если они уже построены; тогда fTax и bOffer не
+            используются
+        :type tMatrix: tuple[np.ndarray, np.ndarray] or None
+        :return: Таблица по SECID: доходность в процентах (YIELD), признак
+            сходимости (CONVERGED), количество итераций (ITERATIONS) и
+            невязка по цене (RESIDUAL)
+        :rtype: pd.DataFrame
+        """
+        oIndex = pd.Index(oTableData['SECID'])
+        aPrice = self.dirty_price(oTableData, oPrice, fFee)
+
+        if tMatrix is None:
+            tMatrix = cashflow_matrix(
+                self.ytm_flows(oTableData, fTax, bOffer), oIndex)
+        aTimes, aAmounts = tMatrix
+        aYield, bConverged, aIterations, aResidual = bond_ytm(
+            aPrice, aTimes, aAmounts)
+
+        return pd.DataFrame({'YIELD': aYield * 100,
+                             'CONVERGED': bConverged,
+                             'ITERATIONS': aIterations,
+                             'RESIDUAL': aResidual}, index=oIndex)
+
+    def analyse(self, oTableData, bInfl, fInflMedian5, fInflMedian10):
+        """ Убирает облигации с амортизацией и добавляет доходность в год с
+        учётом инфляции за 5 и 10 лет.
+
+        :param oTableData: Таблица облигаций из get_bond_by_values
+        :type oTableData: pd.DataFrame
+        :param bInfl: Считать ли доходность с учетом инфляции
+        :type bInfl: bool
+        :param fInflMedian5: Медиана инфляции за 5 лет
+        :type fInflMedian5: float
+        :param fInflMedian10: Медиана инфляции за 10 лет
+        :type fInflMedian10: float
+        :return: Таблица облигаций без амортизации, при bInfl со столбцами
+            Процент (инфл 5) в год, % и Процент (инфл 10) в год, %
+        :rtype: pd.DataFrame
+        """
+        oAmortized = self.amortized(oTableData['SECID'])
+        oTableData = oTableData[
+            ~oAmortized.reindex(oTableData['SECID']).to_numpy()]
+        if not bInfl:
+            return oTableData
+
+        oBonds = pd.DataFrame({
+            'PRICE': round2(oTableData['FACEVALUE'] / 100 *
+                            oTableData['PREVPRICE']),
+            'ACCRUEDINT': oTableData['ACCRUEDINT'],
+            'MATYEARS': self.years(oTableData['MATDATE'])})
+        oBonds.index = oTableData['SECID']
+
+        oCoupons = self.load(oTableData['SECID'], 'coupons')
+        oCoupons = oCoupons[oCoupons['coupon_date'] > self.sToday]
+        oCoupons = oCoupons.assign(YEARS=self.years(oCoupons['coupon_date']))
+
+        oTableData = oTableData.copy()
+        for iPosition, sColumn, fInfl in (
+                (7, 'Процент (инфл 5) в год, %', fInflMedian5),
+                (8, 'Процент (инфл 10) в год, %', fInflMedian10)):
+            oPercent = self.inflation_profit(oBonds, oCoupons, fInfl)
+            oTableData.insert(iPosition, sColumn, np.asarray(oPercent))
+
+        return oTableData
@@ -0,0 +1,151 @@
+#     This code is a part of program Advisor
+#     Copyright (C) 2022 contributors Advisor
+#     The full list is available at the link
+#     https://github.com/tagezi/advisor/blob/master/contributors.txt
+#
+#     This program is free software: you can redistribute it and/or modify
+#     it under the terms of the GNU General Public License as published by
+#     the Free Software Foundation, either version 3 of the License, or
+#     (at your option) any later version.
+#
+#     This program is distributed in the hope that it will be useful,
+#     but WITHOUT ANY WARRANTY; without even the implied warranty of
+#     MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#     GNU General Public License for more details.
+#
+#     You should have received a copy of the GNU General Public License
+#     along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+""" Чувствительность цены облигаций к изменению доходности.
+
+Дюрация Маколея, модифицированная дюрация, выпуклость и DV01 считаются
+сразу для всех облигаций по матрицам выплат (см. math.cashflow_matrix)
+при доходности к погашению из BondEngine.ytm. Доходность эффективная
+годовая, сроки в годах.
+
+Function:
+    risk_measures(aYield, aTimes, aAmounts)
+    bond_risk(oEngine, oTableData, oPrice=None)
+    portfolio_risk(oAnalysis, oPortfolio)
+
+Using:
+    oRisk = bond_risk(BondEngine(oBondAnalysis), oTableData)
+"""
+
+import numpy as np
+import pandas as pd
+
+from advisor.lib.bond_engine import BondEngine
+from advisor.lib.math import cashflow_matrix
+
+# Столбцы таблицы облигаций с показателями риска
+RISK_COLUMNS = {'DURATION': 'Дюрация, лет',
+                'MODDURATION': 'Мод. дюрация',
+                'CONVEXITY': 'Выпуклость',
+                'DV01': 'DV01, руб'}
+
+
+def risk_measures(aYield, aTimes, aAmounts):
+    """ Считает показатели риска для всех облигаций одним проходом.
+
+    :param aYield: Доходности (доли единицы)
+    :type aYield: np.ndarray
+    :param aTimes: Сроки выплат в годах
+    :type aTimes: np.ndarray
+    :param aAmounts: Суммы выплат, нули для отсутствующих выплат
+    :type aAmounts: np.ndarray
+    :return: Цена при доходности, дюрация Маколея, модифицированная
+        дюрация, выпуклость и DV01 (изменение цены при росте доходности на
+        0,01 %)
+    :rtype: tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray,
+        np.ndarray]
+    """
+    aYield = np.asarray(aYield, dtype=float)[:, None]
+    aPV = aAmounts * (1 + aYield) ** -aTimes
+    aPrice = aPV.sum(axis=1)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        aDuration = (aTimes * aPV).sum(axis=1) / aPrice
+        aModified = aDuration / (1 + aYield[:, 0])
+        aConvexity = (aTimes * (aTimes + 1) * aPV).sum(axis=1) / \
+            (aPrice * (1 + aYield[:, 0]) ** 2)
+    aDV01 = aModified * aPrice * 0.0001
+
+    return aPrice, aDuration, aModified, aConvexity, aDV01
+
+
+def bond_risk(oEngine, oTableData, oPrice=None, tMatrix=None, oYields=None):
+    """ Показатели риска для всех облигаций таблицы.
+
+    :param oEngine: Расчёт по всем облигациям
+    :type oEngine: BondEngine
+    :param oTableData: Таблица облигаций со столбцами SECID, FACEVALUE,
+        PREVPRICE, ACCRUEDINT
+    :type oTableData: pd.DataFrame
+    :param oPrice: Цены в процентах от номинала (по умолчанию PREVPRICE)
+    :type oPrice: pd.Series or np.ndarray or None
+    :param tMatrix: Матрицы сроков и сумм выплат (см. cashflow_matrix),
+        если они уже построены
+    :type tMatrix: tuple[np.ndarray, np.ndarray] or None
+    :param oYields: Доходности из BondEngine.ytm для этих матриц и цен,
+        если они уже посчитаны
+    :type oYields: pd.DataFrame or None
+    :return: Таблица по SECID со столбцами YIELD, DURATION, MODDURATION,
+        CONVEXITY, DV01 (на одну облигацию)
+    :rtype: pd.DataFrame
+    """
+    oIndex = pd.Index(oTableData['SECID'])
+    # одни и те же матрицы выплат для доходности и показателей риска
+    if tMatrix is None:
+        tMatrix = cashflow_matrix(oEngine.cashflows(oIndex), oIndex)
+    aTimes, aAmounts = tMatrix
+    if oYields is None:
+        oYields = oEngine.ytm(oTableData, oPrice, tMatrix=tMatrix)
+    _, aDuration, aModified, aConvexity, aDV01 = risk_measures(
+        oYields['YIELD'].to_numpy() / 100, aTimes, aAmounts)
+
+    return pd.DataFrame({'YIELD': oYields['YIELD'].to_numpy(),
+                         'DURATION': aDuration,
+                         'MODDURATION': aModified,
+                         'CONVEXITY': aConvexity,
+                         'DV01': aDV01}, index=oIndex)
+
+
+def portfolio_risk(oAnalysis, oPortfolio):
+    """ Показатели риска облигаций портфеля и портфеля в целом.
+
+    Дюрация и выпуклость портфеля взвешены по рыночной стоимости позиций,
+    DV01 портфеля — сумма DV01 позиций.
+
+    :param oAnalysis: Доступ к базе данных и бирже
+    :type oAnalysis: advisor.lib.bond_analysis.BondAnalysis
+    :param oPortfolio: Портфель из Portfolio.portfolio_data
+    :type oPortfolio: pd.DataFrame
+    :return: Таблица по облигациям портфеля со столбцами Количество,
+        VALUE (рыночная стоимость) и показателями риска на позицию;
+        последняя строка «Портфель» — итог
+    :rtype: pd.DataFrame
+    """
+    oCount = oPortfolio.groupby('Код актива')['Количество'].sum()
+    oQuotes = oAnalysis.oConnector.get_bond_quotes(oCount.index)
+    oQuotes = oQuotes.dropna()
+    oQuotes = oQuotes[oQuotes['PREVPRICE'] > 0]
+    oRisk = bond_risk(BondEngine(oAnalysis), oQuotes)
+
+    oRisk.insert(0, 'Количество', oCount.reindex(oRisk.index).to_numpy())
+    aPrice = oQuotes['FACEVALUE'].to_numpy(dtype=float) / 100 * \
+        oQuotes['PREVPRICE'].to_numpy(dtype=float) + \
+        oQuotes['ACCRUEDINT'].to_numpy(dtype=float)
+    oRisk.insert(1, 'VALUE', aPrice * oRisk['Количество'].to_numpy())
+    oRisk['DV01'] = oRisk['DV01'] * oRisk['Количество']
+
+    oWeights = oRisk['VALUE'] / oRisk['VALUE'].sum()
+    oRisk.loc['Портфель'] = {
+        'Количество': oRisk['Количество'].sum(),
+        'VALUE': oRisk['VALUE'].sum(),
+        'YIELD': (oRisk['YIELD'] * oWeights).sum(),
+        'DURATION': (oRisk['DURATION'] * oWeights).sum(),
+        'MODDURATION': (oRisk['MODDURATION'] * oWeights).sum(),
+        'CONVEXITY': (oRisk['CONVEXITY'] * oWeights).sum(),
+        'DV01': oRisk['DV01'].sum()}
+
+    return oRisk
@@ -0,0 +1,289 @@
+#     This code is a part of program Advisor
+#     Copyright (C) 2022 contributors Advisor
+#     The full list is available at the link
+#     https://github.com/tagezi/advisor/blob/master/contributors.txt
+#
+#     This program is free software: you can redistribute it and/or modify
+#     it under the terms of the GNU General Public License as published by
+#     the Free Software Foundation, either version 3 of the License, or
+#     (at your option) any later version.
+#
+#     This program is distributed in the hope that it will be useful,
+#     but WITHOUT ANY WARRANTY; without even the implied warranty of
+#     MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#     GNU General Public License for more details.
+#
+#     You should have received a copy of the GNU General Public License
+#     along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+""" Дисковый кэш ответов ISS.
+
+Ответы хранятся в сжатом виде в каталоге кэша, ключом служит хэш URL и
+параметров запроса. Для каждого вида запросов задаётся своё время жизни;
+устаревшие записи с ETag или Last-Modified перепроверяются условным
+запросом. Объём кэша ограничен, при превышении удаляются записи, к которым
+дольше всего не обращались.
+
+*Using*:
+
+    .. code-block::
+
+        oCache = ResponseCache('cache')
+        set_cache(oCache)  # из advisor.lib.connect
+        ...
+        oCache.stats()
+"""
+import gzip
+import hashlib
+import json
+import os
+import re
+import sqlite3
+import threading
+import time
+from urllib.parse import urlencode
+
+# время жизни ответов в секундах: шаблон URL -> TTL, первый совпавший
+# шаблон выигрывает, остальные запросы не кэшируются
+DEFAULT_TTL = (
+    (r'/bondization/', 86400),
+    (r'/iss/securities/[^/]+\.json$', 86400),
+    (r'/iss\.json$', 86400),
+    (r'/collections/', 43200),
+)
+
+
+class ResponseCache:
+    """ Кэш ответов ISS на диске с временем жизни и вытеснением LRU. """
+
+    def __init__(self, sDir, iMaxSize=200 * 1024 * 1024, lTTL=DEFAULT_TTL):
+        """ Инициализация
+
+        :param sDir: каталог кэша
+        :type sDir: str
+        :param iMaxSize: максимальный объём сжатых ответов в байтах
+        :type iMaxSize: int
+        :param lTTL: пары (регулярное выражение для URL, время жизни в
+            секундах)
+        :type lTTL: tuple or list
+        """
+        self.sDir = sDir
+        self.iMaxSize = iMaxSize
+        self.lTTL = [(re.compile(sPattern), iTTL) for sPattern, iTTL in lTTL]
+        self.dStats = {'hits': 0, 'misses': 0, 'revalidated': 0,
+                       'stored': 0, 'evicted': 0}
+        self.oLock = threading.Lock()
+
+        os.makedirs(sDir, exist_ok=True)
+        self.oIndex = sqlite3.connect(os.path.join(sDir, 'index.db'),
+                                      check_same_thread=False)
+        self.oIndex.execute('CREATE TABLE IF NOT EXISTS Responses '
+                            '(key TEXT PRIMARY KEY, url TEXT, size INTEGER, '
+                            'stored REAL, accessed REAL, expires REAL, '
+                            'etag TEXT, last_modified TEXT);')
+        self.oIndex.execute('CREATE INDEX IF NOT EXISTS ResponsesAccessed '
+                            'ON Responses (accessed);')
+        self.oIndex.commit()
+
+    def __del__(self):
+        self.oIndex.close()
+
+    @staticmethod
+    def make_key(sURL, dParams=None):
+        """ Возвращает ключ записи: хэш URL и отсортированных параметров.
+
+        :param sURL: URL запроса
+        :type sURL: str
+        :param dParams: параметры запроса
+        :type dParams: dict or None
+        :rtype: str
+        """
+        sQuery = urlencode(sorted((dParams or {}).items()))
+        return hashlib.sha256(f'{sURL}?{sQuery}'.encode()).hexdigest()
+
+    def get_ttl(self, sURL):
+        """ Возвращает время жизни ответа для URL, 0 - не кэшировать.
+
+        :param sURL: URL запроса
+        :type sURL: str
+        :rtype: int
+        """
+        for oPattern, iTTL in self.lTTL:
+            if oPattern.search(sURL):
+                return iTTL
+
+        return 0
+
+    def _file(self, sKey):
+        return os.path.join(self.sDir, sKey[:2], f'{sKey}.json.gz')
+
+    def _read(self, sKey):
+        try:
+            with gzip.open(self._file(sKey), 'rb') as fCache:
+                return json.loads(fCache.read().decode('utf-8'))
+        except (OSError, ValueError):
+            return None
+
+    def _drop(self, sKey):
+        self.oIndex.execute('DELETE FROM Responses WHERE key=?;', (sKey,))
+        try:
+            os.remove(self._file(sKey))
+        except OSError:
+            pass
+
+    def lookup(self, sURL, dParams=None):
+        """ Ищет ответ в кэше.
+
+        :param sURL: URL запроса
+        :type sURL: str
+        :param dParams: параметры запроса
+        :type dParams: dict or None
+        :return: ответ, если запись свежая, иначе None, и заголовки для
+            условного запроса, если запись можно перепроверить
+        :rtype: tuple[dict or None, dict]
+        """
+        if not self.get_ttl(sURL):
+            return None, {}
+
+        sKey = self.make_key(sURL, dParams)
+        fNow = time.time()
+        with self.oLock:
+            tRow = self.oIndex.execute(
+                'SELECT expires, etag, last_modified FROM Responses '
+                'WHERE key=?;', (sKey,)).fetchone()
+            if tRow is None:
+                self.dStats['misses'] += 1
+                return None, {}
+
+            fExpires, sETag, sLastModified = tRow
+            if fExpires > fNow:
+                jJSON = self._read(sKey)
+                if jJSON is not None:
+                    self.oIndex.execute('UPDATE Responses SET accessed=? '
+                                        'WHERE key=?;', (fNow, sKey))
+                    self.oIndex.commit()
+                    self.dStats['hits'] += 1
+                    return jJSON, {}
+                self._drop(sKey)
+                self.oIndex.commit()
+                self.dStats['misses'] += 1
+                return None, {}
+
+            self.dStats['misses'] += 1
+            dHeaders = {}
+            if sETag:
+                dHeaders['If-None-Match'] = sETag
+            if sLastModified:
+                dHeaders['If-Modified-Since'] = sLastModified
+
+            return None, dHeaders
+
+    def revalidate(self, sURL, dParams=None):
+        """ Продлевает запись после ответа 304 Not Modified.
+
+        :param sURL: URL запроса
+        :type sURL: str
+        :param dParams: параметры запроса
+        :type dParams: dict or None
+        :return: ответ из кэша или None, если файл записи потерян
+        :rtype: dict or None
+        """
+        sKey = self.make_key(sURL, dParams)
+        fNow = time.time()
+        with self.oLock:
+            jJSON = self._read(sKey)
+            if jJSON is None:
+                self._drop(sKey)
+            else:
+                self.oIndex.execute(
+                    'UPDATE Responses SET accessed=?, expires=? '
+                    'WHERE key=?;', (fNow, fNow + self.get_ttl(sURL), sKey))
+                self.dStats['misses'] -= 1
+                self.dStats['hits'] += 1
+                self.dStats['revalidated'] += 1
+            self.oIndex.commit()
+
+        return jJSON
+
+    def store(self, sURL, dParams, bContent, dHeaders=None):
+        """ Сохраняет ответ в кэш, если для URL задано время жизни.
+
+        :param sURL: URL запроса
+        :type sURL: str
+        :param dParams: параметры запроса
+        :type dParams: dict or None
+        :param bContent: тело ответа
+        :type bContent: bytes
+        :param dHeaders: заголовки ответа (для ETag и Last-Modified)
+        :type dHeaders: dict or None
+        """
+        iTTL = self.get_ttl(sURL)
+        if not iTTL:
+            return
+
+        dHeaders = dHeaders or {}
+        sKey = self.make_key(sURL, dParams)
+        sFile = self._file(sKey)
+        bData = gzip.compress(bContent)
+        fNow = time.time()
+        with self.oLock:
+            os.makedirs(os.path.dirname(sFile), exist_ok=True)
+            sTemp = f'{sFile}.{threading.get_ident()}.tmp'
+            with open(sTemp, 'wb') as fCache:
+                fCache.write(bData)
+            os.replace(sTemp, sFile)
+
+            self.oIndex.execute(
+                'INSERT OR REPLACE INTO Responses (key, url, size, stored, '
+                'accessed, expires, etag, last_modified) '
+                'VALUES (?, ?, ?, ?, ?, ?, ?, ?);',
+                (sKey, sURL, len(bData), fNow, fNow, fNow + iTTL,
+                 dHeaders.get('ETag'), dHeaders.get('Last-Modified')))
+            self.dStats['stored'] += 1
+            self._evict()
+            self.oIndex.commit()
+
+    def _evict(self):
+        iSize = self.oIndex.execute(
+            'SELECT COALESCE(SUM(size), 0) FROM Responses;').fetchone()[0]
+        if iSize <= self.iMaxSize:
+            return
+
+        for sKey, iEntrySize in self.oIndex.execute(
+                'SELECT key, size FROM Responses '
+                'ORDER BY accessed;').fetchall():
+            self._drop(sKey)
+            self.dStats['evicted'] += 1
+            iSize -= iEntrySize
+            if iSize <= self.iMaxSize:
+                break
+
+    def stats(self):
+        """ Возвращает статистику кэша.
+
+        :return: словарь с количеством попаданий, промахов, перепроверенных,
+            сохранённых и вытесненных записей, а также числом записей и
+            объёмом кэша в байтах
+        :rtype: dict
+        """
+        with self.oLock:
+            iEntries, iSize = self.oIndex.execute(
+                'SELECT COUNT(*), COALESCE(SUM(size), 0) '
+                'FROM Responses;').fetchone()
+            dStats = dict(self.dStats)
+        dStats['entries'] = iEntries
+        dStats['size'] = iSize
+
+        return dStats
+
+    def clear(self):
+        """ Удаляет все записи кэша. """
+        with self.oLock:
+            for (sKey,) in self.oIndex.execute(
+                    'SELECT key FROM Responses;').fetchall():
+                self._drop(sKey)
+            self.oIndex.commit()
+
+
+if __name__ == '__main__':
+    pass
@@ -0,0 +1,102 @@
+#     This code is a part of program Advisor
+#     Copyright (C) 2022 contributors Advisor
+#     The full list is available at the link
+#     https://github.com/tagezi/advisor/blob/master/contributors.txt
+#
+#     This program is free software: you can redistribute it and/or modify
+#     it under the terms of the GNU General Public License as published by
+#     the Free Software Foundation, either version 3 of the License, or
+#     (at your option) any later version.
+#
+#     This program is distributed in the hope that it will be useful,
+#     but WITHOUT ANY WARRANTY; without even the implied warranty of
+#     MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#     GNU General Public License for more details.
+#
+#     You should have received a copy of the GNU General Public License
+#     along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+""" Календарь будущих выплат по облигациям портфеля.
+
+Купоны и амортизации всех облигаций портфеля берутся одним запросом на
+таблицу (BondEngine.cashflows); облигации без графика выплат в базе
+получаются с биржи одним пакетом. Выплаты умножаются на количество бумаг
+и складываются по дням, месяцам или годам.
+
+Function:
+    portfolio_cashflows(oAnalysis, oPortfolio, fTax=0.13)
+    cashflow_calendar(oAnalysis, oPortfolio, sPeriod='month', fTax=0.13)
+
+Using:
+    oCalendar = cashflow_calendar(oBondAnalysis, oPortfolio, 'month')
+"""
+
+import pandas as pd
+
+from advisor.lib.bond_engine import BondEngine
+
+# период календаря -> частота pandas
+PERIODS = {'day': 'D', 'month': 'M', 'year': 'Y'}
+# Столбцы календаря
+CALENDAR_COLUMNS = {'COUPONS': 'Купоны, руб',
+                    'AMORT': 'Погашения, руб',
+                    'TOTAL': 'Итого, руб',
+                    'UNKNOWN': 'Неизвестных купонов'}
+
+
+def portfolio_cashflows(oAnalysis, oPortfolio, fTax=0.13):
+    """ Будущие выплаты по облигациям портфеля с учётом количества.
+
+    :param oAnalysis: Доступ к базе данных и бирже
+    :type oAnalysis: advisor.lib.bond_analysis.BondAnalysis
+    :param oPortfolio: Портфель из Portfolio.portfolio_data
+    :type oPortfolio: pd.DataFrame
+    :param fTax: Налог на купоны
+    :type fTax: float
+    :return: Таблица со столбцами SECID, DATE, value (сумма на позицию
+        после налога), AMORT (признак погашения)
+    :rtype: pd.DataFrame
+    """
+    oCount = oPortfolio.groupby('Код актива')['Количество'].sum()
+    lBonds = oAnalysis.oConnector.get_bond_quotes(oCount.index)['SECID']
+    if lBonds.empty:
+        return pd.DataFrame(columns=['SECID', 'DATE', 'value', 'AMORT'])
+
+    oFlows = BondEngine(oAnalysis).cashflows(lBonds, fTax)
+    oFlows = oFlows.assign(value=oFlows['value'] *
+                           oFlows['SECID'].map(oCount))
+
+    return oFlows[['SECID', 'DATE', 'value', 'AMORT']].reset_index(drop=True)
+
+
+def cashflow_calendar(oAnalysis, oPortfolio, sPeriod='month', fTax=0.13):
+    """ Календарь выплат портфеля по периодам.
+
+    :param oAnalysis: Доступ к базе данных и бирже
+    :type oAnalysis: advisor.lib.bond_analysis.BondAnalysis
+    :param oPortfolio: Портфель из Portfolio.portfolio_data
+    :type oPortfolio: pd.DataFrame
+    :param sPeriod: day, month или year
+    :type sPeriod: str
+    :param fTax: Налог на купоны
+    :type fTax: float
+    :return: Таблица по периодам (ГГГГ-ММ-ДД, ГГГГ-ММ или ГГГГ) со
+        столбцами COUPONS, AMORT, TOTAL и UNKNOWN (купоны, размер которых
+        ещё не объявлен)
+    :rtype: pd.DataFrame
+    """
+    if sPeriod not in PERIODS:
+        raise ValueError(f'Unknown period: {sPeriod}')
+
+    oFlows = portfolio_cashflows(oAnalysis, oPortfolio, fTax)
+    oPeriod = pd.to_datetime(oFlows['DATE']).dt.to_period(
+        PERIODS[sPeriod]).astype(str)
+    oCoupons = ~oFlows['AMORT'].astype(bool)
+    oCalendar = pd.DataFrame({
+        'COUPONS': oFlows['value'].where(oCoupons, 0.0),
+        'AMORT': oFlows['value'].where(~oCoupons, 0.0),
+        'UNKNOWN': oCoupons & oFlows['value'].isna()}).groupby(
+        oPeriod.rename('PERIOD')).sum()
+    oCalendar['TOTAL'] = oCalendar['COUPONS'] + oCalendar['AMORT']
+
+    return oCalendar[['COUPONS', 'AMORT', 'TOTAL', 'UNKNOWN']]
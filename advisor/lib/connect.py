@@ -16,8 +16,306 @@
 #     You should have received a copy of the GNU General Public License
 #     along with this program.  If not, see <https://www.gnu.org/licenses/>.
 
+""" Модуль для получения данных по API Московской биржи (ISS).
+
+Все запросы проходят через общий ограничитель частоты
+:class:`TokenBucket`, поэтому задержка возникает только тогда, когда
+лимит запросов исчерпан, а не перед каждым запросом. Пакеты запросов
+выполняются параллельно с помощью :class:`ISSFetcher`. Запросы используют
+общую сессию с пулом постоянных (keep-alive) соединений. Повторы при
+ошибках сервера и таймаутах выполняет :func:`connect`, каждый повтор
+тоже проходит через ограничитель частоты и учитывается в счётчиках
+:func:`session_stats`.
+Если задан дисковый кэш (:func:`set_cache`), свежие ответы берутся из него
+без обращения к серверу и без расхода лимита запросов.
+
+*Using*:
+
+    .. code-block::
+
+        jJSON = connect(sURL)
+
+        oFetcher = ISSFetcher()
+        lJSON = oFetcher.fetch_many([(sURL, {'only': 'description'}), ...])
+"""
+import logging
+import threading
 import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
 import requests
+from requests.adapters import HTTPAdapter
+from urllib3.connectionpool import HTTPConnectionPool, HTTPSConnectionPool
+
+# общий для всех запросов ограничитель частоты
+oLimiter = None
+oLimiterLock = threading.Lock()
+
+# общая сессия с пулом соединений и таймаут запроса в секундах
+oSession = None
+fSessionTimeout = 30.0
+oSessionLock = threading.Lock()
+
+# дисковый кэш ответов (advisor.lib.cache.ResponseCache) или None
+oCache = None
+
+# ответы сервера, после которых запрос повторяется
+RETRY_STATUS = (500, 502, 503, 504)
+
+# счётчики запросов, повторов и открытых соединений
+dSessionStats = {'requests': 0, 'retries': 0, 'connections': 0}
+oStatsLock = threading.Lock()
+
+
+def _count(sKey):
+    with oStatsLock:
+        dSessionStats[sKey] += 1
+
+
+class CountingHTTPConnectionPool(HTTPConnectionPool):
+    """ Пул HTTP-соединений, который считает открытые соединения. """
+
+    def _new_conn(self):
+        _count('connections')
+        return super()._new_conn()
+
+
+class CountingHTTPSConnectionPool(HTTPSConnectionPool):
+    """ Пул HTTPS-соединений, который считает открытые соединения. """
+
+    def _new_conn(self):
+        _count('connections')
+        return super()._new_conn()
+
+
+class PooledAdapter(HTTPAdapter):
+    """ Транспорт requests, использующий пулы соединений со счётчиками. """
+
+    def init_poolmanager(self, connections, maxsize, block=False,
+                         **pool_kwargs):
+        super().init_poolmanager(connections, maxsize, block, **pool_kwargs)
+        self.poolmanager.pool_classes_by_scheme = {
+            'http': CountingHTTPConnectionPool,
+            'https': CountingHTTPSConnectionPool}
+
+
+class TokenBucket:
+    """ Ограничитель частоты запросов по алгоритму «ведро токенов».
+
+    Токены пополняются со скоростью один токен за ``fApiDelay`` секунд, но
+    не больше ``iBurst``. Каждый запрос забирает один токен; если ведро
+    пусто, поток ждёт ровно столько, сколько нужно до появления токена.
+    """
+
+    def __init__(self, fApiDelay=1.2, iBurst=1):
+        """ Инициализация
+
+        :param fApiDelay: интервал между запросами в секундах (1.2 секунды
+            соответствуют лимиту в 50 запросов в минуту)
+        :type fApiDelay: float
+        :param iBurst: сколько запросов можно выполнить подряд без ожидания
+        :type iBurst: int
+        """
+        self.fApiDelay = fApiDelay
+        self.fCapacity = float(max(iBurst, 1))
+        self.fTokens = self.fCapacity
+        self.fLast = time.monotonic()
+        self.oLock = threading.Lock()
+
+    def _refill(self):
+        fNow = time.monotonic()
+        if self.fApiDelay > 0:
+            self.fTokens = min(self.fCapacity,
+                               self.fTokens +
+                               (fNow - self.fLast) / self.fApiDelay)
+        else:
+            self.fTokens = self.fCapacity
+        self.fLast = fNow
+
+    def acquire(self):
+        """ Забирает токен, при необходимости дожидаясь его появления.
+
+        :return: время ожидания в секундах
+        :rtype: float
+        """
+        fWaited = 0.0
+        while True:
+            with self.oLock:
+                self._refill()
+                if self.fTokens >= 1:
+                    self.fTokens -= 1
+                    return fWaited
+                fWait = (1 - self.fTokens) * self.fApiDelay
+            time.sleep(fWait)
+            fWaited += fWait
+
+
+def get_limiter(fApiDelay=1.2):
+    """ Возвращает общий ограничитель частоты, создавая его при первом
+    обращении.
+
+    :param fApiDelay: интервал между запросами, если ограничитель ещё не
+        создан
+    :type fApiDelay: float
+    :rtype: TokenBucket
+    """
+    global oLimiter
+    with oLimiterLock:
+        if oLimiter is None:
+            oLimiter = TokenBucket(fApiDelay)
+        return oLimiter
+
+
+def set_rate_limit(fApiDelay=1.2, iBurst=1):
+    """ Пересоздаёт общий ограничитель частоты с новыми параметрами.
+
+    :param fApiDelay: интервал между запросами в секундах
+    :type fApiDelay: float
+    :param iBurst: сколько запросов можно выполнить подряд без ожидания
+    :type iBurst: int
+    :rtype: TokenBucket
+    """
+    global oLimiter
+    with oLimiterLock:
+        oLimiter = TokenBucket(fApiDelay, iBurst)
+        return oLimiter
+
+
+def create_session(iPoolSize=4, iRetries=3, fBackoff=0.5):
+    """ Создаёт сессию с пулом постоянных соединений. Параметры повторов
+    запросов при ответах 5xx и таймаутах сохраняются в сессии, сами
+    повторы выполняет :func:`connect`, чтобы каждый из них проходил через
+    ограничитель частоты.
+
+    :param iPoolSize: количество соединений, которые держит пул
+    :type iPoolSize: int
+    :param iRetries: количество повторов неудачного запроса
+    :type iRetries: int
+    :param fBackoff: множитель экспоненциальной паузы между повторами
+    :type fBackoff: float
+    :rtype: requests.Session
+    """
+    oAdapter = PooledAdapter(pool_connections=iPoolSize,
+                             pool_maxsize=iPoolSize, max_retries=0)
+
+    oNewSession = requests.Session()
+    oNewSession.headers.update({
+        'User-Agent': 'Mozilla/5.0 (X11; Ubuntu; Linux x86_64; rv:109.0)'
+                      ' Gecko/20100101 Firefox/116.0',
+        "Content-Type": "application/json; charset=utf-8",
+        'Connection': 'keep-alive'})
+    oNewSession.mount('http://', oAdapter)
+    oNewSession.mount('https://', oAdapter)
+    oNewSession.iRetries = iRetries
+    oNewSession.fBackoff = fBackoff
+
+    return oNewSession
+
+
+def get_session():
+    """ Возвращает общую сессию, создавая её при первом обращении.
+
+    :rtype: requests.Session
+    """
+    global oSession
+    with oSessionLock:
+        if oSession is None:
+            oSession = create_session()
+        return oSession
+
+
+def set_session(oNewSession, fTimeout=30.0):
+    """ Подменяет общую сессию, например, сессией с другим размером пула.
+
+    :param oNewSession: сессия для всех запросов к ISS
+    :type oNewSession: requests.Session
+    :param fTimeout: таймаут запроса в секундах
+    :type fTimeout: float
+    """
+    global oSession, fSessionTimeout
+    with oSessionLock:
+        if oSession is not None and oSession is not oNewSession:
+            oSession.close()
+        oSession = oNewSession
+        fSessionTimeout = fTimeout
+
+
+def session_stats():
+    """ Возвращает счётчики запросов и соединений общей сессии.
+
+    Количество переиспользованных соединений равно разнице между числом
+    запросов и числом открытых соединений.
+
+    :return: словарь с ключами requests (включая повторы), retries,
+        connections и reused
+    :rtype: dict
+    """
+    with oStatsLock:
+        dStats = dict(dSessionStats)
+    dStats['reused'] = max(dStats['requests'] - dStats['connections'], 0)
+
+    return dStats
+
+
+def reset_session_stats():
+    """ Обнуляет счётчики запросов и соединений. """
+    with oStatsLock:
+        for sKey in dSessionStats:
+            dSessionStats[sKey] = 0
+
+
+def get_cache():
+    """ Возвращает дисковый кэш ответов или None, если кэш не задан.
+
+    :rtype: advisor.lib.cache.ResponseCache or None
+    """
+    return oCache
+
+
+def set_cache(oNewCache):
+    """ Задаёт дисковый кэш ответов для всех запросов к ISS.
+
+    :param oNewCache: кэш ответов или None, чтобы отключить кэширование
+    :type oNewCache: advisor.lib.cache.ResponseCache or None
+    """
+    global oCache
+    oCache = oNewCache
+
+
+def _get(url, param, dHeaders=None, api_delay=1.2):
+    """ Выполняет GET-запрос общей сессией с повторами при ответах
+    RETRY_STATUS, ошибках соединения и таймаутах. Каждая попытка забирает
+    токен ограничителя частоты и считается в session_stats.
+
+    :param url: URL API MOEX
+    :type url: str
+    :param param: параметры запроса
+    :type param: dict
+    :param dHeaders: заголовки запроса
+    :type dHeaders: dict or None
+    :param api_delay: интервал между запросами, используется при создании
+        общего ограничителя частоты
+    :type api_delay: float
+    :rtype: requests.Response
+    """
+    oCurrent = get_session()
+    iRetries = getattr(oCurrent, 'iRetries', 0)
+    fBackoff = getattr(oCurrent, 'fBackoff', 0.0)
+    for iAttempt in range(iRetries + 1):
+        if iAttempt:
+            _count('retries')
+            time.sleep(fBackoff * 2 ** (iAttempt - 1))
+        get_limiter(api_delay).acquire()
+        _count('requests')
+        try:
+            r = oCurrent.get(url, params=param, headers=dHeaders or {},
+                             timeout=fSessionTimeout)
+        except (requests.ConnectionError, requests.Timeout):
+            if iAttempt == iRetries:
+                raise
+            continue
+        if r.status_code not in RETRY_STATUS or iAttempt == iRetries:
+            return r
 
 
 def connect(url, api_delay=1.2, only=None, start=-1, limit=100,
@@ -27,7 +325,8 @@ def connect(url, api_delay=1.2, only=None, start=-1, limit=100,
     :param only: указывает, какое/какие поля вернуть
     :param url: URL API MOEX
     :type url: str
-    :param api_delay: задержка при запросах
+    :param api_delay: интервал между запросами, используется при создании
+        общего ограничителя частоты
     :type api_delay: float
     :param start:
     :type start: int
@@ -40,13 +339,6 @@ def connect(url, api_delay=1.2, only=None, start=-1, limit=100,
     :return: словарь ответа
     :rtype: dict
     """
-    time.sleep(api_delay)
-    headers = {
-        'User-Agent': 'Mozilla/5.0 (X11; Ubuntu; Linux x86_64; rv:109.0)'
-                      ' Gecko/20100101 Firefox/116.0',
-        "Content-Type": "application/json; charset=utf-8",
-        'Method': 'GET'}
-
     param = {'iss.meta': 'off'}
 
     if only:
@@ -57,10 +349,93 @@ def connect(url, api_delay=1.2, only=None, start=-1, limit=100,
         param['start'] = start
         param['limit'] = limit
 
-    r = requests.get(url, headers=headers, params=param)
+    oResponseCache = oCache
+    dHeaders = {}
+    if oResponseCache is not None:
+        jJSON, dHeaders = oResponseCache.lookup(url, param)
+        if jJSON is not None:
+            return jJSON
+
+    r = _get(url, param, dHeaders, api_delay)
+
+    if oResponseCache is not None and r.status_code == 304:
+        jJSON = oResponseCache.revalidate(url, param)
+        if jJSON is not None:
+            return jJSON
+        r = _get(url, param, api_delay=api_delay)
+
     r.encoding = 'utf-8'
+    jJSON = r.json()
+    if oResponseCache is not None and r.status_code == 200:
+        oResponseCache.store(url, param, r.content, r.headers)
+
+    return jJSON
+
+
+class ISSFetcher:
+    """ Выполняет пакеты запросов к ISS параллельно.
+
+    Количество одновременных запросов задаётся числом потоков, а общая
+    частота запросов ограничивается общим :class:`TokenBucket`, поэтому
+    пакет не превышает лимит API.
+    """
+
+    def __init__(self, iWorkers=4, fApiDelay=1.2):
+        """ Инициализация
+
+        :param iWorkers: количество потоков для запросов
+        :type iWorkers: int
+        :param fApiDelay: интервал между запросами, если общий ограничитель
+            ещё не создан
+        :type fApiDelay: float
+        """
+        self.iWorkers = max(iWorkers, 1)
+        self.fApiDelay = fApiDelay
+
+    def fetch(self, sURL, dParams=None):
+        """ Выполняет один запрос с помощью :func:`connect`.
+
+        :param sURL: URL API MOEX
+        :type sURL: str
+        :param dParams: именованные аргументы для :func:`connect`
+        :type dParams: dict or None
+        :return: словарь ответа
+        :rtype: dict
+        """
+        dParams = dict(dParams or {})
+        dParams.setdefault('api_delay', self.fApiDelay)
+        return connect(sURL, **dParams)
+
+    def fetch_many(self, lRequests, fnProgress=None):
+        """ Выполняет пакет запросов и возвращает ответы в исходном порядке.
+
+        :param lRequests: список пар (URL, словарь аргументов для connect)
+        :type lRequests: list[tuple[str, dict]]
+        :param fnProgress: функция, которая вызывается после каждого
+            выполненного запроса с аргументами (выполнено, всего)
+        :type fnProgress: callable or None
+        :return: список ответов; для неудачных запросов None
+        :rtype: list[dict or None]
+        """
+        lRequests = list(lRequests)
+        lResults = [None] * len(lRequests)
+        if not lRequests:
+            return lResults
+
+        with ThreadPoolExecutor(max_workers=self.iWorkers) as oExecutor:
+            dFutures = {oExecutor.submit(self.fetch, sURL, dParams): i
+                        for i, (sURL, dParams) in enumerate(lRequests)}
+            for iDone, oFuture in enumerate(as_completed(dFutures), 1):
+                i = dFutures[oFuture]
+                try:
+                    lResults[i] = oFuture.result()
+                except (requests.RequestException, ValueError) as e:
+                    logging.exception(f'An error has occurred: {e}.\n'
+                                      f'URL: {lRequests[i][0]}\n')
+                if fnProgress:
+                    fnProgress(iDone, len(lRequests))
 
-    return r.json()
+        return lResults
 
 
 if __name__ == '__main__':
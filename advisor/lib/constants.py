@@ -16,6 +16,28 @@
 #     You should have received a copy of the GNU General Public License
 #     along with this program.  If not, see <https://www.gnu.org/licenses/>.
 
+def db_profiles(oConfig):
+    """ Настройки соединений с базой данных из секций DB_INGEST и
+    DB_ANALYSIS.
+
+    :param oConfig: Файл настроек
+    :type oConfig: configparser.ConfigParser
+    :return: Словарь ingest/analysis -> прагмы соединения
+    :rtype: dict[str, dict]
+    """
+    dProfiles = {}
+    for sProfile in ('ingest', 'analysis'):
+        sSection = f'DB_{sProfile.upper()}'
+        if not oConfig.has_section(sSection):
+            continue
+        dProfile = dict(oConfig.items(sSection))
+        if 'read_only' in dProfile:
+            dProfile['read_only'] = oConfig.getboolean(sSection, 'read_only')
+        dProfiles[sProfile] = dProfile
+
+    return dProfiles
+
+
 class Constants:
     def __init__(self, oConfig):
         self.sBasePath = oConfig.sDir
@@ -30,6 +52,26 @@ class Constants:
         # имя базы данных работает, если не указан путь до неё
         self.DBFILE = oConfig.get_config_value('DB', 'db_file')
 
+        # собирать ли статистику запросов к базе данных
+        self.DB_PROFILER = (oConfig.has_option('DB', 'profiler') and
+                            oConfig.getboolean('DB', 'profiler'))
+        # файл для статистики запросов, пусто - в лог
+        self.DB_PROFILER_FILE = oConfig.get('DB', 'profiler_file',
+                                            fallback='')
+
+        # настройки соединений с базой данных: для загрузки и для выборок
+        self.DB_PROFILES = db_profiles(oConfig)
+
+        # сохранять ли ответы API на диск
+        self.CACHE_ENABLED = oConfig.getboolean('CACHE', 'enabled',
+                                                fallback=True)
+        # каталог для кэша ответов
+        self.CACHE_DIR = oConfig.get('CACHE', 'cache_dir', fallback='cache')
+        # максимальный объём кэша в байтах
+        self.CACHE_MAX_SIZE = (
+            oConfig.getint('CACHE', 'max_size_mb', fallback=200)
+            * 1024 * 1024)
+
         # цвета для раскраски значений столбца
         sColorYield = oConfig.get_config_value('COLORS', 'coloryield')
         self.COLORYIELD = [item.strip() for item in sColorYield.split(',')]
@@ -62,14 +104,38 @@ class Constants:
         # сбор брокера
         self.BROKERFEE = float(oConfig.get_config_value('FEE', 'brokerfee'))
         # налоговый сбор
-        TAX = float(oConfig.get_config_value('FEE', 'taxfee'))
+        self.TAX = float(oConfig.get_config_value('FEE', 'taxfee'))
 
         # значение свободных средств для расчета эффективной доходности
         self.TEMPPORTFILIO = (
             int(oConfig.get_config_value('SERVICE', 'tempportfolio')))
+        # показывать ли дюрацию, выпуклость и DV01
+        self.BOND_RISK = (oConfig.has_option('SERVICE', 'bond_risk') and
+                          oConfig.getboolean('SERVICE', 'bond_risk'))
+        # показывать ли Z-спред и G-спред к КБД
+        self.BOND_SPREADS = (
+            oConfig.has_option('SERVICE', 'bond_spreads') and
+            oConfig.getboolean('SERVICE', 'bond_spreads'))
         # Переменная для задержки API запросов, лимит в 50 запросов в минуту
         self.API_DELAY = (
             float(oConfig.get_config_value('SERVICE', 'api_delay')))
+        # Сколько запросов можно выполнить подряд без ожидания
+        self.API_BURST = oConfig.getint('SERVICE', 'api_burst', fallback=1)
+        # Количество одновременных запросов к API
+        self.API_WORKERS = oConfig.getint('SERVICE', 'api_workers',
+                                          fallback=4)
+        # Количество постоянных соединений с сервером API
+        self.API_POOL_SIZE = oConfig.getint('SERVICE', 'api_pool_size',
+                                            fallback=4)
+        # Количество повторов запроса при ошибках сервера и таймаутах
+        self.API_RETRIES = oConfig.getint('SERVICE', 'api_retries',
+                                          fallback=3)
+        # Множитель паузы между повторами запроса
+        self.API_BACKOFF = oConfig.getfloat('SERVICE', 'api_backoff',
+                                            fallback=0.5)
+        # Таймаут запроса
+        self.API_TIMEOUT = oConfig.getfloat('SERVICE', 'api_timeout',
+                                            fallback=30.0)
 
 
 if __name__ == '__main__':
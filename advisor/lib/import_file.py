@@ -49,13 +49,12 @@ def import_csv_reports(sFile=fFile, sCompanyName=sName, oConnector=oConn):
         new_column.append(sIndexEn)
 
     sColumns = ', '.join(new_column)
-    for tValues in Llist:
-        oConnector.insert_row('IssuerReporting', sColumns, tValues)
+    oConnector.insert_many('IssuerReporting', sColumns, Llist)
 
 
 def update_emitter():
     fFile = ""
-    with open(fFile, newline='') as csvfile:
+    with open(fFile, newline='') as csvfile, oConn.transaction():
         CSV = csv.reader(csvfile, delimiter=';')
         for row in CSV:
             bAnswer = oConn.check_value('BondDescription', 'SECID',
@@ -0,0 +1,292 @@
+#     This code is a part of program Advisor
+#     Copyright (C) 2022 contributors Advisor
+#     The full list is available at the link
+#     https://github.com/tagezi/advisor/blob/master/contributors.txt
+#
+#     This program is free software: you can redistribute it and/or modify
+#     it under the terms of the GNU General Public License as published by
+#     the Free Software Foundation, either version 3 of the License, or
+#     (at your option) any later version.
+#
+#     This program is distributed in the hope that it will be useful,
+#     but WITHOUT ANY WARRANTY; without even the implied warranty of
+#     MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#     GNU General Public License for more details.
+#
+#     You should have received a copy of the GNU General Public License
+#     along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+""" Учёт позиций портфеля по операциям счёта.
+
+Операции AccountEvents проходятся один раз по порядку даты, времени и
+номера; для каждого инструмента хранится количество, стоимость по
+средневзвешенной цене, лоты FIFO и реализованный результат обоими
+способами. Состояние сохраняется в таблице PositionLedger вместе с
+номером последней учтённой операции, поэтому при следующем запуске
+читаются только новые операции и пересчитываются только затронутые
+инструменты. Если операция добавлена задним числом, инструмент
+пересчитывается заново; если операции удалялись, пересчитывается всё.
+
+Class:
+    Position
+    PositionLedger
+
+Using:
+    oLedger = PositionLedger(oConnector)
+    oPositions = oLedger.update()
+"""
+
+import json
+import logging
+
+import pandas as pd
+
+# Код операции продажи в таблице Events
+SALE_EVENT = 5
+# Столбцы таблицы PositionLedger
+LEDGER_COLUMNS = ('tool_code, quantity, cost, realized, lots, realized_fifo, '
+                  'events, last_id, last_key')
+
+
+class Position:
+    """ Позиция по одному инструменту.
+
+    *Methods*
+        * buy -- Учитывает покупку.
+        * sell -- Учитывает продажу.
+        * row -- Строка таблицы PositionLedger.
+    """
+
+    def __init__(self, sCode, fCount=0.0, fCost=0.0, fRealized=0.0,
+                 lLots=None, fRealizedFIFO=0.0, iEvents=0, iLastId=0,
+                 sLastKey=''):
+        """
+
+        :param sCode: Код инструмента
+        :type sCode: str
+        :param fCount: Количество
+        :type fCount: float
+        :param fCost: Стоимость позиции по средневзвешенной цене
+        :type fCost: float
+        :param fRealized: Реализованный результат по средневзвешенной цене
+        :type fRealized: float
+        :param lLots: Лоты FIFO: [количество, цена] от старых к новым
+        :type lLots: list or None
+        :param fRealizedFIFO: Реализованный результат по FIFO
+        :type fRealizedFIFO: float
+        :param iEvents: Количество учтённых операций
+        :type iEvents: int
+        :param iLastId: Номер последней учтённой операции
+        :type iLastId: int
+        :param sLastKey: Дата и время последней учтённой операции
+        :type sLastKey: str
+        """
+        self.sCode = sCode
+        self.fCount = fCount
+        self.fCost = fCost
+        self.fRealized = fRealized
+        self.lLots = lLots or []
+        self.fRealizedFIFO = fRealizedFIFO
+        self.iEvents = iEvents
+        self.iLastId = iLastId
+        self.sLastKey = sLastKey
+
+    def buy(self, fCount, fPrice):
+        """ Учитывает покупку; покупка после продажи сверх позиции сначала
+        закрывает недостачу. """
+        fOpen = fCount - min(fCount, max(-self.fCount, 0.0))
+        self.fCount += fCount
+        if fOpen > 0:
+            self.fCost += fOpen * fPrice
+            self.lLots.append([fOpen, fPrice])
+
+    def sell(self, fCount, fPrice):
+        """ Учитывает продажу: по средневзвешенной цене списывается доля
+        стоимости, по FIFO — самые старые лоты. Продажа сверх позиции
+        уменьшает количество, но результата не даёт: цены покупки нет.
+        """
+        fHeld = min(fCount, max(self.fCount, 0.0))
+        if fHeld > 0:
+            fAverage = self.fCost / self.fCount
+            self.fRealized += fHeld * (fPrice - fAverage)
+            self.fCost -= fHeld * fAverage
+        self.fCount -= fCount
+        if self.fCount <= 0:
+            self.fCost = 0.0
+
+        fRest = fHeld
+        while fRest > 0 and self.lLots:
+            lLot = self.lLots[0]
+            fUsed = min(fRest, lLot[0])
+            self.fRealizedFIFO += fUsed * (fPrice - lLot[1])
+            lLot[0] -= fUsed
+            fRest -= fUsed
+            if lLot[0] <= 0:
+                self.lLots.pop(0)
+
+    def row(self):
+        """ Строка таблицы PositionLedger.
+
+        :rtype: tuple
+        """
+        return (self.sCode, self.fCount, self.fCost, self.fRealized,
+                json.dumps(self.lLots), self.fRealizedFIFO, self.iEvents,
+                self.iLastId, self.sLastKey)
+
+
+class PositionLedger:
+    """ Позиции портфеля с сохраняемым состоянием.
+
+    *Methods*
+        * apply -- Учитывает операции по порядку.
+        * load -- Загружает сохранённое состояние.
+        * update -- Дополняет состояние новыми операциями и сохраняет его.
+        * positions -- Позиции одной таблицей.
+        * signature -- Признак состояния для кэширования расчётов.
+    """
+
+    def __init__(self, oConnector, oReader=None):
+        """
+
+        :param oConnector: Соединение для записи состояния
+        :type oConnector: advisor.lib.sql.SQL
+        :param oReader: Соединение для чтения операций (по умолчанию
+            oConnector)
+        :type oReader: advisor.lib.sql.SQL or None
+        """
+        self.oConnector = oConnector
+        self.oReader = oReader or oConnector
+        self.dPositions = {}
+
+    def apply(self, oEvents):
+        """ Учитывает операции, упорядоченные по дате, времени и номеру.
+
+        :param oEvents: Операции со столбцами acc_events_id, event_date,
+            event_time, event_id, tool_code, tool_price, tool_count
+        :type oEvents: pd.DataFrame
+        :return: Коды затронутых инструментов
+        :rtype: set
+        """
+        lKeys = (oEvents['event_date'].fillna('').astype(str) + ' ' +
+                 oEvents['event_time'].fillna('').astype(str)).tolist()
+        for iId, iEvent, sCode, fPrice, fCount, sKey in zip(
+                oEvents['acc_events_id'].tolist(),
+                oEvents['event_id'].tolist(), oEvents['tool_code'].tolist(),
+                oEvents['tool_price'].tolist(),
+                oEvents['tool_count'].tolist(), lKeys):
+            oPosition = self.dPositions.get(sCode)
+            if oPosition is None:
+                oPosition = self.dPositions[sCode] = Position(sCode)
+
+            if iEvent == SALE_EVENT:
+                oPosition.sell(float(fCount), float(fPrice))
+            else:
+                oPosition.buy(float(fCount), float(fPrice))
+            oPosition.iEvents += 1
+            oPosition.iLastId = max(oPosition.iLastId, iId)
+            oPosition.sLastKey = max(oPosition.sLastKey, sKey)
+
+        return set(oEvents['tool_code'])
+
+    def load(self):
+        """ Загружает сохранённое состояние.
+
+        :return: Номер последней учтённой операции
+        :rtype: int
+        """
+        oRows = self.oReader.read_sql(
+            f'SELECT {LEDGER_COLUMNS} FROM PositionLedger;')
+        self.dPositions = {
+            tRow[0]: Position(tRow[0], tRow[1], tRow[2], tRow[3],
+                              json.loads(tRow[4]), tRow[5], tRow[6], tRow[7],
+                              tRow[8])
+            for tRow in oRows.itertuples(index=False)}
+
+        return int(oRows['last_id'].max()) if len(oRows) else 0
+
+    def _is_consistent(self, iLastId):
+        """ Проверяет, что с сохранения не удалялись учтённые операции. """
+        oCursor = self.oReader.execute_query(
+            'SELECT count(*) FROM AccountEvents '
+            'WHERE tool_price IS NOT NULL AND acc_events_id<=?;', (iLastId,))
+        iCount = oCursor.fetchone()[0] if oCursor else -1
+        return iCount == sum(oPosition.iEvents
+                             for oPosition in self.dPositions.values())
+
+    def update(self):
+        """ Дополняет сохранённое состояние новыми операциями, пересчитывает
+        инструменты с операциями задним числом и сохраняет изменения.
+
+        :return: Позиции (см. positions)
+        :rtype: pd.DataFrame
+        """
+        iLastId = self.load()
+        if not self._is_consistent(iLastId):
+            logging.info('The position ledger is rebuilt from all events.')
+            self.dPositions = {}
+            iLastId = 0
+            self.oConnector.execute_query('DELETE FROM PositionLedger;')
+            self.oConnector.commit()
+
+        oEvents = self.oReader.get_account_events(iLastId)
+        if oEvents.empty:
+            return self.positions()
+
+        # операции задним числом: инструмент считается заново
+        lKeys = oEvents['event_date'].fillna('').astype(str) + ' ' + \
+            oEvents['event_time'].fillna('').astype(str)
+        oFirstKey = lKeys.groupby(oEvents['tool_code']).min()
+        setReplay = {sCode for sCode, sKey in oFirstKey.items()
+                     if sCode in self.dPositions and
+                     sKey < self.dPositions[sCode].sLastKey}
+        if setReplay:
+            for sCode in setReplay:
+                del self.dPositions[sCode]
+            oEvents = pd.concat([
+                self.oReader.get_account_events(0, setReplay),
+                oEvents[~oEvents['tool_code'].isin(setReplay)]],
+                ignore_index=True).sort_values(
+                ['event_date', 'event_time', 'acc_events_id'],
+                kind='stable', na_position='first')
+
+        setChanged = self.apply(oEvents)
+        self.oConnector.upsert_many(
+            'PositionLedger', LEDGER_COLUMNS,
+            [self.dPositions[sCode].row() for sCode in setChanged],
+            'tool_code')
+
+        return self.positions()
+
+    def signature(self):
+        """ Номер последней учтённой операции и количество операций: пока
+        они те же, позиции не менялись.
+
+        :rtype: tuple[int, int]
+        """
+        return (max((oPosition.iLastId
+                     for oPosition in self.dPositions.values()), default=0),
+                sum(oPosition.iEvents
+                    for oPosition in self.dPositions.values()))
+
+    def positions(self):
+        """ Позиции одной таблицей.
+
+        :return: Таблица по коду инструмента: количество (quantity),
+            средневзвешенная цена (wac), средняя цена оставшихся лотов FIFO
+            (fifo), реализованный результат (realized, realized_fifo)
+        :rtype: pd.DataFrame
+        """
+        lRows = []
+        for oPosition in self.dPositions.values():
+            fLots = sum(lLot[0] for lLot in oPosition.lLots)
+            fFIFO = sum(lLot[0] * lLot[1] for lLot in oPosition.lLots)
+            lRows.append((
+                oPosition.sCode, oPosition.fCount,
+                oPosition.fCost / oPosition.fCount
+                if oPosition.fCount > 0 else float('nan'),
+                fFIFO / fLots if fLots > 0 else float('nan'),
+                oPosition.fRealized, oPosition.fRealizedFIFO))
+
+        return pd.DataFrame(lRows, columns=[
+            'tool_code', 'quantity', 'wac', 'fifo', 'realized',
+            'realized_fifo']).set_index('tool_code').sort_index()
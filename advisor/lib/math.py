@@ -16,23 +16,33 @@
 #     You should have received a copy of the GNU General Public License
 #     along with this program.  If not, see <https://www.gnu.org/licenses/>.
 
-import math
-from datetime import datetime
-
 import numpy as np
 import pandas as pd
 from dateutil.utils import today
 
+from advisor.lib.options import monte_carlo
+
 
 def black_scholes(S0=100., K=105., T=1.0, r=0.05, sigma=0.2, i=100000):
-    """ Формула расчета стоимости опциона """
-    np.random.seed(1000)
-    z = np.random.standard_normal(i)
-    ST = S0 * np.exp((r - sigma ** 2 / 2) * T + sigma * math.sqrt(T) * z)
-    hT = np.maximum(ST - K, 0)
-    C0 = math.exp(-r * T) * np.mean(hT)
-    print(f'Стоимость европейского колл-опциона: {C0}')
-    return C0
+    """ Стоимость европейского колл-опциона методом Монте-Карло
+    (см. options.monte_carlo).
+
+    :param S0: Цена актива
+    :type S0: float
+    :param K: Страйк
+    :type K: float
+    :param T: Срок в годах
+    :type T: float
+    :param r: Безрисковая ставка (непрерывная, доли единицы)
+    :type r: float
+    :param sigma: Волатильность (доли единицы)
+    :type sigma: float
+    :param i: Количество путей
+    :type i: int
+    :rtype: float
+    """
+    oOption = pd.DataFrame({'STRIKE': [K], 'MATURITY': [T], 'SIGMA': [sigma]})
+    return float(monte_carlo(oOption, S0, r, i, iSeed=1000)['PRICE'].iloc[0])
 
 
 def bring_number_into_range(value, min_src, max_src, min_dest=0, max_dest=40):
@@ -78,12 +88,10 @@ def by_inflation(fInfl, oUpCoupon, sColumn='coupon_value', iDays=364):
     :return: список пересчитанных значений
     :rtype: list
     """
-    lData = []
-    for iRowNum, k in oUpCoupon.iterrows():
-        fPower = -1 * years(k['coupon_date'], iDays)
-        lData.append(discounting(k[sColumn], fInfl, fPower))
+    aPower = -1 * year_fractions(oUpCoupon['coupon_date'].to_numpy(), iDays)
 
-    return lData
+    return discounting(oUpCoupon[sColumn].to_numpy(dtype=float), fInfl,
+                       aPower).tolist()
 
 
 def face_value_inflation(fInfl, oUpCoupon, iDays=364):
@@ -232,6 +240,60 @@ def sum_pandas(dataframe):
         'tool_code', as_index=False).agg({'buying_count': 'sum'})
 
 
+def year_fractions(oDates, iDays=364, sBasis='days', oToday=None):
+    """ Считает доли лет от сегодняшнего дня до дат сразу для всех дат.
+
+    Базы расчёта:
+        * days -- дни между датами, делённые на iDays (TIME.days в config.ini);
+        * ACT/365 -- дни между датами, делённые на 365;
+        * ACT/ACT -- дни каждого календарного года делятся на длину этого
+          года (365 или 366);
+        * 30/360 -- каждый месяц считается за 30 дней, год за 360.
+
+    :param oDates: Даты в формате ГГГГ-ММ-ДД или datetime, пустые значения
+        дают NaN
+    :type oDates: pd.Series or np.ndarray or list
+    :param iDays: количество дней в году для базы days
+    :type iDays: int
+    :param sBasis: база расчёта: days, ACT/365, ACT/ACT или 30/360
+    :type sBasis: str
+    :param oToday: Дата, от которой считаются годы (по умолчанию сегодня);
+        одна на весь расчёт
+    :type oToday: datetime or pd.Timestamp or None
+    :return: Доли лет; для Series с тем же индексом
+    :rtype: pd.Series or np.ndarray
+    """
+    oIndex = oDates.index if isinstance(oDates, pd.Series) else None
+    oEnd = pd.DatetimeIndex(pd.to_datetime(np.asarray(oDates, dtype=object),
+                                           format='ISO8601', errors='coerce'))
+    oStart = pd.Timestamp(today() if oToday is None else oToday).normalize()
+
+    if sBasis in ('days', 'ACT/365'):
+        iBasisDays = iDays if sBasis == 'days' else 365
+        aYears = (oEnd.normalize() - oStart).days.to_numpy(dtype=float) / \
+            iBasisDays
+    elif sBasis == 'ACT/ACT':
+        aEndYear = 365 + oEnd.is_leap_year.astype(float)
+        aYears = (oEnd.year - oStart.year).to_numpy(dtype=float) + \
+            (oEnd.dayofyear.to_numpy(dtype=float) - 1) / aEndYear - \
+            (oStart.dayofyear - 1) / (365 + oStart.is_leap_year)
+    elif sBasis == '30/360':
+        iStartDay = min(oStart.day, 30)
+        aEndDay = oEnd.day.to_numpy(dtype=float)
+        if iStartDay == 30:
+            aEndDay = np.minimum(aEndDay, 30)
+        aYears = (360 * (oEnd.year - oStart.year).to_numpy(dtype=float) +
+                  30 * (oEnd.month - oStart.month).to_numpy(dtype=float) +
+                  aEndDay - iStartDay) / 360
+    else:
+        raise ValueError(f'Unknown day count basis: {sBasis}')
+
+    if oIndex is not None:
+        return pd.Series(aYears, index=oIndex)
+
+    return aYears
+
+
 def years(sDate, iDays=364):
     """ Считает количество не полных лет между датами
 
@@ -241,38 +303,205 @@ def years(sDate, iDays=364):
     :type iDays: int
     :return:
     """
-    oDate = datetime.strptime(sDate, '%Y-%m-%d')
-    fYears = (oDate - today()).days / iDays
+    return float(year_fractions([sDate], iDays)[0])
+
+
+def cashflow_matrix(oFlows, lSECID, sValue='value', sYears='YEARS'):
+    """ Раскладывает длинную таблицу выплат (строка на выплату) в матрицы
+    сроков и сумм: строка на облигацию, столбец на выплату. Недостающие
+    выплаты дополняются нулями.
+
+    :param oFlows: Выплаты со столбцами SECID, sYears и sValue
+    :type oFlows: pd.DataFrame
+    :param lSECID: Порядок облигаций (строк матриц)
+    :type lSECID: list or pd.Index or pd.Series
+    :param sValue: Столбец сумм выплат
+    :type sValue: str
+    :param sYears: Столбец сроков выплат в годах
+    :type sYears: str
+    :return: Матрицы сроков и сумм выплат
+    :rtype: tuple[np.ndarray, np.ndarray]
+    """
+    aRows = pd.Index(lSECID).get_indexer(oFlows['SECID'])
+    bKnown = aRows >= 0
+    aRows = aRows[bKnown]
+    aColumns = pd.Series(aRows).groupby(aRows).cumcount().to_numpy()
+    iColumns = aColumns.max() + 1 if len(aColumns) else 0
+
+    aTimes = np.zeros((len(lSECID), iColumns))
+    aAmounts = np.zeros((len(lSECID), iColumns))
+    aTimes[aRows, aColumns] = oFlows[sYears].to_numpy(dtype=float)[bKnown]
+    aAmounts[aRows, aColumns] = oFlows[sValue].to_numpy(dtype=float)[bKnown]
+
+    return aTimes, aAmounts
+
+
+def solve_price(aPrice, aAmounts, fnDiscount, fGuess=0.1, fTol=1e-10,
+                iMaxIter=100, fMin=-0.99, fMax=10.0):
+    """ Находит для многих облигаций сразу ставку, при которой
+    дисконтированные выплаты равны цене.
+
+    Решает уравнение sum(CF * D(x)) = Цена методом Ньютона одновременно для
+    всех строк; D(x) убывает с ростом x. Шаг, выходящий за границы
+    интервала, где лежит корень, заменяется делением интервала пополам,
+    поэтому решение сходится и при плохом начальном приближении.
+
+    :param aPrice: Цены облигаций (грязные, в валюте)
+    :type aPrice: np.ndarray or pd.Series
+    :param aAmounts: Суммы выплат, нули для отсутствующих выплат
+    :type aAmounts: np.ndarray
+    :param fnDiscount: Функция (ставки, маска строк) -> матрицы
+        коэффициентов дисконтирования D и производных dD/dx для строк маски
+    :type fnDiscount: callable
+    :param fGuess: Начальное приближение
+    :type fGuess: float
+    :param fTol: Точность по цене (доля цены) и по ставке
+    :type fTol: float
+    :param iMaxIter: Максимальное количество итераций
+    :type iMaxIter: int
+    :param fMin: Нижняя граница ставки
+    :type fMin: float
+    :param fMax: Верхняя граница ставки
+    :type fMax: float
+    :return: Ставки (NaN если нет решения), признаки сходимости,
+        количество итераций и невязки по цене
+    :rtype: tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray]
+    """
+    aPrice = np.asarray(aPrice, dtype=float)
+    iBonds = len(aPrice)
+    aYield = np.full(iBonds, fGuess)
+    aLow = np.full(iBonds, fMin)
+    aHigh = np.full(iBonds, fMax)
+    aIterations = np.zeros(iBonds, dtype=int)
+    aResidual = np.full(iBonds, np.nan)
+    bConverged = np.zeros(iBonds, dtype=bool)
+    bActive = (aPrice > 0) & (aAmounts > 0).any(axis=1)
+    # корень должен лежать между границами
+    with np.errstate(over='ignore', invalid='ignore'):
+        for fBound, iSign in ((fMin, 1), (fMax, -1)):
+            bAll = np.ones(iBonds, dtype=bool)
+            aDiscount, _ = fnDiscount(np.full(iBonds, fBound), bAll)
+            aPV = (aAmounts * aDiscount).sum(axis=1)
+            bActive &= iSign * (aPV - aPrice) > 0
+
+    for _ in range(iMaxIter):
+        if not bActive.any():
+            break
+
+        aY = aYield[bActive]
+        aCF = aAmounts[bActive]
+        aDiscount, aSlope = fnDiscount(aY, bActive)
+        aF = (aCF * aDiscount).sum(axis=1) - aPrice[bActive]
+        aDF = (aCF * aSlope).sum(axis=1)
+
+        # цена убывает с ростом ставки: сужаем интервал с корнем
+        aLow[bActive] = np.where(aF > 0, aY, aLow[bActive])
+        aHigh[bActive] = np.where(aF > 0, aHigh[bActive], aY)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            aNewton = aY - aF / aDF
+        bBisect = ~np.isfinite(aNewton) | (aNewton <= aLow[bActive]) | \
+            (aNewton >= aHigh[bActive])
+        aNext = np.where(bBisect, (aLow[bActive] + aHigh[bActive]) / 2,
+                         aNewton)
+
+        aResidual[bActive] = aF
+        aIterations[bActive] += 1
+        bDone = (np.abs(aF) <= fTol * aPrice[bActive]) | \
+            (np.abs(aNext - aY) <= fTol)
+        aYield[bActive] = np.where(bDone, aY, aNext)
+        bConverged[np.flatnonzero(bActive)[bDone]] = True
+        bActive[np.flatnonzero(bActive)[bDone]] = False
+
+    aYield[~bConverged] = np.nan
+
+    return aYield, bConverged, aIterations, aResidual
+
+
+def bond_ytm(aPrice, aTimes, aAmounts, fGuess=0.1, fTol=1e-10,
+             iMaxIter=100, fMin=-0.99, fMax=10.0):
+    """ Доходность к погашению (или к оферте) для многих облигаций сразу:
+    sum(CF * (1 + y) ** -t) = Цена (см. solve_price).
+
+    :param aPrice: Цены облигаций (грязные, в валюте)
+    :type aPrice: np.ndarray or pd.Series
+    :param aTimes: Сроки выплат в годах (см. cashflow_matrix)
+    :type aTimes: np.ndarray
+    :param aAmounts: Суммы выплат, нули для отсутствующих выплат
+    :type aAmounts: np.ndarray
+    :param fGuess: Начальное приближение доходности
+    :type fGuess: float
+    :param fTol: Точность по цене (доля цены) и по доходности
+    :type fTol: float
+    :param iMaxIter: Максимальное количество итераций
+    :type iMaxIter: int
+    :param fMin: Нижняя граница доходности
+    :type fMin: float
+    :param fMax: Верхняя граница доходности
+    :type fMax: float
+    :return: Доходности (эффективные годовые, доли единицы, NaN если нет
+        решения), признаки сходимости, количество итераций и невязки по цене
+    :rtype: tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray]
+    """
+    def discount(aY, bRows):
+        aT = aTimes[bRows]
+        aDiscount = (1 + aY[:, None]) ** -aT
+        return aDiscount, -aT * aDiscount / (1 + aY[:, None])
+
+    return solve_price(aPrice, aAmounts, discount, fGuess, fTol, iMaxIter,
+                       fMin, fMax)
+
+
+def bond_zspread(aPrice, aTimes, aAmounts, aRates, fTol=1e-10,
+                 iMaxIter=100, fMin=-0.5, fMax=5.0):
+    """ Z-спред для многих облигаций сразу: постоянная добавка к
+    непрерывным бескупонным ставкам, при которой
+    sum(CF * exp(-(r(t) + z) * t)) = Цена (см. solve_price).
+
+    :param aPrice: Цены облигаций (грязные, в валюте)
+    :type aPrice: np.ndarray or pd.Series
+    :param aTimes: Сроки выплат в годах (см. cashflow_matrix)
+    :type aTimes: np.ndarray
+    :param aAmounts: Суммы выплат, нули для отсутствующих выплат
+    :type aAmounts: np.ndarray
+    :param aRates: Непрерывные бескупонные ставки на сроки выплат
+    :type aRates: np.ndarray
+    :param fTol: Точность по цене (доля цены) и по спреду
+    :type fTol: float
+    :param iMaxIter: Максимальное количество итераций
+    :type iMaxIter: int
+    :param fMin: Нижняя граница спреда
+    :type fMin: float
+    :param fMax: Верхняя граница спреда
+    :type fMax: float
+    :return: Спреды (доли единицы, NaN если нет решения), признаки
+        сходимости, количество итераций и невязки по цене
+    :rtype: tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray]
+    """
+    def discount(aZ, bRows):
+        aT = aTimes[bRows]
+        aDiscount = np.exp(-(aRates[bRows] + aZ[:, None]) * aT)
+        return aDiscount, -aT * aDiscount
 
-    return fYears
+    return solve_price(aPrice, aAmounts, discount, 0.0, fTol, iMaxIter,
+                       fMin, fMax)
 
 
 def weighted_average_pandas(dataframe):
-    k = ''
-    oSeries = pd.Series()
-    for x in dataframe['tool_code']:
-        if x == k:
-            continue
-        k = x
-        df = dataframe.loc[dataframe['tool_code'] == x]
-        val = df['tool_price']
-        wt = df['tool_count']
-        if not oSeries.empty:
-            if wt.sum() != 0:
-                oSeries = pd.concat([oSeries, pd.Series(
-                    ((val * wt).sum() / wt.sum())
-                )], ignore_index=True)
-            else:
-                oSeries = pd.concat([oSeries, pd.Series(
-                   np.nan
-                )], ignore_index=True)
-        else:
-            if wt.sum() != 0:
-                oSeries = pd.Series(((val * wt).sum() / wt.sum()))
-            else:
-                oSeries = np.nan
-
-    return oSeries
+    """ Средневзвешенная по количеству цена каждого инструмента одним
+    групповым проходом (см. также ledger.PositionLedger).
+
+    :param dataframe: Операции со столбцами tool_code, tool_price, tool_count
+    :type dataframe: pd.DataFrame
+    :return: Цены в порядке первого появления инструментов, NaN при нулевом
+        суммарном количестве
+    :rtype: pd.Series
+    """
+    oGroups = dataframe.assign(
+        value=dataframe['tool_price'] * dataframe['tool_count']).groupby(
+        'tool_code', sort=False)[['value', 'tool_count']].sum()
+    oCount = oGroups['tool_count'].where(oGroups['tool_count'] != 0)
+
+    return (oGroups['value'] / oCount).reset_index(drop=True)
 
 
 """
@@ -0,0 +1,225 @@
+#     This code is a part of program Advisor
+#     Copyright (C) 2022 contributors Advisor
+#     The full list is available at the link
+#     https://github.com/tagezi/advisor/blob/master/contributors.txt
+#
+#     This program is free software: you can redistribute it and/or modify
+#     it under the terms of the GNU General Public License as published by
+#     the Free Software Foundation, either version 3 of the License, or
+#     (at your option) any later version.
+#
+#     This program is distributed in the hope that it will be useful,
+#     but WITHOUT ANY WARRANTY; without even the implied warranty of
+#     MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#     GNU General Public License for more details.
+#
+#     You should have received a copy of the GNU General Public License
+#     along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+""" The module upgrades the database structure in place.
+
+The version of the structure is kept in PRAGMA user_version. Every migration
+has a number, a name and a list of statements; migrations with a number
+greater than the database version are applied in order, each one in its own
+transaction, and the version is raised after each of them. The number of
+rows removed by every DELETE of a migration is logged, so the duplicates
+dropped by the unique keys of migration 1 can be audited.
+
+Function:
+    get_version(oConnector)
+    unique_key(sTable, sColumns)
+    log_deleted(oConnector, iMigration, sTable)
+    migrate(oConnector)
+
+Using:
+    migrate(oConnector)
+"""
+
+import logging
+from sqlite3 import DatabaseError
+
+
+def unique_key(sTable, sColumns):
+    """ Returns statements that remove duplicates by the key, leaving
+    the last written row, and create a unique index on the key. migrate
+    logs how many rows the DELETE removed.
+
+    :param sTable: Table name.
+    :type sTable: str
+    :param sColumns: Key column(s) separated by ', '.
+    :type sColumns: str
+    :return: SQL statements.
+    :rtype: list[str]
+    """
+    sIndex = f'ux_{sTable}_{sColumns.replace(", ", "_")}'
+    return [f'DELETE FROM {sTable} WHERE rowid NOT IN '
+            f'(SELECT max(rowid) FROM {sTable} GROUP BY {sColumns});',
+            f'CREATE UNIQUE INDEX IF NOT EXISTS {sIndex} '
+            f'ON {sTable} ({sColumns});']
+
+
+# Bonds for the screener: the join of BondsSecurities, BondDescription and
+# BondsMarketData with the filters that do not depend on the user choice.
+# IS_SCREEN marks bonds for the table of bonds, HAS_OOO is used by the list
+# of coupon periods.
+BOND_SCREEN_COLUMNS = (
+    'SECID, ISIN, SHORTNAME, SECNAME, MATDATE, PREVPRICE, '
+    'YIELDATPREVWAPRICE, EFFECTIVEYIELD, COUPONPERCENT, COUPONVALUE, '
+    'ACCRUEDINT, NEXTCOUPON, COUPONPERIOD, INITIALFACEVALUE, FACEVALUE, '
+    'FACEUNIT, LISTLEVEL, EMITTER, IS_OFZ, IS_SCREEN, HAS_OOO')
+BOND_SCREEN_SELECT = (
+    "SELECT BondsSecurities.SECID, BondsSecurities.ISIN, "
+    "BondsSecurities.SHORTNAME, BondsSecurities.SECNAME, "
+    "BondsSecurities.MATDATE, BondsSecurities.PREVPRICE, "
+    "BondsSecurities.YIELDATPREVWAPRICE, BondsMarketData.EFFECTIVEYIELD, "
+    "BondsSecurities.COUPONPERCENT, BondsSecurities.COUPONVALUE, "
+    "BondsSecurities.ACCRUEDINT, BondsSecurities.NEXTCOUPON, "
+    "BondsSecurities.COUPONPERIOD, BondDescription.INITIALFACEVALUE, "
+    "BondDescription.FACEVALUE, BondDescription.FACEUNIT, "
+    "BondsSecurities.LISTLEVEL, BondDescription.EMITTER, "
+    "IFNULL(BondsSecurities.SHORTNAME like '%ОФЗ%', 0), "
+    "IFNULL(BondsMarketData.SECID is not NULL "
+    "AND BondsSecurities.OFFERDATE is NULL "
+    "AND BondDescription.EMITTER not like 'ООО %' "
+    "AND BondsSecurities.SECNAME not like '%ОФЗ-АД%' "
+    "AND BondsSecurities.SECNAME not like '%ОФЗ-ПК%' "
+    "AND BondsSecurities.SECNAME not like '%ОФЗ-ИН%' "
+    "AND BondsSecurities.BONDTYPE like 'Фикс с известным купоном', 0), "
+    "BondDescription.EMITTER like '%ООО%' "
+    "FROM BondsSecurities "
+    "JOIN BondDescription "
+    "ON BondDescription.SECID=BondsSecurities.SECID "
+    "LEFT JOIN BondsMarketData "
+    "ON BondsMarketData.SECID=BondsSecurities.SECID "
+    "WHERE BondDescription.ISQUALIFIEDINVESTORS=0 "
+    "AND BondsSecurities.PREVPRICE is not NULL "
+    "AND BondsSecurities.COUPONPERCENT>1 "
+    "AND BondDescription.INITIALFACEVALUE=BondDescription.FACEVALUE "
+    "AND BondDescription.EMITTER not like '%икрофинансовая%' "
+    "AND BondDescription.EMITTER not like '%коллектор%'")
+
+# (version, name, statements)
+MIGRATIONS = [
+    (1, 'Unique keys on SECID and ISIN',
+     unique_key('BondsSecurities', 'SECID') +
+     unique_key('BondsMarketData', 'SECID') +
+     unique_key('BondDescription', 'SECID') +
+     unique_key('BoundCoupons', 'SECID, coupon_date') +
+     unique_key('BoundAmortizations', 'SECID, amort_date') +
+     unique_key('SharesSecurities', 'SECID') +
+     unique_key('SharesMarketData', 'SECID') +
+     unique_key('ShareDescriptions', 'SECID') +
+     unique_key('BondsCollections', 'ISIN') +
+     unique_key('SharesCollections', 'ISIN') +
+     ['CREATE INDEX IF NOT EXISTS ix_BondDescription_ISIN '
+      'ON BondDescription (ISIN);',
+      'CREATE INDEX IF NOT EXISTS ix_BondsCollections_SECID '
+      'ON BondsCollections (SECID);',
+      'CREATE INDEX IF NOT EXISTS ix_SharesCollections_SECID '
+      'ON SharesCollections (SECID);',
+      'CREATE INDEX IF NOT EXISTS ix_AccountEvents_tool_code '
+      'ON AccountEvents (tool_code);',
+      'ANALYZE;']),
+    (2, 'Materialized table of the bond screener',
+     ['CREATE TABLE IF NOT EXISTS DataVersion (name TEXT PRIMARY KEY, '
+      'version INTEGER, updated_at DATETIME);',
+      'CREATE TABLE IF NOT EXISTS BondScreen (SECID TEXT PRIMARY KEY, '
+      'ISIN TEXT, SHORTNAME TEXT, SECNAME TEXT, MATDATE DATE, '
+      'PREVPRICE DOUBLE, YIELDATPREVWAPRICE DOUBLE, EFFECTIVEYIELD DOUBLE, '
+      'COUPONPERCENT DOUBLE, COUPONVALUE DOUBLE, ACCRUEDINT DOUBLE, '
+      'NEXTCOUPON DATE, COUPONPERIOD INTEGER, INITIALFACEVALUE INTEGER, '
+      'FACEVALUE INTEGER, FACEUNIT TEXT, LISTLEVEL INTEGER, EMITTER TEXT, '
+      'IS_OFZ INTEGER, IS_SCREEN INTEGER, HAS_OOO INTEGER);',
+      'CREATE INDEX IF NOT EXISTS ix_BondScreen_period '
+      'ON BondScreen (IS_SCREEN, COUPONPERIOD);',
+      'CREATE INDEX IF NOT EXISTS ix_BondScreen_MATDATE '
+      'ON BondScreen (MATDATE);',
+      f'INSERT INTO BondScreen ({BOND_SCREEN_COLUMNS}) '
+      f'{BOND_SCREEN_SELECT};',
+      "INSERT INTO DataVersion (name, version, updated_at) "
+      "VALUES ('BondScreen', 1, datetime('now'));",
+      'DROP VIEW IF EXISTS BondView;',
+      "CREATE VIEW BondView AS SELECT SECID, ISIN, SHORTNAME, MATDATE, "
+      "PREVPRICE, YIELDATPREVWAPRICE, EFFECTIVEYIELD, COUPONPERCENT, "
+      "COUPONVALUE, ACCRUEDINT, NEXTCOUPON, COUPONPERIOD, INITIALFACEVALUE, "
+      "FACEVALUE, FACEUNIT, LISTLEVEL, EMITTER "
+      "FROM BondScreen "
+      "WHERE IS_SCREEN=1 AND FACEUNIT='SUR' AND MATDATE>DATE('now') "
+      "GROUP BY MATDATE;"]),
+    (3, 'Unique trade date of the yield curve',
+     unique_key('YieldCurve', 'tradedate')),
+    (4, 'Fitted Nelson-Siegel-Svensson curves',
+     ['CREATE TABLE IF NOT EXISTS NSSCurve (tradedate TEXT, source TEXT, '
+      'B0 REAL, B1 REAL, B2 REAL, B3 REAL, T1 REAL, T2 REAL, RMSE REAL, '
+      'NOBS INTEGER, PRIMARY KEY (tradedate, source));']),
+    (5, 'Snapshot of the position ledger',
+     ['CREATE TABLE IF NOT EXISTS PositionLedger (tool_code TEXT PRIMARY '
+      'KEY, quantity REAL, cost REAL, realized REAL, lots TEXT, '
+      'realized_fifo REAL, events INTEGER, last_id INTEGER, last_key TEXT);',
+      'CREATE INDEX IF NOT EXISTS ix_AccountEvents_time ON AccountEvents '
+      '(event_date, event_time, acc_events_id);']),
+]
+
+
+def get_version(oConnector):
+    """ Returns the version of the database structure.
+
+    :param oConnector: Instance attribute of SQL.
+    :type oConnector: SQL
+    :return: The version from PRAGMA user_version.
+    :rtype: int
+    """
+    oCursor = oConnector.execute_query('PRAGMA user_version;')
+    return oCursor.fetchone()[0] if oCursor else 0
+
+
+def log_deleted(oConnector, iMigration, sTable):
+    """ Logs how many rows the last DELETE of a migration removed.
+
+    :param oConnector: Instance attribute of SQL.
+    :type oConnector: SQL
+    :param iMigration: Number of the migration.
+    :type iMigration: int
+    :param sTable: Table name.
+    :type sTable: str
+    """
+    iDeleted = oConnector.execute_query('SELECT changes();').fetchone()[0]
+    logging.log(logging.WARNING if iDeleted else logging.INFO,
+                f'The migration {iMigration} deleted {iDeleted} rows '
+                f'from {sTable}.')
+
+
+def migrate(oConnector):
+    """ Applies the migrations that the database does not have yet.
+
+    If a migration fails, its changes are rolled back and the following
+    migrations are not applied.
+
+    :param oConnector: Instance attribute of SQL.
+    :type oConnector: SQL
+    :return: The version of the database after migrating.
+    :rtype: int
+    """
+    iVersion = get_version(oConnector)
+    for iMigration, sName, lStatements in MIGRATIONS:
+        if iMigration <= iVersion:
+            continue
+
+        try:
+            with oConnector.transaction():
+                for sSQL in lStatements:
+                    if not oConnector.execute_query(sSQL):
+                        raise DatabaseError(sSQL)
+                    if sSQL.startswith('DELETE FROM '):
+                        log_deleted(oConnector, iMigration, sSQL.split()[2])
+                oConnector.execute_query(f'PRAGMA user_version={iMigration};')
+        except DatabaseError:
+            logging.error(f'The migration {iMigration} ({sName}) failed, '
+                          f'the database stays at version {iVersion}.')
+            return iVersion
+
+        iVersion = iMigration
+        logging.info(f'The database migrated to version {iVersion}: '
+                     f'{sName}.')
+
+    return iVersion
@@ -18,19 +18,21 @@
 
 """ Забираем информацию с МосБиржи """
 import json
+import logging
 import pandas as pd
 from datetime import date, datetime
 from io import StringIO
 from dateutil.utils import today
 
-from advisor.lib.connect import connect
+from advisor.lib.connect import ISSFetcher, connect
 from advisor.lib.service_lib import Connector
 
 
 class MOEX(Connector):
-    def __init__(self, oConnector=None, sDbPath=''):
+    def __init__(self, oConnector=None, sDbPath='', oFetcher=None):
         super().__init__(oConnector, sDbPath)
 
+        self.oFetcher = oFetcher or ISSFetcher()
         self.sDomaine = 'https://iss.moex.com/'
         self.sFaild = 'iss/'
 
@@ -82,12 +84,62 @@ class MOEX(Connector):
         :return: DataFrame
         :rtype: pd.DataFrame
         """
-        # формируем URL для получения амортизации или суммы купона
-        sURL = f'{self.sDomaine}{self.sFaild}statistics/engines/stock/' \
-               f'markets/bonds/bondization/{sSECID}.json'
+        jJSON = connect(self.get_bondization(sSECID), api_delay=1.2,
+                        only=None, start=-1, limit=100, values=sField)
 
-        jJSON = connect(sURL, api_delay=1.2, only=None,
-                        start=-1, limit=100, values=sField)
+        return self.bound_dates_frame(jJSON, sField, oPD)
+
+    def get_bound_dates_many(self, lSECID, sField='coupons', oPD=pd,
+                             fnProgress=None):
+        """ Забирает даты купонов или амортизаций для списка облигаций одним
+        пакетом параллельных запросов.
+
+        :param lSECID: Коды ценных бумаг
+        :type lSECID: list[str]
+        :param sField: поле, которое нужно вернуть: coupons или amortizations
+        :type sField: str
+        :param oPD: pandas
+        :type oPD: pandas
+        :param fnProgress: функция для отображения хода выполнения
+        :type fnProgress: callable or None
+        :return: словарь SECID -> DataFrame, бумаги с неудачными запросами
+            в словарь не попадают
+        :rtype: dict[str, pd.DataFrame]
+        """
+        lSECID = list(lSECID)
+        lRequests = [(self.get_bondization(sSECID), {'values': sField})
+                     for sSECID in lSECID]
+        lJSON = self.oFetcher.fetch_many(lRequests, fnProgress)
+
+        dDates = {}
+        for sSECID, jJSON in zip(lSECID, lJSON):
+            if jJSON and jJSON.get(sField):
+                dDates[sSECID] = self.bound_dates_frame(jJSON, sField, oPD)
+
+        return dDates
+
+    def get_bondization(self, sSECID):
+        """ Возвращает ссылку на график купонов и амортизаций облигации
+
+        :param sSECID: Код ценной бумаги
+        :type sSECID: str
+        :rtype: str
+        """
+        return (f'{self.sDomaine}{self.sFaild}statistics/engines/stock/'
+                f'markets/bonds/bondization/{sSECID}.json')
+
+    @staticmethod
+    def bound_dates_frame(jJSON, sField='coupons', oPD=pd):
+        """ Преобразует ответ ISS с графиком выплат в DataFrame
+
+        :param jJSON: ответ ISS
+        :type jJSON: dict
+        :param sField: поле, которое нужно вернуть: coupons или amortizations
+        :type sField: str
+        :param oPD: pandas
+        :type oPD: pandas
+        :rtype: pd.DataFrame
+        """
         oDatesAndCouponList = oPD.read_json(StringIO(json.dumps(
             jJSON.get(sField).get('data'))), orient='columns')
         oDatesAndCouponList.columns = jJSON.get(sField).get('columns')
@@ -110,8 +162,11 @@ class MOEX(Connector):
 
 
 class MOEXUpdate(Connector):
-    def __init__(self, oConnector=None, sDbPath=''):
+    def __init__(self, oConnector=None, sDbPath='', oFetcher=None):
         super().__init__(oConnector, sDbPath)
+        self.oFetcher = oFetcher or ISSFetcher()
+        # бумаги, добавленные или изменённые за время обновления
+        self.setChanged = set()
         if not self.check_update():
             self.update_master_data()
 
@@ -139,6 +194,47 @@ class MOEXUpdate(Connector):
             lData = df.loc[0].tolist()
             self.insert_rows(sTable, sColumns, lData)
 
+    def backfill_kbd(self, sFrom, sTill=None, fnProgress=None):
+        """ Загружает параметры КБД за торговые дни периода, которых ещё
+        нет в базе, одним пакетом параллельных запросов.
+
+        :param sFrom: Начало периода в формате ГГГГ-ММ-ДД
+        :type sFrom: str
+        :param sTill: Конец периода (по умолчанию сегодня)
+        :type sTill: str or None
+        :param fnProgress: функция для отображения хода выполнения
+        :type fnProgress: callable or None
+        :return: количество записанных дней
+        :rtype: int
+        """
+        sURL = 'https://iss.moex.com/iss/engines/stock/zcyc.json'
+        sTill = sTill or today().strftime('%Y-%m-%d')
+        oQuery = self.oConnector.execute_query(
+            'SELECT tradedate FROM YieldCurve '
+            'WHERE tradedate BETWEEN ? AND ?;', (sFrom, sTill))
+        setHave = {tRow[0] for tRow in oQuery.fetchall()} if oQuery else set()
+        lDates = [sDate for sDate in
+                  pd.bdate_range(sFrom, sTill).strftime('%Y-%m-%d')
+                  if sDate not in setHave]
+        lRequests = [(sURL, {'only': 'params', 'parameter': 'date',
+                             'values': sDate}) for sDate in lDates]
+        lAnswers = self.oFetcher.fetch_many(lRequests, fnProgress)
+
+        sColumns, dRows = '', {}
+        for jJSON in lAnswers:
+            if not jJSON or not jJSON.get('params', {}).get('data'):
+                continue
+            sColumns = ', '.join(jJSON['params']['columns'])
+            lRow = jJSON['params']['data'][0]
+            # в выходные ISS отдаёт кривую последнего торгового дня
+            dRows[lRow[0]] = lRow
+
+        if not dRows:
+            return 0
+
+        return self.oConnector.upsert_many('YieldCurve', sColumns,
+                                           list(dRows.values()), 'tradedate')
+
     def get_markets_bonds(self):
         """ Получает таблицу инструментов торговой сессии по рынку облигаций
         """
@@ -174,30 +270,63 @@ class MOEXUpdate(Connector):
                          sTable='SharesMarketData')
 
     def update_data(self, jJSON, sField, sTable):
+        """ Синхронизирует таблицу с ответом ISS по SECID.
 
-        sColumns = ', '.join(jJSON[sField]['columns'])
-        lAllData = jJSON[sField]['data']
-        for lData in lAllData:
-            bIsSECID = self.oConnector.check_value(sTable=sTable,
-                                                   sGet='SECID',
-                                                   sWhere='SECID',
-                                                   aValue=lData[0])
-            if not bIsSECID:
-                self.insert_rows(sTable, sColumns, lData)
-
-            bNotUpdated = self.oConnector.check_update(sTable=sTable,
-                                                       sColumns=sColumns,
-                                                       sWhere='SECID',
-                                                       aValues=lData[0])
-            if not bNotUpdated:
-                lData.append(lData[0])
-                lData.pop(0)
-                self.oConnector.update(sTable=sTable,
-                                       sSetUpdate=sColumns[6:],
-                                       sWhereUpdate='SECID',
-                                       tValues=lData)
-
-    def get_bond_description(self, sSECID=''):
+        Существующие строки таблицы загружаются одним запросом, новые,
+        изменившиеся и неизменные бумаги определяются в памяти, после чего
+        вставки и обновления выполняются одной транзакцией.
+
+        :param jJSON: ответ ISS
+        :type jJSON: dict
+        :param sField: блок ответа с данными (например, securities)
+        :type sField: str
+        :param sTable: таблица базы данных
+        :type sTable: str
+        :return: количество новых, изменившихся и неизменных бумаг
+        :rtype: dict
+        """
+        lColumns = jJSON[sField]['columns']
+        iSECID = lColumns.index('SECID')
+        sColumns = ', '.join(lColumns)
+
+        # строки таблицы и их rowid, чтобы обновлять их без поиска по SECID
+        dExisting, dRowIDs = {}, {}
+        for tRow in self.oConnector.sql_get_all(
+                sTable, f'rowid, {sColumns}') or []:
+            dExisting[tRow[iSECID + 1]] = tRow[1:]
+            dRowIDs.setdefault(tRow[iSECID + 1], []).append(tRow[0])
+
+        # при повторе SECID в ответе остаётся последняя строка
+        dLatest = {lData[iSECID]: tuple(lData)
+                   for lData in jJSON[sField]['data']}
+
+        lInsert, lUpdate = [], []
+        iChanged, iUnchanged = 0, 0
+        for sSECID, tData in dLatest.items():
+            if sSECID not in dExisting:
+                lInsert.append(tData)
+                self.setChanged.add(sSECID)
+            elif dExisting[sSECID] != tData:
+                iChanged += 1
+                self.setChanged.add(sSECID)
+                tSet = tData[:iSECID] + tData[iSECID + 1:]
+                lUpdate.extend(tSet + (iRowID,)
+                               for iRowID in dRowIDs[sSECID])
+            else:
+                iUnchanged += 1
+
+        sSetColumns = ', '.join(lColumns[:iSECID] + lColumns[iSECID + 1:])
+        with self.oConnector.transaction():
+            self.oConnector.insert_many(sTable, sColumns, lInsert)
+            self.oConnector.update_many(sTable, sSetColumns, 'rowid', lUpdate)
+
+        dCounts = {'inserted': len(lInsert), 'changed': iChanged,
+                   'unchanged': iUnchanged}
+        logging.info(f'{sTable}: {dCounts}')
+
+        return dCounts
+
+    def get_bond_description(self, sSECID='', fnProgress=None):
         if not sSECID:
             lSECIDList = (
                 self.oConnector.sql_get_values('BondsSecurities',
@@ -205,98 +334,98 @@ class MOEXUpdate(Connector):
                                                'MATDATE>',
                                                (today().strftime("%Y-%m-%d"),))
             )
-
-            for sSECID in lSECIDList:
-                bSECID = self.oConnector.check_value('BondDescription',
-                                                     'SECID',
-                                                     'SECID',
-                                                     sSECID[0])
-                if not bSECID:
-                    sURL = \
-                        f'https://iss.moex.com/iss/securities/{sSECID[0]}.json'
-                    jJSON = connect(sURL,
-                                    api_delay=1.2,
-                                    only='description',
-                                    parameter='description.columns',
-                                    values='name,title,value')
-
-                    oJSON = pd.DataFrame(jJSON['description']['data'],
-                                         columns=jJSON['description'][
-                                             'columns'])
-
-                    lCondition = ['SECID', 'ISIN', 'INITIALFACEVALUE',
-                                  'FACEUNIT', 'LISTLEVEL', 'FACEVALUE',
-                                  'ISQUALIFIEDINVESTORS', 'EMITTER_ID']
-                    oJSON = oJSON[oJSON['name'].isin(lCondition)]
-
-                    sColumns = ', '.join(oJSON['name'])
-                    lValues = oJSON['value'].tolist()
-                    self.oConnector.insert_row('BondDescription',
-                                               sColumns,
-                                               lValues)
+            lCondition = ['SECID', 'ISIN', 'INITIALFACEVALUE',
+                          'FACEUNIT', 'LISTLEVEL', 'FACEVALUE',
+                          'ISQUALIFIEDINVESTORS', 'EMITTER_ID']
+            self.update_descriptions('BondDescription', lSECIDList or [],
+                                     lCondition, fnProgress)
 
         else:
             sURL = f'https://iss.moex.com/iss/securities/{sSECID}.json'
             jJSON = connect(sURL, api_delay=1.2,
                             only=None, start=-1, limit=100)
 
-    def get_shares_description(self, sSECID=''):
+    def get_shares_description(self, sSECID='', fnProgress=None):
         if not sSECID:
             lSECIDList = (
                 self.oConnector.sql_get_all('SharesSecurities', 'SECID')
             )
-
-            for sSECID in lSECIDList:
-                bSECID = self.oConnector.check_value('ShareDescriptions',
-                                                     'SECID',
-                                                     'SECID',
-                                                     sSECID[0])
-                i = 0
-                if not bSECID:
-                    sURL = \
-                        f'https://iss.moex.com/iss/securities/{sSECID[0]}.json'
-                    jJSON = connect(sURL,
-                                    api_delay=1.2,
-                                    only='description',
-                                    parameter='description.columns',
-                                    values='name,title,value')
-
-                    oJSON = pd.DataFrame(jJSON['description']['data'],
-                                         columns=jJSON['description'][
-                                             'columns'])
-
-                    lCondition = ['SECID', 'NAME', 'SHORTNAME', 'ISIN',
-                                  'REGNUMBER', 'ISSUESIZE', 'FACEVALUE',
-                                  'FACEUNIT', 'LISTLEVEL',
-                                  'ISQUALIFIEDINVESTORS', 'MORNINGSESSION',
-                                  'EVENINGSESSION', 'WEEKENDSESSION',
-                                  'TYPENAME', 'TYPE', 'EMITTER_ID']
-                    oJSON = oJSON[oJSON['name'].isin(lCondition)]
-
-                    sColumns = ', '.join(oJSON['name'])
-                    lValues = oJSON['value'].tolist()
-                    self.oConnector.insert_row('ShareDescriptions',
-                                               sColumns,
-                                               lValues)
-                    i = i + 1
-                    print(i)
+            lCondition = ['SECID', 'NAME', 'SHORTNAME', 'ISIN',
+                          'REGNUMBER', 'ISSUESIZE', 'FACEVALUE',
+                          'FACEUNIT', 'LISTLEVEL',
+                          'ISQUALIFIEDINVESTORS', 'MORNINGSESSION',
+                          'EVENINGSESSION', 'WEEKENDSESSION',
+                          'TYPENAME', 'TYPE', 'EMITTER_ID']
+            self.update_descriptions('ShareDescriptions', lSECIDList or [],
+                                     lCondition, fnProgress)
 
         else:
             sURL = f'https://iss.moex.com/iss/securities/{sSECID}.json'
             jJSON = connect(sURL, api_delay=1.2,
                             only=None, start=-1, limit=100)
 
+    def update_descriptions(self, sTable, lSECIDList, lCondition,
+                            fnProgress=None):
+        """ Забирает описания бумаг, которых ещё нет в базе данных, одним
+        пакетом параллельных запросов и сохраняет их.
+
+        :param sTable: Таблица описаний (BondDescription или
+            ShareDescriptions)
+        :type sTable: str
+        :param lSECIDList: Строки запроса с кодами бумаг в первом столбце
+        :type lSECIDList: list
+        :param lCondition: Поля описания, которые нужно сохранить
+        :type lCondition: list[str]
+        :param fnProgress: функция для отображения хода выполнения
+        :type fnProgress: callable or None
+        """
+        lMissing = []
+        for tSECID in lSECIDList:
+            if not self.oConnector.check_value(sTable, 'SECID', 'SECID',
+                                               tSECID[0]):
+                lMissing.append(tSECID[0])
+
+        lRequests = [(f'https://iss.moex.com/iss/securities/{sSECID}.json',
+                      {'only': 'description',
+                       'parameter': 'description.columns',
+                       'values': 'name,title,value'})
+                     for sSECID in lMissing]
+        lAnswers = self.oFetcher.fetch_many(lRequests, fnProgress)
+        # набор полей описания у бумаг разный, поэтому строки вставляются
+        # по одной, но одной транзакцией
+        with self.oConnector.transaction():
+            for jJSON in lAnswers:
+                if not jJSON:
+                    continue
+
+                oJSON = pd.DataFrame(jJSON['description']['data'],
+                                     columns=jJSON['description']['columns'])
+                oJSON = oJSON[oJSON['name'].isin(lCondition)]
+
+                sColumns = ', '.join(oJSON['name'])
+                lValues = oJSON['value'].tolist()
+                if self.oConnector.insert_row(sTable, sColumns, lValues):
+                    self.setChanged.update(
+                        oJSON.loc[oJSON['name'] == 'SECID', 'value'])
+
     def get_collection(self, sType='', iLevel=0, sGroup='stock_bonds',
-                       sCollectionName=''):
+                       sCollectionName='', fnProgress=None):
         """ Забирает данные с MOEX и сохраняет их в базе данных для дальнейшей
         обработки.
 
+        Первая страница сообщает общее количество бумаг, остальные страницы
+        запрашиваются параллельно, а результат записывается в базу данных
+        одной транзакцией.
+
         :param sCollectionName:
         :param sType: Тип бумаги (например, ОФЗ или коммерческие)
         :type sType: str
         :param iLevel: Уровень рейтинга бумаги (0 - все уровни)
         :type iLevel: int
         :param sGroup: Группа бумаг (например, облигации, акции)
+        :param fnProgress: функция, которая вызывается с аргументами
+            (загружено страниц, всего страниц)
+        :type fnProgress: callable or None
         :return:
         """
         if sCollectionName == '':
@@ -305,45 +434,93 @@ class MOEXUpdate(Connector):
         sURL = (f'https://iss.moex.com/iss/securitygroups/{sGroup}'
                 f'/collections/{sCollectionName}/securities.json')
 
-        iStart = 0
-        iTotal = 100
         sTable = ''
         if sGroup == 'stock_bonds':
             sTable = 'BondsCollections'
         elif sGroup == 'stock_shares_tplus':
             sTable = 'SharesCollections'
 
-        while iStart < iTotal:
-            print(f'обновляем: {iStart} из {iTotal}')
-            jJSON = connect(sURL, api_delay=1.2,
-                            only=None, start=iStart, limit=100)
+        iLimit = 100
+        jJSON = connect(sURL, api_delay=1.2,
+                        only=None, start=0, limit=iLimit)
+        lPages = [jJSON]
+        if 'securities.cursor' in jJSON:
+            iTotal = jJSON['securities.cursor']['data'][0][1]
+            lRequests = [(sURL, {'start': iStart, 'limit': iLimit})
+                         for iStart in range(iLimit, iTotal, iLimit)]
+            iPages = len(lRequests) + 1
+            fnPageProgress = None
+            if fnProgress:
+                fnProgress(1, iPages)
+
+                def fnPageProgress(iDone, iAll):
+                    fnProgress(iDone + 1, iPages)
+
+            lPages.extend(self.oFetcher.fetch_many(lRequests, fnPageProgress))
+
+        lAllData = []
+        for jPage in lPages:
+            if not jPage:
+                logging.error(f'The page of the collection {sCollectionName}'
+                              ' was not received.')
+                continue
+            lAllData.extend(jPage['securities']['data'])
+
+        self.save_collection(sTable, jJSON['securities']['columns'],
+                             lAllData)
+        logging.info(f'{sType or sCollectionName} обновились.')
+
+    def save_collection(self, sTable, lColumns, lAllData):
+        """ Записывает бумаги коллекции в базу данных одной транзакцией.
+
+        Новые бумаги добавляются, у уже известных (по ISIN) обновляются
+        все остальные столбцы.
+
+        :param sTable: Таблица коллекции
+        :type sTable: str
+        :param lColumns: Столбцы ответа ISS
+        :type lColumns: list[str]
+        :param lAllData: Строки ответа ISS
+        :type lAllData: list[list]
+        """
+        if 'ISIN' not in lColumns:
+            logging.error(f'The collection for {sTable} has no ISIN column.')
+            return
+
+        iISIN = lColumns.index('ISIN')
+        lSetColumns = [sColumn for sColumn in lColumns if sColumn != 'ISIN']
 
-            if 'securities.cursor' in jJSON:
-                iTotal = jJSON['securities.cursor']['data'][0][1]
-                iStart = iStart + 100
+        lKnown = self.oConnector.sql_get_all(sTable, 'ISIN') or []
+        setKnown = {tRow[0] for tRow in lKnown}
+        lInsert, lUpdate = [], []
+        for lData in lAllData:
+            sISIN = lData[iISIN]
+            if sISIN is None:
+                continue
+            if sISIN in setKnown:
+                lUpdate.append(lData[:iISIN] + lData[iISIN + 1:] + [sISIN])
             else:
-                iStart = iTotal
-
-            sWhereColumn = 'ISIN'
-            sColumns = ', '.join(jJSON['securities']['columns'])
-            lAllData = jJSON['securities']['data']
-            for lData in lAllData:
-                if not self.oConnector.check_value(sTable,
-                                                   'ISIN',
-                                                   sWhereColumn,
-                                                   lData[5]):
-                    if 'ISIN' not in sColumns:
-                        sColumns = sColumns.replace('REGNUMBER,',
-                                                    'REGNUMBER, ISIN,')
-                    if lData[5] is not None:
-                        self.insert_rows(sTable, sColumns, lData)
-                else:
-                    sColumns = sColumns.replace(', ISIN', '')
-                    sISIN = lData[5]
-                    del lData[5]
-                    lData.append(sISIN)
-                    self.update_row(sTable, sColumns, sWhereColumn, lData)
-        print(f'{sType} обновились.')
+                setKnown.add(sISIN)
+                lInsert.append(lData)
+
+        with self.oConnector.transaction():
+            self.oConnector.insert_many(sTable, ', '.join(lColumns), lInsert)
+            self.oConnector.update_many(sTable, ', '.join(lSetColumns),
+                                        'ISIN', lUpdate)
+
+    def refresh_screen(self):
+        """ Обновляет таблицу для отбора облигаций по бумагам, которые
+        изменились за время обновления.
+
+        :return: количество записанных строк
+        :rtype: int or bool
+        """
+        iRows = self.oConnector.refresh_bond_screen(self.setChanged)
+        logging.info(f'BondScreen: {len(self.setChanged)} бумаг изменилось, '
+                     f'записано строк {iRows}.')
+        self.setChanged = set()
+
+        return iRows
 
     def return_collection_name(self, sType, iLevel):
         """ Возвращает имя уровня облигации
@@ -402,71 +579,77 @@ class MOEXUpdate(Connector):
         self.oConnector.update(sTable, sSetUpdate, sWhereUpdate, tValues)
 
     def update_master_data(self):
+        """ Обновляет справочники ISS (рынки, режимы торгов, типы бумаг и
+        т.д.). Справочники перезаписываются целиком одной транзакцией.
+        """
         jJSON = connect('http://iss.moex.com/iss.json', start=-1)
 
-        self.oConnector.sql_table_clean(['Engines', 'Markets', 'Boards',
-                                         'Boardgroups', 'Durations',
-                                         'SecurityTypes', 'SecurityGroups',
-                                         'SecurityCollections'])
-
-        # Engines
-        sColumns = 'engine_id, engine_name, engine_title'
-        for lData in jJSON['engines']['data']:
-            self.insert_rows('Engines', sColumns, lData)
-
-        # Markets
-        sColumns = ('id, engine_id, market_id, market_name, market_title, '
-                    'market_place, is_otc, has_history_files, '
-                    'has_history_trades_files, has_trades, has_history, '
-                    'has_candles, has_orderbook, has_tradingsession, '
-                    'has_extra_yields, has_delay')
-        for lData in jJSON['markets']['data']:
-            tData = (lData[0], lData[1], lData[4], lData[5], lData[6],
-                     lData[7], lData[8], lData[9], lData[10], lData[11],
-                     lData[12], lData[13], lData[14], lData[15], lData[16],
-                     lData[17],)
-            self.insert_rows('Markets', sColumns, tData)
-
-        # Boardgroups
-        sColumns = ('id, engine_id, market_id, name, title, is_default, '
-                    'board_group_id, is_traded, is_order_driven, category_id')
-        for lData in jJSON['boardgroups']['data']:
-            tData = (lData[0], lData[1], lData[4], lData[6], lData[7],
-                     lData[8], lData[9], lData[10], lData[11], lData[12],)
-            self.insert_rows('Boardgroups', sColumns, tData)
-
-        # Boards
-        sColumns = ('id, board_group_id, engine_id, market_id, board_id, '
-                    'board_title, is_traded, has_candles, is_primary')
-        for lData in jJSON['boards']['data']:
-            self.insert_rows('Boards', sColumns, lData)
-
-        # Durations
-        sColumns = 'interval, duration, days, title, hint'
-        for lData in jJSON['durations']['data']:
-            self.insert_rows('Durations', sColumns, lData)
-
-        # SecurityGroups
-        sColumns = 'groups_id, name, title, is_hidden'
-        for lData in jJSON['securitygroups']['data']:
-            self.insert_rows('SecurityGroups', sColumns, lData)
-
-        # SecurityTypes
-        sColumns = ('id, engine_id, security_type_name, security_type_title, '
-                    'security_group_name, stock_type')
-        for lData in jJSON['securitytypes']['data']:
-            tData = (lData[0], lData[1], lData[4], lData[5], lData[6],
-                     lData[7],)
-            self.oConnector.insert_row('SecurityTypes', sColumns, tData)
-
-        # SecurityCollections
-        sColumns = 'collections_id, name, title, security_group_id'
-        for lData in jJSON['securitycollections']['data']:
-            self.insert_rows('SecurityCollections', sColumns, lData)
-
-        # Обновление даты обновления
-        self.oConnector.update('UpdateData', 'date',
-                               'id', (date.today(), 1))
+        with self.oConnector.transaction():
+            self.oConnector.sql_table_clean(['Engines', 'Markets', 'Boards',
+                                             'Boardgroups', 'Durations',
+                                             'SecurityTypes',
+                                             'SecurityGroups',
+                                             'SecurityCollections'])
+
+            # Engines
+            sColumns = 'engine_id, engine_name, engine_title'
+            self.oConnector.insert_many('Engines', sColumns,
+                                        jJSON['engines']['data'])
+
+            # Markets
+            sColumns = ('id, engine_id, market_id, market_name, '
+                        'market_title, market_place, is_otc, '
+                        'has_history_files, has_history_trades_files, '
+                        'has_trades, has_history, has_candles, '
+                        'has_orderbook, has_tradingsession, '
+                        'has_extra_yields, has_delay')
+            self.oConnector.insert_many(
+                'Markets', sColumns,
+                ((lData[0], lData[1], *lData[4:18],)
+                 for lData in jJSON['markets']['data']))
+
+            # Boardgroups
+            sColumns = ('id, engine_id, market_id, name, title, is_default, '
+                        'board_group_id, is_traded, is_order_driven, '
+                        'category_id')
+            self.oConnector.insert_many(
+                'Boardgroups', sColumns,
+                ((lData[0], lData[1], lData[4], *lData[6:13],)
+                 for lData in jJSON['boardgroups']['data']))
+
+            # Boards
+            sColumns = ('id, board_group_id, engine_id, market_id, board_id, '
+                        'board_title, is_traded, has_candles, is_primary')
+            self.oConnector.insert_many('Boards', sColumns,
+                                        jJSON['boards']['data'])
+
+            # Durations
+            sColumns = 'interval, duration, days, title, hint'
+            self.oConnector.insert_many('Durations', sColumns,
+                                        jJSON['durations']['data'])
+
+            # SecurityGroups
+            sColumns = 'groups_id, name, title, is_hidden'
+            self.oConnector.insert_many('SecurityGroups', sColumns,
+                                        jJSON['securitygroups']['data'])
+
+            # SecurityTypes
+            sColumns = ('id, engine_id, security_type_name, '
+                        'security_type_title, security_group_name, '
+                        'stock_type')
+            self.oConnector.insert_many(
+                'SecurityTypes', sColumns,
+                ((lData[0], lData[1], *lData[4:8],)
+                 for lData in jJSON['securitytypes']['data']))
+
+            # SecurityCollections
+            sColumns = 'collections_id, name, title, security_group_id'
+            self.oConnector.insert_many('SecurityCollections', sColumns,
+                                        jJSON['securitycollections']['data'])
+
+            # Обновление даты обновления
+            self.oConnector.update('UpdateData', 'date',
+                                   'id', (date.today(), 1))
 
 
 if __name__ == '__main__':
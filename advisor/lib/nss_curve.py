@@ -0,0 +1,436 @@
+#     This code is a part of program Advisor
+#     Copyright (C) 2022 contributors Advisor
+#     The full list is available at the link
+#     https://github.com/tagezi/advisor/blob/master/contributors.txt
+#
+#     This program is free software: you can redistribute it and/or modify
+#     it under the terms of the GNU General Public License as published by
+#     the Free Software Foundation, either version 3 of the License, or
+#     (at your option) any later version.
+#
+#     This program is distributed in the hope that it will be useful,
+#     but WITHOUT ANY WARRANTY; without even the implied warranty of
+#     MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#     GNU General Public License for more details.
+#
+#     You should have received a copy of the GNU General Public License
+#     along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+""" Собственная кривая Нельсона-Сигеля-Свенссона (NSS) по ОФЗ.
+
+Ставка кривой при заданных tau1, tau2 линейна по beta0..beta3, поэтому
+подбираются только два параметра tau (поиск по шаблону в логарифмах),
+а beta для каждой пары tau находятся методом наименьших квадратов: по
+ставкам — сразу, по ценам — несколькими шагами Гаусса-Ньютона. Подбор
+начинается с параметров предыдущего дня, если они есть, иначе — с сетки
+значений tau.
+
+Кривая ОФЗ подбирается по ценам выплат облигаций; отклонение цены рынка
+от цены по кривой, пересчитанное в базисные пункты доходности, показывает
+дорогие (меньше нуля) и дешёвые (больше нуля) выпуски. История КБД
+переводится в параметры NSS по датам в нескольких процессах. Параметры
+хранятся в таблице NSSCurve.
+
+Function:
+    nss_basis(aT, fTau1, fTau2)
+    fit_rates(aT, aRates, aWeights=None, oStart=None)
+    fit_prices(aPrice, aTimes, aAmounts, oStart=None)
+    fit_ofz(oAnalysis)
+    fit_kbd_history(oConnector, sFrom=None, sTill=None, iWorkers=4)
+
+Class:
+    NSSCurve
+
+Using:
+    oCurve, oResiduals = fit_ofz(oBondAnalysis)
+    aSpot = oCurve.spot_percent(np.linspace(0.01, 17.5, 1500))
+"""
+
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pandas as pd
+
+from advisor.lib.bond_engine import BondEngine
+from advisor.lib.math import bond_ytm, cashflow_matrix
+from advisor.lib.zero_curve import CurveHistory
+
+# столбцы параметров кривой в таблице NSSCurve
+NSS_COLUMNS = ['B0', 'B1', 'B2', 'B3', 'T1', 'T2']
+# начальные значения tau (лет), если нет параметров предыдущего дня
+TAU_GRID = (0.3, 0.7, 1.5, 3.0, 6.0, 12.0)
+# допустимые tau и минимальное отношение tau2 / tau1 (при близких tau
+# члены кривизны совпадают и beta не определяются)
+TAU_MIN = 0.05
+TAU_MAX = 30.0
+TAU_RATIO = 1.2
+# сроки, по которым кривая КБД переводится в параметры NSS
+KBD_TENORS = np.array([0.25, 0.5, 0.75, 1, 2, 3, 5, 7, 10, 15, 20, 30])
+
+
+def nss_basis(aT, fTau1, fTau2):
+    """ Множители при beta0..beta3 для сроков.
+
+    :param aT: Сроки в годах (нулевой срок даёт предел при t -> 0)
+    :type aT: np.ndarray
+    :param fTau1: tau1
+    :type fTau1: float
+    :param fTau2: tau2
+    :type fTau2: float
+    :return: Массив формы aT.shape + (4,)
+    :rtype: np.ndarray
+    """
+    aT = np.asarray(aT, dtype=float)
+    lColumns = [np.ones_like(aT)]
+    for fTau in (fTau1, fTau2):
+        aX = aT / fTau
+        with np.errstate(divide='ignore', invalid='ignore'):
+            lColumns.append(np.where(aX > 0, -np.expm1(-aX) / aX, 1.0))
+        lColumns.append(lColumns[-1] - np.exp(-aX))
+    # beta1 при (1 - exp(-x)) / x только для tau1
+    del lColumns[3]
+    return np.stack(lColumns, axis=-1)
+
+
+class NSSCurve:
+    """ Кривая бескупонной доходности Нельсона-Сигеля-Свенссона.
+
+    Параметры beta — непрерывные ставки в долях единицы, tau — в годах.
+
+    *Methods*
+        * from_row -- Создаёт кривую из строки таблицы NSSCurve.
+        * from_db -- Создаёт кривую на дату из базы данных.
+        * spot -- Бескупонная непрерывная ставка.
+        * discount -- Коэффициент дисконтирования.
+        * spot_percent -- Бескупонная доходность в % годовых.
+    """
+
+    def __init__(self, aBetas, fTau1, fTau2, fRMSE=np.nan, iObs=0):
+        """
+
+        :param aBetas: beta0..beta3
+        :type aBetas: np.ndarray or list
+        :param fTau1: tau1
+        :type fTau1: float
+        :param fTau2: tau2
+        :type fTau2: float
+        :param fRMSE: Среднеквадратичная ошибка подбора, б.п.
+        :type fRMSE: float
+        :param iObs: Количество наблюдений при подборе
+        :type iObs: int
+        """
+        self.aBetas = np.asarray(aBetas, dtype=float)
+        self.fTau1 = float(fTau1)
+        self.fTau2 = float(fTau2)
+        self.fRMSE = float(fRMSE)
+        self.iObs = int(iObs)
+
+    @classmethod
+    def from_row(cls, lRow):
+        """ Создаёт кривую из строки таблицы NSSCurve.
+
+        :param lRow: Строка: tradedate, source, B0..B3, T1, T2, RMSE, NOBS
+        :type lRow: tuple or list
+        :rtype: NSSCurve
+        """
+        return cls(lRow[2:6], lRow[6], lRow[7], lRow[8], lRow[9])
+
+    @classmethod
+    def from_db(cls, oConnector, sSource='OFZ', sDate=None):
+        """ Создаёт кривую по последней строке NSSCurve не позже даты.
+
+        :param oConnector: Соединение с базой данных
+        :type oConnector: advisor.lib.sql.SQL
+        :param sSource: По чему подобрана кривая: OFZ или KBD
+        :type sSource: str
+        :param sDate: Дата в формате ГГГГ-ММ-ДД (по умолчанию последняя)
+        :type sDate: str or None
+        :return: Кривая или None, если кривых в базе нет
+        :rtype: NSSCurve or None
+        """
+        oCursor = oConnector.execute_query(
+            'SELECT * FROM NSSCurve WHERE source=? AND tradedate<=? '
+            'ORDER BY tradedate DESC LIMIT 1;',
+            (sSource, sDate or '9999-99-99'))
+        lRow = oCursor.fetchone() if oCursor else None
+        return cls.from_row(lRow) if lRow else None
+
+    def row(self, sDate, sSource):
+        """ Строка таблицы NSSCurve.
+
+        :rtype: tuple
+        """
+        return (sDate, sSource, *self.aBetas.tolist(), self.fTau1,
+                self.fTau2, self.fRMSE, self.iObs)
+
+    def spot(self, t):
+        """ Бескупонная непрерывная ставка (доли единицы).
+
+        :param t: Сроки в годах
+        :type t: float or np.ndarray
+        :rtype: np.ndarray
+        """
+        return nss_basis(t, self.fTau1, self.fTau2) @ self.aBetas
+
+    def discount(self, t):
+        """ Коэффициент дисконтирования exp(-r(t) * t).
+
+        :param t: Сроки в годах
+        :type t: float or np.ndarray
+        :rtype: np.ndarray
+        """
+        aT = np.asarray(t, dtype=float)
+        return np.exp(-self.spot(aT) * aT)
+
+    def spot_percent(self, t):
+        """ Бескупонная доходность при годовом начислении, % годовых.
+
+        :param t: Сроки в годах
+        :type t: float or np.ndarray
+        :rtype: np.ndarray
+        """
+        return 100 * np.expm1(self.spot(t))
+
+
+def _pattern_search(fnFit, oStart=None):
+    """ Подбирает tau1, tau2 поиском по шаблону в логарифмах tau.
+
+    :param fnFit: Функция (tau1, tau2) -> (сумма квадратов ошибок, beta)
+    :type fnFit: callable
+    :param oStart: Кривая предыдущего дня (иначе — сетка TAU_GRID)
+    :type oStart: NSSCurve or None
+    :return: Сумма квадратов ошибок, beta, tau1, tau2
+    :rtype: tuple[float, np.ndarray, float, float]
+    """
+    if oStart is None:
+        lStart = [(fTau1, fTau2) for fTau1 in TAU_GRID for fTau2 in TAU_GRID
+                  if fTau2 >= TAU_RATIO * fTau1]
+        fStep = 0.35
+    else:
+        lStart = [(oStart.fTau1, oStart.fTau2)]
+        fStep = 0.05
+
+    fBest, aBetas, fTau1, fTau2 = min(
+        ((*fnFit(fTau1, fTau2), fTau1, fTau2) for fTau1, fTau2 in lStart),
+        key=lambda tFit: tFit[0])
+    aLog = np.log([fTau1, fTau2])
+    while fStep > 1e-3:
+        bMoved = False
+        for iTau in (0, 1):
+            for iSign in (1, -1):
+                aNext = aLog.copy()
+                aNext[iTau] += iSign * fStep
+                fNext1, fNext2 = np.exp(aNext)
+                if not (TAU_MIN <= fNext1 and fNext2 <= TAU_MAX and
+                        fNext2 >= TAU_RATIO * fNext1):
+                    continue
+
+                fSSE, aNextBetas = fnFit(fNext1, fNext2)
+                if fSSE < fBest:
+                    fBest, aBetas, aLog, bMoved = fSSE, aNextBetas, aNext, \
+                        True
+        if not bMoved:
+            fStep /= 2
+
+    return fBest, aBetas, *np.exp(aLog)
+
+
+def fit_rates(aT, aRates, aWeights=None, oStart=None):
+    """ Подбирает кривую по бескупонным ставкам.
+
+    :param aT: Сроки в годах
+    :type aT: np.ndarray
+    :param aRates: Непрерывные ставки (доли единицы)
+    :type aRates: np.ndarray
+    :param aWeights: Веса наблюдений (по умолчанию одинаковые)
+    :type aWeights: np.ndarray or None
+    :param oStart: Кривая предыдущего дня для начального приближения
+    :type oStart: NSSCurve or None
+    :return: Кривая; RMSE — в базисных пунктах ставки
+    :rtype: NSSCurve
+    """
+    aT = np.asarray(aT, dtype=float)
+    aRates = np.asarray(aRates, dtype=float)
+    aRoot = np.sqrt(np.ones_like(aT) if aWeights is None else
+                    np.asarray(aWeights, dtype=float))
+
+    def fit(fTau1, fTau2):
+        aBasis = nss_basis(aT, fTau1, fTau2) * aRoot[:, None]
+        aBetas = np.linalg.lstsq(aBasis, aRates * aRoot, rcond=None)[0]
+        return float(((aBasis @ aBetas - aRates * aRoot) ** 2).sum()), \
+            aBetas
+
+    fSSE, aBetas, fTau1, fTau2 = _pattern_search(fit, oStart)
+    fRMSE = np.sqrt(fSSE / aRoot.dot(aRoot)) * 10000
+
+    return NSSCurve(aBetas, fTau1, fTau2, fRMSE, len(aT))
+
+
+def _model(aBetas, aTimes, aAmounts, aBasis):
+    """ Цены по кривой, дюрации по кривой и производные цен по beta. """
+    aDiscount = aAmounts * np.exp(-(aBasis @ aBetas) * aTimes)
+    aModel = aDiscount.sum(axis=1)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        aDuration = (aTimes * aDiscount).sum(axis=1) / aModel
+    aJacobian = -np.einsum('bf,bfk->bk', aDiscount * aTimes, aBasis)
+    return aModel, aDuration, aJacobian
+
+
+def fit_prices(aPrice, aTimes, aAmounts, oStart=None):
+    """ Подбирает кривую по ценам облигаций.
+
+    Ошибка цены делится на цену и дюрацию, то есть приводится к ошибке
+    доходности, чтобы короткие выпуски весили не меньше длинных. Без
+    кривой предыдущего дня начальное приближение — кривая по доходностям
+    к погашению на сроках дюрации.
+
+    :param aPrice: Цены облигаций (грязные, в валюте)
+    :type aPrice: np.ndarray
+    :param aTimes: Сроки выплат в годах (см. math.cashflow_matrix)
+    :type aTimes: np.ndarray
+    :param aAmounts: Суммы выплат, нули для отсутствующих выплат
+    :type aAmounts: np.ndarray
+    :param oStart: Кривая предыдущего дня для начального приближения
+    :type oStart: NSSCurve or None
+    :return: Кривая (RMSE — в базисных пунктах доходности), цены по
+        кривой и дюрации по кривой
+    :rtype: tuple[NSSCurve, np.ndarray, np.ndarray]
+    """
+    aPrice = np.asarray(aPrice, dtype=float)
+    if oStart is None:
+        aYield = np.log1p(bond_ytm(aPrice, aTimes, aAmounts)[0])
+        aDiscount = aAmounts * np.exp(-aYield[:, None] * aTimes)
+        aDuration = (aTimes * aDiscount).sum(axis=1) / aDiscount.sum(axis=1)
+        bValid = np.isfinite(aYield)
+        oStart = fit_rates(aDuration[bValid], aYield[bValid])
+    aDuration = _model(oStart.aBetas, aTimes, aAmounts,
+                       nss_basis(aTimes, oStart.fTau1, oStart.fTau2))[1]
+    aRoot = 1 / (aPrice * aDuration)
+    dState = {'aBetas': oStart.aBetas}
+
+    def fit(fTau1, fTau2):
+        aBasis = nss_basis(aTimes, fTau1, fTau2)
+        aBetas = dState['aBetas']
+        for _ in range(20):
+            aModel, _, aJacobian = _model(aBetas, aTimes, aAmounts, aBasis)
+            aStep = np.linalg.lstsq(aJacobian * aRoot[:, None],
+                                    (aPrice - aModel) * aRoot,
+                                    rcond=None)[0]
+            aBetas = aBetas + aStep
+            if np.abs(aStep).max() < 1e-10:
+                break
+        aModel = _model(aBetas, aTimes, aAmounts, aBasis)[0]
+        fSSE = float((((aModel - aPrice) * aRoot) ** 2).sum())
+        if np.isfinite(fSSE):
+            dState['aBetas'] = aBetas
+        return (fSSE if np.isfinite(fSSE) else np.inf), aBetas
+
+    fSSE, aBetas, fTau1, fTau2 = _pattern_search(fit, oStart)
+    fRMSE = np.sqrt(fSSE / len(aPrice)) * 10000
+    oCurve = NSSCurve(aBetas, fTau1, fTau2, fRMSE, len(aPrice))
+    aModel, aDuration, _ = _model(aBetas, aTimes, aAmounts,
+                                  nss_basis(aTimes, fTau1, fTau2))
+
+    return oCurve, aModel, aDuration
+
+
+def fit_ofz(oAnalysis):
+    """ Подбирает кривую ОФЗ по текущим ценам, сохраняет её параметры и
+    возвращает отклонения выпусков от кривой.
+
+    :param oAnalysis: Доступ к базе данных и бирже
+    :type oAnalysis: advisor.lib.bond_analysis.BondAnalysis
+    :return: Кривая и таблица по SECID: SHORTNAME, DURATION (лет), PRICE и
+        MODEL (цены рынка и по кривой, руб), RICHCHEAP (б.п., больше нуля —
+        выпуск дешевле кривой)
+    :rtype: tuple[NSSCurve, pd.DataFrame]
+    """
+    oBonds = oAnalysis.oReader.get_bonds_by_value(pd, bOFZ=True)
+    oEngine = BondEngine(oAnalysis)
+    oIndex = pd.Index(oBonds['SECID'])
+    aPrice = oEngine.dirty_price(oBonds)
+    aTimes, aAmounts = cashflow_matrix(oEngine.cashflows(oIndex), oIndex)
+    bValid = (aPrice > 0) & (aAmounts > 0).any(axis=1)
+
+    oStart = NSSCurve.from_db(oAnalysis.oReader, 'OFZ', oEngine.sToday)
+    oCurve, aModel, aDuration = fit_prices(
+        aPrice[bValid], aTimes[bValid], aAmounts[bValid], oStart)
+    oAnalysis.oConnector.upsert_many(
+        'NSSCurve', f'tradedate, source, {", ".join(NSS_COLUMNS)}, RMSE, '
+        f'NOBS', [oCurve.row(oEngine.sToday, 'OFZ')], 'tradedate, source')
+
+    oResiduals = pd.DataFrame({
+        'SHORTNAME': oBonds['SHORTNAME'].to_numpy()[bValid],
+        'DURATION': aDuration,
+        'PRICE': aPrice[bValid],
+        'MODEL': aModel,
+        'RICHCHEAP': (aModel - aPrice[bValid]) /
+        (aPrice[bValid] * aDuration) * 10000}, index=oIndex[bValid])
+
+    return oCurve, oResiduals
+
+
+def _fit_dates(aTenors, aRates, oStart=None):
+    """ Подбирает кривые по строкам ставок по порядку: каждая следующая
+    начинается с параметров предыдущей. Выполняется в отдельном процессе.
+    """
+    lCurves = []
+    for aRow in aRates:
+        oStart = fit_rates(aTenors, aRow, oStart=oStart)
+        lCurves.append(oStart)
+    return lCurves
+
+
+def fit_kbd_history(oConnector, sFrom=None, sTill=None, iWorkers=4):
+    """ Переводит историю КБД в параметры NSS и сохраняет их.
+
+    Даты делятся на iWorkers непрерывных отрезков, отрезки считаются в
+    отдельных процессах; внутри отрезка кривая каждого дня начинается с
+    параметров предыдущего, первый отрезок — с последней сохранённой
+    кривой до sFrom.
+
+    :param oConnector: Доступ к базе данных
+    :type oConnector: advisor.lib.sql.SQL
+    :param sFrom: Начало периода (по умолчанию вся история)
+    :type sFrom: str or None
+    :param sTill: Конец периода (по умолчанию вся история)
+    :type sTill: str or None
+    :param iWorkers: Количество процессов (1 — без процессов)
+    :type iWorkers: int
+    :return: Таблица параметров NSS_COLUMNS и RMSE по датам
+    :rtype: pd.DataFrame
+    """
+    oHistory = CurveHistory.from_db(oConnector, sFrom, sTill)
+    if not len(oHistory):
+        return pd.DataFrame(columns=[*NSS_COLUMNS, 'RMSE'])
+
+    aRates = oHistory.spot(KBD_TENORS)
+    oStart = None
+    if sFrom:
+        sBefore = (pd.Timestamp(sFrom) - pd.Timedelta(days=1)).strftime(
+            '%Y-%m-%d')
+        oStart = NSSCurve.from_db(oConnector, 'KBD', sBefore)
+
+    lChunks = np.array_split(np.arange(len(oHistory)),
+                             max(1, min(iWorkers, len(oHistory))))
+    if len(lChunks) == 1:
+        lCurves = _fit_dates(KBD_TENORS, aRates, oStart)
+    else:
+        with ProcessPoolExecutor(max_workers=len(lChunks)) as oExecutor:
+            lFutures = [oExecutor.submit(_fit_dates, KBD_TENORS,
+                                         aRates[aChunk],
+                                         oStart if iChunk == 0 else None)
+                        for iChunk, aChunk in enumerate(lChunks)]
+            lCurves = [oCurve for oFuture in lFutures
+                       for oCurve in oFuture.result()]
+
+    oConnector.upsert_many(
+        'NSSCurve', f'tradedate, source, {", ".join(NSS_COLUMNS)}, RMSE, '
+        f'NOBS', [oCurve.row(sDate, 'KBD')
+                  for sDate, oCurve in zip(oHistory.aDates, lCurves)],
+        'tradedate, source')
+
+    return pd.DataFrame([oCurve.row(sDate, 'KBD')[2:9]
+                         for sDate, oCurve in zip(oHistory.aDates, lCurves)],
+                        columns=[*NSS_COLUMNS, 'RMSE'],
+                        index=pd.Index(oHistory.aDates, name='tradedate'))
@@ -0,0 +1,232 @@
+#     This code is a part of program Advisor
+#     Copyright (C) 2022 contributors Advisor
+#     The full list is available at the link
+#     https://github.com/tagezi/advisor/blob/master/contributors.txt
+#
+#     This program is free software: you can redistribute it and/or modify
+#     it under the terms of the GNU General Public License as published by
+#     the Free Software Foundation, either version 3 of the License, or
+#     (at your option) any later version.
+#
+#     This program is distributed in the hope that it will be useful,
+#     but WITHOUT ANY WARRANTY; without even the implied warranty of
+#     MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#     GNU General Public License for more details.
+#
+#     You should have received a copy of the GNU General Public License
+#     along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+""" Европейские опционы: формула Блэка-Шоулза и метод Монте-Карло.
+
+Монте-Карло считает сразу все опционы таблицы (страйки × сроки ×
+волатильности) на одних и тех же случайных числах. Пути идут блоками по
+iChunk, у каждого блока свой поток случайных чисел из SeedSequence,
+поэтому результат не зависит от того, считаются блоки в одном процессе
+или в нескольких. Дисперсию уменьшают антитетические пути (z и -z) и
+контрольная переменная — дисконтированная цена актива, среднее которой
+известно и равно цене сегодня. От блоков остаются только средние и
+суммы квадратов отклонений, из которых получаются цена и стандартная
+ошибка.
+
+Function:
+    norm_cdf(aX)
+    bs_price(fSpot, aStrike, aT, fRate, aSigma, aCall=True)
+    option_grid(lStrikes, lMaturities, lSigmas, bCall=True)
+    monte_carlo(oOptions, fSpot, fRate, iPaths=100000, iChunk=20000,
+                iSeed=1000, iWorkers=1, bAntithetic=True, bControl=True)
+
+Using:
+    oOptions = option_grid([90, 100, 110], [0.5, 1.0], [0.2, 0.3])
+    oPrices = monte_carlo(oOptions, 100.0, 0.05, iPaths=1000000)
+"""
+
+import math
+from concurrent.futures import ProcessPoolExecutor
+from functools import reduce
+from itertools import product
+
+import numpy as np
+import pandas as pd
+
+# math.erf для массивов
+_ERF = np.frompyfunc(math.erf, 1, 1)
+
+
+def norm_cdf(aX):
+    """ Функция стандартного нормального распределения.
+
+    :param aX: Значения
+    :type aX: float or np.ndarray
+    :rtype: np.ndarray
+    """
+    aX = np.asarray(aX, dtype=float)
+    return 0.5 * (1 + np.asarray(_ERF(aX / math.sqrt(2)), dtype=float))
+
+
+def bs_price(fSpot, aStrike, aT, fRate, aSigma, aCall=True):
+    """ Цена европейских опционов по формуле Блэка-Шоулза.
+
+    :param fSpot: Цена актива
+    :type fSpot: float
+    :param aStrike: Страйки
+    :type aStrike: float or np.ndarray
+    :param aT: Сроки в годах
+    :type aT: float or np.ndarray
+    :param fRate: Безрисковая ставка (непрерывная, доли единицы)
+    :type fRate: float
+    :param aSigma: Волатильности (доли единицы)
+    :type aSigma: float or np.ndarray
+    :param aCall: Колл (True) или пут (False)
+    :type aCall: bool or np.ndarray
+    :rtype: np.ndarray
+    """
+    aStrike = np.asarray(aStrike, dtype=float)
+    aT = np.asarray(aT, dtype=float)
+    aVol = np.asarray(aSigma, dtype=float) * np.sqrt(aT)
+    aD1 = (np.log(fSpot / aStrike) + fRate * aT) / aVol + aVol / 2
+    aD2 = aD1 - aVol
+    aK = aStrike * np.exp(-fRate * aT)
+    aCallPrice = fSpot * norm_cdf(aD1) - aK * norm_cdf(aD2)
+    # паритет колл-пут
+    return np.where(aCall, aCallPrice, aCallPrice - fSpot + aK)
+
+
+def option_grid(lStrikes, lMaturities, lSigmas, bCall=True):
+    """ Все сочетания страйков, сроков и волатильностей.
+
+    :param lStrikes: Страйки
+    :type lStrikes: list or tuple or np.ndarray
+    :param lMaturities: Сроки в годах
+    :type lMaturities: list or tuple or np.ndarray
+    :param lSigmas: Волатильности (доли единицы)
+    :type lSigmas: list or tuple or np.ndarray
+    :param bCall: Колл (True) или пут (False)
+    :type bCall: bool
+    :return: Таблица со столбцами STRIKE, MATURITY, SIGMA, CALL
+    :rtype: pd.DataFrame
+    """
+    oOptions = pd.DataFrame(list(product(lStrikes, lMaturities, lSigmas)),
+                            columns=['STRIKE', 'MATURITY', 'SIGMA'],
+                            dtype=float)
+    oOptions['CALL'] = bCall
+    return oOptions
+
+
+def _simulate(fSpot, fRate, aStrike, aT, aSigma, aCall, iPaths, oSeed,
+              bAntithetic):
+    """ Один блок путей для всех опционов. Выполняется и в отдельном
+    процессе.
+
+    :return: По опционам: n, средние Y и X, суммы квадратов отклонений Y
+        и X от средних и сумма произведений отклонений, где Y —
+        дисконтированная выплата, X — дисконтированная цена актива
+        (при антитетических путях — средние по паре путей)
+    :rtype: np.ndarray
+    """
+    oRng = np.random.default_rng(oSeed)
+    aZ = oRng.standard_normal(iPaths // 2 if bAntithetic else iPaths)
+    aVol = (aSigma * np.sqrt(aT))[:, None]
+    aDrift = (-aSigma ** 2 / 2 * aT)[:, None]
+    aK = (aStrike * np.exp(-fRate * aT))[:, None]
+    bCall = aCall[:, None]
+
+    def sample(aShock):
+        # дисконтированная цена актива: среднее равно fSpot
+        aX = fSpot * np.exp(aDrift + aShock)
+        return aX, np.maximum(np.where(bCall, aX - aK, aK - aX), 0.0)
+
+    aX, aY = sample(aVol * aZ)
+    if bAntithetic:
+        aXAnti, aYAnti = sample(-aVol * aZ)
+        aX = (aX + aXAnti) / 2
+        aY = (aY + aYAnti) / 2
+
+    aMY = aY.mean(axis=1)
+    aMX = aX.mean(axis=1)
+    aY -= aMY[:, None]
+    aX -= aMX[:, None]
+    return np.stack([np.full(len(aStrike), float(aZ.size)), aMY, aMX,
+                     (aY * aY).sum(axis=1), (aX * aX).sum(axis=1),
+                     (aX * aY).sum(axis=1)])
+
+
+def _merge(aLeft, aRight):
+    """ Объединяет статистики двух блоков (см. _simulate) без потери
+    точности на больших суммах. """
+    aN = aLeft[0] + aRight[0]
+    aWeight = aLeft[0] * aRight[0] / aN
+    aDY = aRight[1] - aLeft[1]
+    aDX = aRight[2] - aLeft[2]
+    return np.stack([aN,
+                     aLeft[1] + aDY * aRight[0] / aN,
+                     aLeft[2] + aDX * aRight[0] / aN,
+                     aLeft[3] + aRight[3] + aDY * aDY * aWeight,
+                     aLeft[4] + aRight[4] + aDX * aDX * aWeight,
+                     aLeft[5] + aRight[5] + aDX * aDY * aWeight])
+
+
+def monte_carlo(oOptions, fSpot, fRate, iPaths=100000, iChunk=20000,
+                iSeed=1000, iWorkers=1, bAntithetic=True, bControl=True):
+    """ Цены европейских опционов методом Монте-Карло.
+
+    :param oOptions: Опционы со столбцами STRIKE, MATURITY, SIGMA и
+        необязательным CALL (по умолчанию колл)
+    :type oOptions: pd.DataFrame
+    :param fSpot: Цена актива
+    :type fSpot: float
+    :param fRate: Безрисковая ставка (непрерывная, доли единицы)
+    :type fRate: float
+    :param iPaths: Количество путей на опцион (при антитетических путях
+        нечётное число дополняется одним путём)
+    :type iPaths: int
+    :param iChunk: Количество путей в блоке (память — опционы × iChunk)
+    :type iChunk: int
+    :param iSeed: Начальное значение генератора
+    :type iSeed: int
+    :param iWorkers: Количество процессов (1 — без процессов)
+    :type iWorkers: int
+    :param bAntithetic: Антитетические пути
+    :type bAntithetic: bool
+    :param bControl: Контрольная переменная — цена актива
+    :type bControl: bool
+    :return: Таблица опционов с добавленными столбцами PRICE, STDERR
+        (стандартная ошибка цены) и BS (цена по формуле Блэка-Шоулза)
+    :rtype: pd.DataFrame
+    """
+    aStrike = oOptions['STRIKE'].to_numpy(dtype=float)
+    aT = oOptions['MATURITY'].to_numpy(dtype=float)
+    aSigma = oOptions['SIGMA'].to_numpy(dtype=float)
+    aCall = oOptions['CALL'].to_numpy(dtype=bool) \
+        if 'CALL' in oOptions else np.ones(len(oOptions), dtype=bool)
+
+    if bAntithetic:
+        iChunk += iChunk % 2
+    lSizes = [min(iChunk, iPaths - iStart)
+              for iStart in range(0, iPaths, iChunk)]
+    if bAntithetic:
+        # пути идут парами: последний блок нечётного размера дополняется
+        # до пары, иначе блок из одного пути остаётся без чисел
+        lSizes[-1] += lSizes[-1] % 2
+    lSeeds = np.random.SeedSequence(iSeed).spawn(len(lSizes))
+    lArgs = [(fSpot, fRate, aStrike, aT, aSigma, aCall, iSize, oSeed,
+              bAntithetic) for iSize, oSeed in zip(lSizes, lSeeds)]
+    if iWorkers > 1 and len(lArgs) > 1:
+        with ProcessPoolExecutor(
+                max_workers=min(iWorkers, len(lArgs))) as oExecutor:
+            lStats = list(oExecutor.map(_simulate, *zip(*lArgs)))
+    else:
+        lStats = [_simulate(*tArgs) for tArgs in lArgs]
+
+    aN, aMY, aMX, aVarY, aVarX, aCov = reduce(_merge, lStats)
+    aVarY /= aN - 1
+    aVarX /= aN - 1
+    aCov /= aN - 1
+    aBeta = np.zeros_like(aMY)
+    if bControl:
+        np.divide(aCov, aVarX, out=aBeta, where=aVarX > 0)
+    aVar = aVarY - 2 * aBeta * aCov + aBeta * aBeta * aVarX
+
+    return oOptions.assign(
+        PRICE=aMY - aBeta * (aMX - fSpot),
+        STDERR=np.sqrt(np.maximum(aVar, 0.0) / aN),
+        BS=bs_price(fSpot, aStrike, aT, fRate, aSigma, aCall))
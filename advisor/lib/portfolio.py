@@ -17,55 +17,94 @@
 #     along with this program.  If not, see <https://www.gnu.org/licenses/>.
 
 import numpy as np
-import pandas as pd
 
-from advisor.lib.math import weighted_average_pandas
+from advisor.lib.ledger import PositionLedger
 
 
 class Portfolio:
-    def __init__(self, oConnector):
+    def __init__(self, oConnector, oReader=None):
+        """
+
+        :param oConnector: Соединение для записи состояния позиций
+        :type oConnector: advisor.lib.sql.SQL
+        :param oReader: Соединение для выборок (по умолчанию oConnector)
+        :type oReader: advisor.lib.sql.SQL or None
+        """
         self.oConnector = oConnector
+        self.oReader = oReader or oConnector
+        # (версия рыночных данных, состояние позиций) и таблица портфеля
+        self.tCache = None
 
     def portfolio_data(self):
-        # все преобразования проходят в DataFrame Pandas, если не указано иное
-        oPortfolio = self.oConnector.portfolio(pd)
-
-        # удаляем проданные бумаги
-        oPortfolio.loc[oPortfolio['event_id'] == 5, 'tool_count'] =\
-            oPortfolio.loc[oPortfolio['event_id'] == 5, 'tool_count'] * -1
-
-        oPortfolio = oPortfolio.sort_values(['tool_type', 'tool_code'])
-        # суммируем количество по коду инструмента
-        oSumByTool = oPortfolio.groupby('tool_code', as_index=False).agg(
-            {'tool_count': 'sum'})
-        oSumByTool['tool_count'] = oSumByTool['tool_count'].astype(int)
-
-        # находим средневзвешенную цену (PWA - Price Weighted Average)
-        oSeriesPWA = weighted_average_pandas(oPortfolio)
-
-        oPortfolio = oPortfolio.groupby('tool_code', as_index=False).agg(
-            {'tool_type': 'min', 'SHORTNAME': 'min'})
-        oPortfolio = oPortfolio.sort_values(by=['tool_type', 'tool_code'])
-        # перемещаем столбец в начало
-        type_tool = oPortfolio['tool_type']
-        oPortfolio.drop(labels=['tool_type'], axis=1, inplace=True)
-        oPortfolio.insert(0, 'tool_type', type_tool)
-
-        # объединяем таблицы
-        oPortfolio['tool_price'] = oSeriesPWA.values.round(2)
-        oPortfolio.insert(4, 'tool_count', oSumByTool['tool_count'])
-
-        oPortfolio.insert(5, 'sum',
-                          (oPortfolio['tool_price'] *
-                           oPortfolio['tool_count']).round(2))
-
-        oPortfolio.columns = ['Тип актива', 'Код актива', 'Имя актива',
-                              'Средняя цена покупки', 'Количество', 'Сумма']
+        # позиции считаются по сохранённому состоянию и новым операциям
+        oLedger = PositionLedger(self.oConnector, self.oReader)
+        oPositions = oLedger.update()
+        # оценка не меняется до нового импорта данных или новых операций
+        tKey = (self.oReader.get_data_version('MarketData')[0],
+                *oLedger.signature())
+        if self.tCache is not None and self.tCache[0] == tKey:
+            return self.tCache[1].copy()
+
+        oPositions = oPositions[oPositions['quantity'] > 0]
+
+        oTools = self.oReader.get_portfolio_tools(oPositions.index)
+        oPositions = oPositions.reindex(oTools['tool_code'])
+        oPortfolio = oTools.assign(
+            tool_price=oPositions['wac'].to_numpy().round(2),
+            tool_count=oPositions['quantity'].to_numpy().astype(int))
+        oPortfolio['sum'] = (oPortfolio['tool_price'] *
+                             oPortfolio['tool_count']).round(2)
+        oPortfolio['fifo'] = oPositions['fifo'].to_numpy().round(2)
+        oPortfolio['realized'] = oPositions['realized'].to_numpy().round(2)
+        oPortfolio['realized_fifo'] = \
+            oPositions['realized_fifo'].to_numpy().round(2)
+
+        oPortfolio.columns = ['Код актива', 'Тип актива', 'Имя актива',
+                              'Средняя цена покупки', 'Количество', 'Сумма',
+                              'Средняя цена FIFO', 'Реализовано',
+                              'Реализовано FIFO']
+        oPortfolio = oPortfolio[['Тип актива', 'Код актива', 'Имя актива',
+                                 'Средняя цена покупки', 'Количество',
+                                 'Сумма', 'Средняя цена FIFO', 'Реализовано',
+                                 'Реализовано FIFO']]
 
         oPortfolio = oPortfolio.dropna()
+        oPortfolio = self.valuation(oPortfolio)
         oPortfolio.index = np.arange(1, len(oPortfolio) + 1)
-
-        return oPortfolio
+        self.tCache = (tKey, oPortfolio)
+
+        return oPortfolio.copy()
+
+    def valuation(self, oPortfolio):
+        """ Оценивает позиции по последним рыночным данным одним запросом.
+
+        Цена покупки считается ценой одной бумаги в валюте без НКД, цена
+        облигации на рынке — процент от текущего номинала.
+
+        :param oPortfolio: Портфель со столбцами Код актива, Количество,
+            Средняя цена покупки
+        :type oPortfolio: pd.DataFrame
+        :return: Портфель со столбцами рыночной цены, НКД, стоимости,
+            нереализованного результата, доходности и доли в портфеле
+        :rtype: pd.DataFrame
+        """
+        oMarket = self.oReader.get_market_snapshot(
+            oPortfolio['Код актива']).set_index('tool_code').reindex(
+            oPortfolio['Код актива'])
+        aCount = oPortfolio['Количество'].to_numpy(dtype=float)
+        aPrice = oMarket['PRICE'].to_numpy(dtype=float)
+        aAccrued = oMarket['ACCRUEDINT'].to_numpy(dtype=float)
+        aValue = aCount * (aPrice + aAccrued)
+
+        return oPortfolio.assign(**{
+            'Рыночная цена': aPrice.round(2),
+            'НКД': (aCount * aAccrued).round(2),
+            'Стоимость': aValue.round(2),
+            'Нереализованный результат': (aCount * (
+                aPrice - oPortfolio['Средняя цена покупки'].to_numpy(
+                    dtype=float))).round(2),
+            'Доходность, %': oMarket['YIELD'].to_numpy(dtype=float),
+            'Доля, %': (100 * aValue / np.nansum(aValue)).round(2)})
 
 
 if __name__ == '__main__':
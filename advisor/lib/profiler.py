@@ -0,0 +1,233 @@
+#     This code is a part of program Advisor
+#     Copyright (C) 2022 contributors Advisor
+#     The full list is available at the link
+#     https://github.com/tagezi/advisor/blob/master/contributors.txt
+#
+#     This program is free software: you can redistribute it and/or modify
+#     it under the terms of the GNU General Public License as published by
+#     the Free Software Foundation, either version 3 of the License, or
+#     (at your option) any later version.
+#
+#     This program is distributed in the hope that it will be useful,
+#     but WITHOUT ANY WARRANTY; without even the implied warranty of
+#     MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#     GNU General Public License for more details.
+#
+#     You should have received a copy of the GNU General Public License
+#     along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+""" The module collects timings of SQL queries.
+
+Queries are grouped by template: the text of the query with literals
+replaced by ? and spaces collapsed. For every template the profiler keeps
+the number of calls, latencies and rows, and the plan of the query
+(EXPLAIN QUERY PLAN) taken the first time the template is seen.
+
+Function:
+    get_template(sSQL)
+
+Class:
+    ProfiledCursor
+    QueryProfiler
+
+Using:
+    oProfiler = QueryProfiler(oConnection)
+    oProfiler.record(sSQL, tValues, fSeconds, iRows)
+    oProfiler.dump('profile.json')
+"""
+
+import json
+import logging
+import re
+from sqlite3 import DatabaseError
+
+import numpy as np
+
+# string literals, numbers and lists of placeholders in a query
+RE_STRING = re.compile(r"'(?:[^']|'')*'|\"(?:[^\"]|\"\")*\"")
+RE_NUMBER = re.compile(r'(?<![\w.])-?\d+(?:\.\d+)?(?![\w.])')
+RE_LIST = re.compile(r'\(\s*\?(?:\s*,\s*\?)+\s*\)')
+RE_SPACE = re.compile(r'\s+')
+
+
+def get_template(sSQL):
+    """ Returns the template of the query: literals are replaced by ?,
+    lists of placeholders are collapsed, spaces are normalized.
+
+    Note:
+        Double-quoted strings are treated as literals since the program
+        uses them for values in LIKE conditions.
+
+    :param sSQL: SQL query.
+    :type sSQL: str
+    :return: The template of the query.
+    :rtype: str
+    """
+    sTemplate = RE_STRING.sub('?', sSQL)
+    sTemplate = RE_NUMBER.sub('?', sTemplate)
+    sTemplate = RE_LIST.sub('(?...)', sTemplate)
+    return RE_SPACE.sub(' ', sTemplate).strip()
+
+
+class ProfiledCursor:
+    """ The cursor with already fetched rows. The profiler fetches rows
+    of the query at once to count them and to include fetching in
+    the latency. """
+
+    def __init__(self, oCursor, lRows):
+        self.oCursor = oCursor
+        self.lRows = lRows
+        self.iPosition = 0
+
+    @property
+    def description(self):
+        return self.oCursor.description
+
+    @property
+    def lastrowid(self):
+        return self.oCursor.lastrowid
+
+    @property
+    def rowcount(self):
+        return self.oCursor.rowcount
+
+    def fetchone(self):
+        if self.iPosition >= len(self.lRows):
+            return None
+        self.iPosition += 1
+        return self.lRows[self.iPosition - 1]
+
+    def fetchmany(self, iSize=1):
+        lRows = self.lRows[self.iPosition:self.iPosition + iSize]
+        self.iPosition += len(lRows)
+        return lRows
+
+    def fetchall(self):
+        lRows = self.lRows[self.iPosition:]
+        self.iPosition = len(self.lRows)
+        return lRows
+
+    def __iter__(self):
+        while self.iPosition < len(self.lRows):
+            yield self.fetchone()
+
+
+class QueryProfiler:
+    """ Collects timings of queries by templates.
+
+    *Methods*
+        * record -- Records one execution of a query.
+        * explain -- Returns the plan of the query.
+        * summary -- Returns statistics by templates.
+        * dump -- Writes the summary to a JSON file or to the log.
+        * reset -- Forgets all collected statistics.
+    """
+
+    def __init__(self, oConnection, bExplain=True):
+        """ Initializes the profiler.
+
+        :param oConnection: The connection to get plans of queries.
+        :type oConnection: sqlite3.Connection
+        :param bExplain: Whether to take plans of queries.
+        :type bExplain: bool
+        """
+        self.oConnection = oConnection
+        self.bExplain = bExplain
+        self.dTemplates = {}
+
+    def reset(self):
+        """ Forgets all collected statistics. """
+        self.dTemplates = {}
+
+    def explain(self, sSQL, tValues=None):
+        """ Returns the plan of the query.
+
+        :param sSQL: SQL query.
+        :type sSQL: str
+        :param tValues: Values of the query.
+        :type tValues: tuple or list or None
+        :return: Details of the plan steps or None if the query has no plan
+            (PRAGMA, BEGIN, DDL and so on).
+        :rtype: list[str] or None
+        """
+        if not re.match(r'\s*(SELECT|WITH|INSERT|UPDATE|DELETE|REPLACE)\b',
+                        sSQL, re.IGNORECASE):
+            return None
+
+        try:
+            oCursor = self.oConnection.execute(f'EXPLAIN QUERY PLAN {sSQL}',
+                                               tValues or ())
+            return [tRow[-1] for tRow in oCursor.fetchall()]
+        except DatabaseError as e:
+            logging.warning(f'The plan of the query was not received: {e}.')
+            return None
+
+    def record(self, sSQL, tValues, fSeconds, iRows):
+        """ Records one execution of a query.
+
+        :param sSQL: SQL query.
+        :type sSQL: str
+        :param tValues: Values of the query (for the plan).
+        :type tValues: tuple or list or None
+        :param fSeconds: Latency in seconds.
+        :type fSeconds: float
+        :param iRows: Rows returned or changed.
+        :type iRows: int
+        """
+        sTemplate = get_template(sSQL)
+        dTemplate = self.dTemplates.get(sTemplate)
+        if dTemplate is None:
+            lPlan = self.explain(sSQL, tValues) if self.bExplain else None
+            dTemplate = {'latencies': [], 'rows': 0, 'plan': lPlan,
+                         'scan': any(sStep.startswith('SCAN ') and
+                                     'USING' not in sStep
+                                     for sStep in lPlan or [])}
+            self.dTemplates[sTemplate] = dTemplate
+
+        dTemplate['latencies'].append(fSeconds)
+        dTemplate['rows'] += max(iRows, 0)
+
+    def summary(self):
+        """ Returns statistics by templates, the slowest templates first.
+
+        :return: Statistics with latencies in milliseconds.
+        :rtype: list[dict]
+        """
+        lSummary = []
+        for sTemplate, dTemplate in self.dTemplates.items():
+            aLatencies = np.array(dTemplate['latencies']) * 1000
+            fP50, fP95, fP99 = np.percentile(aLatencies, [50, 95, 99])
+            lSummary.append({'template': sTemplate,
+                             'count': len(aLatencies),
+                             'total_ms': float(aLatencies.sum()),
+                             'mean_ms': float(aLatencies.mean()),
+                             'p50_ms': float(fP50),
+                             'p95_ms': float(fP95),
+                             'p99_ms': float(fP99),
+                             'max_ms': float(aLatencies.max()),
+                             'rows': dTemplate['rows'],
+                             'scan': dTemplate['scan'],
+                             'plan': dTemplate['plan']})
+
+        return sorted(lSummary, key=lambda d: d['total_ms'], reverse=True)
+
+    def dump(self, sFile=''):
+        """ Writes the summary to a JSON file or, if the file is not given,
+        to the log.
+
+        :param sFile: Path to the JSON file.
+        :type sFile: str
+        """
+        lSummary = self.summary()
+        if sFile:
+            with open(sFile, 'w') as fFile:
+                json.dump(lSummary, fFile, ensure_ascii=False, indent=2)
+            return
+
+        for dTemplate in lSummary:
+            sScan = ' SCAN' if dTemplate['scan'] else ''
+            logging.info(f'{dTemplate["count"]} x '
+                         f'{dTemplate["total_ms"]:.1f} ms '
+                         f'(p95 {dTemplate["p95_ms"]:.2f} ms, '
+                         f'rows {dTemplate["rows"]}){sScan}: '
+                         f'{dTemplate["template"]}')
@@ -0,0 +1,241 @@
+#     This code is a part of program Advisor
+#     Copyright (C) 2022 contributors Advisor
+#     The full list is available at the link
+#     https://github.com/tagezi/advisor/blob/master/contributors.txt
+#
+#     This program is free software: you can redistribute it and/or modify
+#     it under the terms of the GNU General Public License as published by
+#     the Free Software Foundation, either version 3 of the License, or
+#     (at your option) any later version.
+#
+#     This program is distributed in the hope that it will be useful,
+#     but WITHOUT ANY WARRANTY; without even the implied warranty of
+#     MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#     GNU General Public License for more details.
+#
+#     You should have received a copy of the GNU General Public License
+#     along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+""" Сценарии сдвига кривой бескупонной доходности (КБД).
+
+Сценарий — сумма трёх движений ставок в базисных пунктах: параллельного
+сдвига (SHIFT), поворота (TWIST: короткий конец вниз, длинный вверх
+вокруг срока TWIST_PIVOT) и бабочки (BUTTERFLY: середина кривой вверх,
+края вниз). Облигации переоцениваются по КБД с их Z-спредом, поэтому при
+нулевом сценарии цена совпадает с рыночной. Выплаты дисконтируются сразу
+для всех сценариев, облигаций и дат выплат (сценарии × облигации × даты);
+сценарии идут блоками, чтобы не занимать лишнюю память.
+
+Function:
+    shift_weights(aTimes)
+    scenario_grid(lShifts, lTwists=(0.0,), lButterflies=(0.0,))
+    default_scenarios()
+    scenario_values(aPV, aTimes, oScenarios, iBlock=SCENARIO_BLOCK)
+    bond_scenarios(oEngine, oTableData, oCurve, oScenarios)
+    portfolio_scenarios(oAnalysis, oPortfolio, oScenarios=None, oCurve=None)
+
+Using:
+    oCurve = YeldCurve(oReader).oCurve
+    oPnL, oBonds = portfolio_scenarios(oBondAnalysis, oPortfolio,
+                                       scenario_grid([-100, 0, 100]), oCurve)
+"""
+
+from itertools import product
+
+import numpy as np
+import pandas as pd
+
+from advisor.lib.bond_engine import BondEngine
+from advisor.lib.math import bond_zspread, cashflow_matrix
+from advisor.lib.zero_curve import ZeroCurve
+
+# Срок (лет), вокруг которого поворачивается кривая, и середина бабочки
+TWIST_PIVOT = 5.0
+BUTTERFLY_BELLY = 5.0
+# Сколько элементов (сценарии × облигации × даты) считается за один раз
+SCENARIO_BLOCK = 2 ** 22
+# Столбцы таблицы сценариев портфеля
+SCENARIO_COLUMNS = {'SHIFT': 'Сдвиг, б.п.',
+                    'TWIST': 'Поворот, б.п.',
+                    'BUTTERFLY': 'Бабочка, б.п.',
+                    'PNL': 'Результат, руб',
+                    'PNL_PERCENT': 'Результат, %'}
+
+
+def shift_weights(aTimes):
+    """ Доли поворота и бабочки, на которые сдвигается ставка срока.
+
+    Поворот: -1 на нулевом сроке, 0 на TWIST_PIVOT, +1 от двух TWIST_PIVOT.
+    Бабочка: +1 на BUTTERFLY_BELLY, -1 на нулевом сроке и от двух
+    BUTTERFLY_BELLY.
+
+    :param aTimes: Сроки в годах
+    :type aTimes: np.ndarray
+    :return: Доли поворота и бабочки той же формы, что сроки
+    :rtype: tuple[np.ndarray, np.ndarray]
+    """
+    aT = np.asarray(aTimes, dtype=float)
+    aTwist = np.clip(aT / TWIST_PIVOT - 1, -1.0, 1.0)
+    aButterfly = np.clip(
+        1 - 2 * np.abs(aT - BUTTERFLY_BELLY) / BUTTERFLY_BELLY, -1.0, 1.0)
+    return aTwist, aButterfly
+
+
+def scenario_grid(lShifts, lTwists=(0.0,), lButterflies=(0.0,)):
+    """ Все сочетания сдвига, поворота и бабочки.
+
+    :param lShifts: Параллельные сдвиги, б.п.
+    :type lShifts: list or tuple or np.ndarray
+    :param lTwists: Повороты, б.п.
+    :type lTwists: list or tuple or np.ndarray
+    :param lButterflies: Бабочки, б.п.
+    :type lButterflies: list or tuple or np.ndarray
+    :return: Таблица со столбцами SHIFT, TWIST, BUTTERFLY, индекс —
+        название сценария
+    :rtype: pd.DataFrame
+    """
+    oScenarios = pd.DataFrame(
+        list(product(lShifts, lTwists, lButterflies)),
+        columns=['SHIFT', 'TWIST', 'BUTTERFLY'], dtype=float)
+    oScenarios.index = [f'S{fShift:+g} T{fTwist:+g} B{fButterfly:+g}'
+                        for fShift, fTwist, fButterfly
+                        in oScenarios.itertuples(index=False)]
+    return oScenarios
+
+
+def default_scenarios():
+    """ Стандартный набор: параллельные сдвиги, крутизна и бабочка.
+
+    :rtype: pd.DataFrame
+    """
+    lRows = [(fShift, 0.0, 0.0)
+             for fShift in (-200, -100, -50, -25, 25, 50, 100, 200)]
+    lRows += [(0.0, fTwist, 0.0) for fTwist in (-50, 50)]
+    lRows += [(0.0, 0.0, fButterfly) for fButterfly in (-50, 50)]
+    lNames = [f'Сдвиг {tRow[0]:+g}' for tRow in lRows[:8]] + \
+        ['Выполаживание', 'Рост крутизны', 'Бабочка -50', 'Бабочка +50']
+    return pd.DataFrame(lRows, columns=['SHIFT', 'TWIST', 'BUTTERFLY'],
+                        index=lNames)
+
+
+def scenario_values(aPV, aTimes, oScenarios, iBlock=SCENARIO_BLOCK):
+    """ Стоимость выплат облигаций во всех сценариях.
+
+    Выплата, дисконтированная по исходной кривой, умножается на
+    exp(-dr(t) * t), где dr(t) — сдвиг ставки сценария на сроке выплаты.
+
+    :param aPV: Выплаты, дисконтированные по исходной кривой (облигация ×
+        выплата)
+    :type aPV: np.ndarray
+    :param aTimes: Сроки выплат в годах той же формы
+    :type aTimes: np.ndarray
+    :param oScenarios: Сценарии со столбцами SHIFT, TWIST, BUTTERFLY (б.п.)
+    :type oScenarios: pd.DataFrame
+    :param iBlock: Наибольшее число элементов одного блока расчёта
+    :type iBlock: int
+    :return: Стоимость облигаций (сценарий × облигация)
+    :rtype: np.ndarray
+    """
+    aTwist, aButterfly = shift_weights(aTimes)
+    # вклад каждого движения в показатель экспоненты: dr * t
+    aFactors = np.stack([aTimes, aTwist * aTimes, aButterfly * aTimes])
+    aMoves = oScenarios[['SHIFT', 'TWIST', 'BUTTERFLY']].to_numpy(
+        dtype=float) / 10000
+
+    aValues = np.empty((len(aMoves), aPV.shape[0]))
+    iStep = max(1, iBlock // max(aPV.size, 1))
+    for iStart in range(0, len(aMoves), iStep):
+        aExp = np.tensordot(aMoves[iStart:iStart + iStep], aFactors,
+                            axes=1)
+        np.negative(aExp, out=aExp)
+        np.exp(aExp, out=aExp)
+        aValues[iStart:iStart + iStep] = np.einsum('snm,nm->sn', aExp, aPV)
+
+    return aValues
+
+
+def bond_scenarios(oEngine, oTableData, oCurve, oScenarios):
+    """ Изменение цены облигаций в каждом сценарии.
+
+    :param oEngine: Расчёт по всем облигациям
+    :type oEngine: BondEngine
+    :param oTableData: Таблица облигаций со столбцами SECID, FACEVALUE,
+        PREVPRICE, ACCRUEDINT
+    :type oTableData: pd.DataFrame
+    :param oCurve: Кривая бескупонной доходности
+    :type oCurve: advisor.lib.zero_curve.ZeroCurve
+    :param oScenarios: Сценарии со столбцами SHIFT, TWIST, BUTTERFLY (б.п.)
+    :type oScenarios: pd.DataFrame
+    :return: Таблица по SECID: столбец PRICE (грязная цена) и столбцы
+        сценариев с изменением цены одной облигации в валюте; облигации
+        без выплат получают NaN
+    :rtype: pd.DataFrame
+    """
+    oIndex = pd.Index(oTableData['SECID'])
+    aPrice = oEngine.dirty_price(oTableData)
+    aTimes, aAmounts = cashflow_matrix(oEngine.cashflows(oIndex), oIndex)
+
+    bFlow = aAmounts > 0
+    aRates = np.zeros_like(aTimes)
+    aRates[bFlow] = oCurve.spot(aTimes[bFlow])
+    # спред к кривой делает цену нулевого сценария рыночной
+    aZSpread, _, _, _ = bond_zspread(aPrice, aTimes, aAmounts, aRates)
+    aZSpread = np.nan_to_num(aZSpread)
+    aPV = aAmounts * np.exp(-(aRates + aZSpread[:, None]) * aTimes)
+
+    aValues = scenario_values(aPV, aTimes, oScenarios)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        aPnL = aPrice * (aValues / aPV.sum(axis=1) - 1)
+
+    oBonds = pd.DataFrame(aPnL.T, index=oIndex, columns=oScenarios.index)
+    oBonds.insert(0, 'PRICE', aPrice)
+    return oBonds
+
+
+def portfolio_scenarios(oAnalysis, oPortfolio, oScenarios=None, oCurve=None):
+    """ Результат портфеля облигаций в каждом сценарии. Облигации портфеля
+    и все облигации базы с ценой переоцениваются одним расчётом; выплаты
+    облигаций портфеля при необходимости получаются с биржи, остальных —
+    только из базы.
+
+    :param oAnalysis: Доступ к базе данных и бирже
+    :type oAnalysis: advisor.lib.bond_analysis.BondAnalysis
+    :param oPortfolio: Портфель из Portfolio.portfolio_data
+    :type oPortfolio: pd.DataFrame
+    :param oScenarios: Сценарии (по умолчанию default_scenarios)
+    :type oScenarios: pd.DataFrame or None
+    :param oCurve: Кривая (по умолчанию последняя КБД из базы)
+    :type oCurve: advisor.lib.zero_curve.ZeroCurve or None
+    :return: Таблица по сценариям со столбцами SHIFT, TWIST, BUTTERFLY,
+        PNL (руб), PNL_PERCENT (% стоимости облигаций портфеля) и таблица
+        облигаций как у bond_scenarios; пустые, если в базе нет КБД
+    :rtype: tuple[pd.DataFrame, pd.DataFrame]
+    """
+    oConnector = oAnalysis.oConnector
+    oScenarios = default_scenarios() if oScenarios is None else oScenarios
+    oCurve = oCurve or ZeroCurve.from_db(oConnector)
+    oTable = oScenarios[['SHIFT', 'TWIST', 'BUTTERFLY']].copy()
+    if oCurve is None:
+        return oTable.assign(PNL=np.nan, PNL_PERCENT=np.nan), \
+            pd.DataFrame(columns=['PRICE', *oScenarios.index])
+
+    oCount = oPortfolio.groupby('Код актива')['Количество'].sum()
+    oHeld = oConnector.get_bond_quotes(oCount.index)
+    oQuotes = pd.concat([oHeld, oConnector.get_bond_quotes()],
+                        ignore_index=True).drop_duplicates('SECID').dropna()
+    oQuotes = oQuotes[oQuotes['PREVPRICE'] > 0]
+
+    oEngine = BondEngine(oAnalysis)
+    # выплаты облигаций портфеля догружаются с биржи заранее
+    oEngine.load(oHeld['SECID'], 'coupons')
+    oEngine.load(oHeld['SECID'], 'amort')
+    oEngine.bFetch = False
+    oBonds = bond_scenarios(oEngine, oQuotes, oCurve, oScenarios)
+
+    aCount = oCount.reindex(oBonds.index).fillna(0).to_numpy()
+    fValue = (oBonds['PRICE'].to_numpy() * aCount).sum()
+    oTable['PNL'] = np.nan_to_num(
+        oBonds[oScenarios.index].to_numpy()).T @ aCount
+    oTable['PNL_PERCENT'] = oTable['PNL'] / fValue * 100 if fValue else np.nan
+
+    return oTable, oBonds
@@ -0,0 +1,116 @@
+#     This code is a part of program Advisor
+#     Copyright (C) 2022 contributors Advisor
+#     The full list is available at the link
+#     https://github.com/tagezi/advisor/blob/master/contributors.txt
+#
+#     This program is free software: you can redistribute it and/or modify
+#     it under the terms of the GNU General Public License as published by
+#     the Free Software Foundation, either version 3 of the License, or
+#     (at your option) any later version.
+#
+#     This program is distributed in the hope that it will be useful,
+#     but WITHOUT ANY WARRANTY; without even the implied warranty of
+#     MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#     GNU General Public License for more details.
+#
+#     You should have received a copy of the GNU General Public License
+#     along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+""" Спреды облигаций к кривой бескупонной доходности (КБД).
+
+Z-спред — постоянная добавка к непрерывным ставкам КБД, при которой
+дисконтированные выплаты облигации равны её цене; решается сразу для всех
+облигаций (см. math.bond_zspread). G-спред — разница доходности к
+погашению и ставки КБД на сроке, равном дюрации облигации. Оба спреда в
+базисных пунктах.
+
+Function:
+    bond_spreads(oEngine, oTableData, oCurve, oPrice=None)
+    universe_spreads(oAnalysis, oCurve=None)
+
+Using:
+    oCurve = ZeroCurve.from_db(oConnector)
+    oSpreads = bond_spreads(BondEngine(oBondAnalysis), oTableData, oCurve)
+    oAll = universe_spreads(oBondAnalysis)
+"""
+
+import numpy as np
+import pandas as pd
+
+from advisor.lib.bond_engine import BondEngine
+from advisor.lib.bond_risk import risk_measures
+from advisor.lib.math import bond_zspread, cashflow_matrix
+from advisor.lib.zero_curve import ZeroCurve
+
+# Столбцы таблицы облигаций со спредами
+SPREAD_COLUMNS = {'ZSPREAD': 'Z-спред, б.п.',
+                  'GSPREAD': 'G-спред, б.п.'}
+
+
+def bond_spreads(oEngine, oTableData, oCurve, oPrice=None, tMatrix=None,
+                 oYields=None):
+    """ Z-спред и G-спред для всех облигаций таблицы одним расчётом.
+
+    :param oEngine: Расчёт по всем облигациям
+    :type oEngine: BondEngine
+    :param oTableData: Таблица облигаций со столбцами SECID, FACEVALUE,
+        PREVPRICE, ACCRUEDINT
+    :type oTableData: pd.DataFrame
+    :param oCurve: Кривая бескупонной доходности
+    :type oCurve: advisor.lib.zero_curve.ZeroCurve
+    :param oPrice: Цены в процентах от номинала (по умолчанию PREVPRICE)
+    :type oPrice: pd.Series or np.ndarray or None
+    :param tMatrix: Матрицы сроков и сумм выплат (см. cashflow_matrix),
+        если они уже построены
+    :type tMatrix: tuple[np.ndarray, np.ndarray] or None
+    :param oYields: Доходности из BondEngine.ytm для этих матриц и цен,
+        если они уже посчитаны
+    :type oYields: pd.DataFrame or None
+    :return: Таблица по SECID со столбцами YIELD (%), DURATION (лет),
+        ZSPREAD и GSPREAD (б.п.)
+    :rtype: pd.DataFrame
+    """
+    oIndex = pd.Index(oTableData['SECID'])
+    aPrice = oEngine.dirty_price(oTableData, oPrice)
+    # одни и те же матрицы выплат для доходности, дюрации и Z-спреда
+    if tMatrix is None:
+        tMatrix = cashflow_matrix(oEngine.cashflows(oIndex), oIndex)
+    aTimes, aAmounts = tMatrix
+    if oYields is None:
+        oYields = oEngine.ytm(oTableData, oPrice, tMatrix=tMatrix)
+    aYield = oYields['YIELD'].to_numpy()
+    _, aDuration, _, _, _ = risk_measures(aYield / 100, aTimes, aAmounts)
+
+    # ставки КБД только на сроки настоящих выплат
+    bFlow = aAmounts > 0
+    aRates = np.zeros_like(aTimes)
+    aRates[bFlow] = oCurve.spot(aTimes[bFlow])
+    aZSpread, _, _, _ = bond_zspread(aPrice, aTimes, aAmounts, aRates)
+    with np.errstate(invalid='ignore'):
+        aGSpread = (aYield - oCurve.spot_percent(aDuration)) * 100
+
+    return pd.DataFrame({'YIELD': aYield,
+                         'DURATION': aDuration,
+                         'ZSPREAD': aZSpread * 10000,
+                         'GSPREAD': aGSpread}, index=oIndex)
+
+
+def universe_spreads(oAnalysis, oCurve=None):
+    """ Спреды всех облигаций базы, у которых есть цена. Выплаты берутся
+    только из базы: облигации без загруженных выплат получают NaN.
+
+    :param oAnalysis: Доступ к базе данных и бирже; цены и КБД читаются
+        через oReader
+    :type oAnalysis: advisor.lib.bond_analysis.BondAnalysis
+    :param oCurve: Кривая (по умолчанию последняя КБД из базы)
+    :type oCurve: advisor.lib.zero_curve.ZeroCurve or None
+    :return: Таблица как у bond_spreads; пустая, если в базе нет КБД
+    :rtype: pd.DataFrame
+    """
+    oReader = oAnalysis.oReader
+    oCurve = oCurve or ZeroCurve.from_db(oReader)
+    oQuotes = oReader.get_bond_quotes().dropna()
+    if oCurve is None or oQuotes.empty:
+        return pd.DataFrame(columns=['YIELD', 'DURATION', *SPREAD_COLUMNS])
+
+    return bond_spreads(BondEngine(oAnalysis, bFetch=False), oQuotes, oCurve)
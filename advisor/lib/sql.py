@@ -28,20 +28,80 @@ Class:
 
 Using:
     Foo = SQL(_DataBaseFile_)
+
+    # with a connection profile
+    Foo = SQL(_DataBaseFile_, {'journal_mode': 'WAL', 'synchronous': 'NORMAL'})
 """
 
+import atexit
+import json
 import logging
 import pandas as pd
 import sqlite3
+import time
+from contextlib import contextmanager
+from os.path import abspath
+from pathlib import Path
 from sqlite3 import DatabaseError
 
 from advisor.lib.log import start_logging
+from advisor.lib.migrations import BOND_SCREEN_COLUMNS, BOND_SCREEN_SELECT, \
+    migrate
+from advisor.lib.profiler import ProfiledCursor, QueryProfiler
 from advisor.lib.str import str_get_file_patch
 
+# Codes of securities passed as one JSON parameter: such queries keep
+# a constant text and work on query_only connections, which refuse to
+# create temporary tables.
+SECID_LIST = ('WITH SECIDList (SECID) AS '
+              '(SELECT DISTINCT value FROM json_each(?)) ')
+
+# Pragmas that a connection profile can set and SQL.pragmas() reports
+PRAGMAS = ('journal_mode', 'synchronous', 'cache_size', 'mmap_size',
+           'temp_store', 'wal_autocheckpoint', 'query_only', 'locking_mode',
+           'foreign_keys', 'busy_timeout', 'page_size')
+
+# Queries of the bond screener. They read the materialized table BondScreen
+# (see SQL.refresh_bond_screen). The text of a query does not depend on values
+# of the filters, so sqlite3 prepares it once and takes it from the statement
+# cache later. An optional predicate is turned off by its flag or by NULL:
+# (:flag = 0 OR predicate), (:value IS NULL OR predicate).
+SCREEN_BONDS = (
+    "SELECT SECID, ISIN, SHORTNAME, MATDATE, PREVPRICE, YIELDATPREVWAPRICE, "
+    "EFFECTIVEYIELD, COUPONPERCENT, COUPONVALUE, ACCRUEDINT, NEXTCOUPON, "
+    "COUPONPERIOD, INITIALFACEVALUE, FACEVALUE, FACEUNIT, LISTLEVEL, EMITTER "
+    "FROM BondScreen "
+    "WHERE IS_SCREEN=1 "
+    "AND COUPONPERIOD BETWEEN :iMinPeriod AND :iMaxPeriod "
+    "AND FACEUNIT='SUR' "
+    "AND MATDATE>DATE('now') "
+    "AND INITIALFACEVALUE<=:iInitialFaceValue "
+    "AND FACEUNIT=:sFaceUnit "
+    "AND COUPONPERCENT>=:fPercent "
+    "AND COUPONVALUE>=:fMinCouponValue "
+    # только ОФЗ
+    "AND (:bOFZ=0 OR IS_OFZ=1) "
+    # коридор доходности и минимальная дата погашения не для ОФЗ
+    "AND (:bOFZ=1 OR :fMinYield IS NULL OR YIELDATPREVWAPRICE>:fMinYield) "
+    "AND (:bOFZ=1 OR :fMaxYield IS NULL OR YIELDATPREVWAPRICE<:fMaxYield) "
+    "AND (:bOFZ=1 OR :sMatDate IS NULL OR MATDATE>:sMatDate) "
+    "GROUP BY MATDATE;")
+
+SCREEN_PERIODS = (
+    "SELECT DISTINCT COUPONPERIOD "
+    "FROM BondScreen "
+    "WHERE HAS_OOO=0 "
+    "AND INITIALFACEVALUE<=:iInitialFaceValue "
+    "AND FACEUNIT=:sFaceUnit "
+    "AND MATDATE>:sMatDateStart "
+    "AND COUPONPERIOD<=:iMaxPeriod "
+    "ORDER BY COUPONPERIOD;")
+
 
 def check_connect_db(oConnector, sBasePath, sDBDir, sDBFile):
     """ Checks for the existence of a database and if it does not find it, then
-        creates it with default values.
+        creates it with default values. After that, upgrades the structure
+        of the database by migrations.
 
     :param oConnector: Instance attribute of SQL.
     :type oConnector: SQL
@@ -67,6 +127,8 @@ def check_connect_db(oConnector, sBasePath, sDBDir, sDBFile):
                 oConnector.execute_script(sql_script)
                 break
 
+    migrate(oConnector)
+
 
 def get_columns(sColumns, sConj='AND'):
     """ The function of parsing a string, accepts a list of table columns
@@ -121,10 +183,35 @@ class SQL:
         * export_db -- Method exports from db to sql script.
         * execute_script -- Method imports from slq script to db.
         * execute_query -- Method execute sql_search query.
+        * execute_many -- Method executes a query for each set of values.
+        * apply_profile -- Method sets pragmas of the connection.
+        * pragmas -- Method returns the current values of pragmas.
+        * file_size -- Method returns the size of the database.
+        * checkpoint -- Method moves the write-ahead log into the database.
+        * read_sql -- Method reads the result of a query into a DataFrame.
+        * start_profiling -- Method turns on the profiler of queries.
+        * stop_profiling -- Method turns off the profiler of queries.
+        * commit -- Method commits the current transaction.
+        * transaction -- Context manager that groups statements into one
+          transaction.
         * insert_row -- Method inserts a record in the database table.
         * delete_row -- Method deletes a row from the table.
         * update -- Method updates value(s) in record of the database table.
         * select -- Method does selection from the table.
+      # Bulk methods.
+        * insert_many -- Method inserts many records in one statement call.
+        * upsert_many -- Method inserts records or updates them by a key.
+        * update_many -- Method updates many records in one statement call.
+        * delete_many -- Method deletes many records in one statement call.
+      # High level API.
+        * refresh_bond_screen -- Method refreshes the table of the screener.
+        * secid_json -- Method packs codes of securities into JSON.
+        * set_secid_list -- Method fills the temporary list of SECID.
+        * get_cashflows -- Method returns coupons or amortizations of bonds.
+        * count_cashflows -- Method counts coupons or amortizations of bonds.
+        * get_bond_quotes -- Method returns face values and prices of bonds.
+        * bump_data_version -- Method raises the version of the data.
+        * get_data_version -- Method returns the version of the data.
       # Average level API.
         * sql_get_id: Finds id of the row by value(s) of table column(s).
         * sql_get_all: Method gets all records in database table.
@@ -133,24 +220,43 @@ class SQL:
     """
 
     # Standard methods
-    def __init__(self, sFileDB):
+    def __init__(self, sFileDB, dProfile=None):
         """ Initializes connect with database.
 
         :param sFileDB: Path to database as string.
         :type sFileDB: str
+        :param dProfile: Connection profile, pragmas and their values.
+            The key read_only opens the database in read-only mode.
+        :type dProfile: dict or None
+        :raises DatabaseError: If the database cannot be opened, for example
+            a read-only database whose file does not exist yet.
         """
         self.logging = start_logging()
+        # depth of nested transaction() blocks, commits wait for the outer one
+        self.iTransaction = 0
+        # QueryProfiler when profiling is on
+        self.oProfiler = None
+        dProfile = dict(dProfile or {})
+        bReadOnly = dProfile.pop('read_only', False)
+        self.oConnector = None
         try:
-            self.oConnector = sqlite3.connect(sFileDB)
+            if bReadOnly and sFileDB != ':memory:':
+                sURI = f'{Path(abspath(sFileDB)).as_uri()}?mode=ro'
+                self.oConnector = sqlite3.connect(sURI, uri=True)
+            else:
+                self.oConnector = sqlite3.connect(sFileDB)
         except DatabaseError as e:
-            print(f"An error has occurred: {e}.\n"
-                  f"String of query: {sFileDB}\n")
-            self.logging.exception(f"An error has occurred: {e}.\n"
-                                   f"String of query: {sFileDB}\n")
+            logging.exception(f"An error has occurred: {e}.\n"
+                              f"String of query: {sFileDB}\n")
+            # without a connection every later call would fail obscurely
+            raise
+
+        self.apply_profile(dProfile)
 
     def __del__(self):
         """ Closes connection with the database. """
-        self.oConnector.close()
+        if getattr(self, 'oConnector', None) is not None:
+            self.oConnector.close()
 
     # Low methods level
     def export_db(self):
@@ -191,19 +297,199 @@ class SQL:
             otherwise False.
         """
         oCursor = self.oConnector.cursor()
+        fStart = time.perf_counter()
         try:
             if tValues is None:
                 oCursor.execute(sSQL)
             else:
                 oCursor.execute(sSQL, tValues)
+            if self.oProfiler is not None and oCursor.description:
+                oCursor = ProfiledCursor(oCursor, oCursor.fetchall())
         except DatabaseError as e:
             logging.exception(f'An error has occurred: {e}.\n'
                               f'String of query: {sSQL}\n'
                               f'Parameters: {tValues}')
             return False
 
+        if self.oProfiler is not None:
+            iRows = (len(oCursor.lRows) if isinstance(oCursor, ProfiledCursor)
+                     else oCursor.rowcount)
+            self.oProfiler.record(sSQL, tValues,
+                                  time.perf_counter() - fStart, iRows)
+
+        return oCursor
+
+    def execute_many(self, sSQL, lValues):
+        """ Method executes sql query for each set of values without
+        committing, so the caller decides when to commit.
+
+        :param sSQL: SQL query.
+        :type sSQL: str
+        :param lValues: Sets of values that need to safe inserting into query.
+        :type lValues: list or tuple or iterator
+        :return: Cursor or bool -- Cursor if execution is successful,
+            otherwise False.
+        """
+        oCursor = self.oConnector.cursor()
+        if self.oProfiler is not None:
+            lValues = list(lValues)
+        fStart = time.perf_counter()
+        try:
+            oCursor.executemany(sSQL, lValues)
+        except DatabaseError as e:
+            logging.exception(f'An error has occurred: {e}.\n'
+                              f'String of query: {sSQL}\n')
+            return False
+
+        if self.oProfiler is not None and lValues:
+            self.oProfiler.record(sSQL, lValues[0],
+                                  time.perf_counter() - fStart,
+                                  oCursor.rowcount)
+
         return oCursor
 
+    def read_sql(self, sSQL, tValues=None):
+        """ Reads the result of a query into a DataFrame.
+
+        :param sSQL: SQL query.
+        :type sSQL: str
+        :param tValues: Values of the query.
+        :type tValues: tuple or list or dict or None
+        :return: The result of the query.
+        :rtype: pd.DataFrame
+        """
+        fStart = time.perf_counter()
+        oFrame = pd.read_sql_query(sSQL, self.oConnector, params=tValues)
+        if self.oProfiler is not None:
+            self.oProfiler.record(sSQL, tValues,
+                                  time.perf_counter() - fStart, len(oFrame))
+
+        return oFrame
+
+    def start_profiling(self, bExplain=True, sFile=None):
+        """ Turns on the profiler of queries.
+
+        :param bExplain: Whether to take plans of queries.
+        :type bExplain: bool
+        :param sFile: If it is not None, the summary is dumped at exit of
+            the program: to the JSON file or, if the string is empty, to
+            the log.
+        :type sFile: str or None
+        :return: The profiler.
+        :rtype: QueryProfiler
+        """
+        if self.oProfiler is None:
+            self.oProfiler = QueryProfiler(self.oConnector, bExplain)
+            if sFile is not None:
+                atexit.register(self.oProfiler.dump, sFile)
+
+        return self.oProfiler
+
+    def stop_profiling(self):
+        """ Turns off the profiler of queries.
+
+        :return: The profiler with collected statistics or None.
+        :rtype: QueryProfiler or None
+        """
+        oProfiler, self.oProfiler = self.oProfiler, None
+        return oProfiler
+
+    def commit(self):
+        """ Commits the current transaction. Inside a transaction() block
+        the commit is postponed until the block ends. """
+        if not self.iTransaction:
+            self.oConnector.commit()
+
+    @contextmanager
+    def transaction(self):
+        """ Groups all statements inside the block into one transaction.
+
+        Methods that usually commit after each statement (insert_row, update,
+        delete_row and others) do not commit inside the block, so existing
+        loops can be wrapped without changes. The transaction is committed
+        when the outermost block ends and rolled back if it raises.
+
+        Using:
+            with oConnector.transaction():
+                for tValues in lValues:
+                    oConnector.insert_row(sTable, sColumns, tValues)
+        """
+        # DDL statements do not open a transaction implicitly
+        if not self.iTransaction and not self.oConnector.in_transaction:
+            self.oConnector.execute('BEGIN')
+        self.iTransaction += 1
+        try:
+            yield self
+        except BaseException:
+            self.iTransaction -= 1
+            if not self.iTransaction:
+                self.oConnector.rollback()
+            raise
+        self.iTransaction -= 1
+        if not self.iTransaction:
+            self.oConnector.commit()
+
+    def apply_profile(self, dProfile):
+        """ Sets pragmas of the connection.
+
+        The value auto of mmap_size maps the whole database file.
+
+        :param dProfile: Pragmas and their values.
+        :type dProfile: dict
+        :return: True if all pragmas are set, otherwise False.
+        :rtype: bool
+        """
+        bDone = True
+        for sPragma, aValue in dProfile.items():
+            if sPragma not in PRAGMAS:
+                logging.error(f'Unknown pragma in the profile: {sPragma}.')
+                bDone = False
+                continue
+
+            if sPragma == 'mmap_size' and aValue == 'auto':
+                aValue = self.file_size()
+            if not self.execute_query(f'PRAGMA {sPragma}={aValue};'):
+                bDone = False
+
+        return bDone
+
+    def pragmas(self):
+        """ Returns the current values of the connection pragmas.
+
+        :return: Pragmas and their values.
+        :rtype: dict
+        """
+        dPragmas = {}
+        for sPragma in PRAGMAS:
+            oCursor = self.execute_query(f'PRAGMA {sPragma};')
+            tRow = oCursor.fetchone() if oCursor else None
+            dPragmas[sPragma] = tRow[0] if tRow else None
+
+        return dPragmas
+
+    def file_size(self):
+        """ Returns the size of the database in bytes.
+
+        :return: page_count * page_size.
+        :rtype: int
+        """
+        oCursor = self.execute_query(
+            'SELECT page_count * page_size '
+            'FROM pragma_page_count(), pragma_page_size();')
+        return oCursor.fetchone()[0] if oCursor else 0
+
+    def checkpoint(self, sMode='TRUNCATE'):
+        """ Moves the write-ahead log into the database file. With large
+        wal_autocheckpoint it is called after a bulk import.
+
+        :param sMode: PASSIVE, FULL, RESTART or TRUNCATE.
+        :type sMode: str
+        :return: (busy, log pages, checkpointed pages) or False.
+        :rtype: tuple or bool
+        """
+        oCursor = self.execute_query(f'PRAGMA wal_checkpoint({sMode});')
+        return oCursor.fetchone() if oCursor else False
+
     def table_info(self, sTable):
         """ Returns information about columns in a table (cid, name, type,
          notnull, dflt_value, pk)
@@ -237,7 +523,7 @@ class SQL:
         sqlString = f'INSERT INTO {sTable} ({sColumns}) VALUES ({sSQL})'
         oCursor = self.execute_query(sqlString, tValues)
         if oCursor:
-            self.oConnector.commit()
+            self.commit()
             return oCursor.lastrowid
 
         return False
@@ -264,7 +550,7 @@ class SQL:
             oCursor = self.execute_query(sSQL)
 
         if oCursor:
-            self.oConnector.commit()
+            self.commit()
             return True
 
         return False
@@ -288,7 +574,7 @@ class SQL:
         sSQL = f'UPDATE {sTable} SET {sSetUpdate} WHERE {sWhereUpdate}'
         oCursor = self.execute_query(sSQL, tValues)
         if oCursor:
-            self.oConnector.commit()
+            self.commit()
             return True
 
         return False
@@ -337,6 +623,159 @@ class SQL:
 
         return False
 
+    # Bulk methods
+    @staticmethod
+    def _rows(sColumns, lRows):
+        """ Prepares rows for executemany.
+
+        :param sColumns: Columns names, if empty and lRows is a DataFrame,
+            its columns are used.
+        :type sColumns: str
+        :param lRows: Rows as an iterable of tuples (lists) or a DataFrame.
+        :type lRows: list or tuple or iterator or pd.DataFrame
+        :return: Columns names and rows.
+        :rtype: tuple[str, list]
+        """
+        if isinstance(lRows, pd.DataFrame):
+            if sColumns:
+                lRows = lRows[sColumns.split(', ')]
+            else:
+                sColumns = ', '.join(lRows.columns)
+            return sColumns, list(lRows.itertuples(index=False, name=None))
+
+        return sColumns, list(lRows)
+
+    def _execute_bulk(self, sSQL, lRows):
+        """ Executes a bulk statement. If it fails outside a transaction()
+        block, the rows that were already written are rolled back, so
+        the table is left as it was. Inside a transaction() block the
+        error is raised, so the block rolls back all its statements
+        instead of committing the ones before the failure.
+
+        :param sSQL: SQL query.
+        :type sSQL: str
+        :param lRows: Sets of values.
+        :type lRows: list
+        :return: Cursor if execution is successful, otherwise False.
+        :rtype: sqlite3.Cursor or bool
+        :raises DatabaseError: If execution fails inside a transaction.
+        """
+        oCursor = self.execute_many(sSQL, lRows)
+        if not oCursor:
+            if self.iTransaction:
+                raise DatabaseError(f'Bulk statement failed inside a '
+                                    f'transaction: {sSQL}')
+            self.oConnector.rollback()
+
+        return oCursor
+
+    def insert_many(self, sTable, sColumns, lRows):
+        """ Inserts records in the database table by one executemany call.
+
+        :param sTable: Table name as string.
+        :type sTable: str
+        :param sColumns: Columns names of the table by where needs inserting.
+            It can be empty if lRows is a DataFrame.
+        :type sColumns: str
+        :param lRows: Rows for inserting as an iterable of tuples or
+            a DataFrame.
+        :type lRows: list or tuple or iterator or pd.DataFrame
+        :return: Number of inserted rows if the insert was successful.
+            Otherwise, False.
+        :rtype: int or bool
+        """
+        sColumns, lRows = self._rows(sColumns, lRows)
+        sSQL = ("?, " * len(sColumns.split(", ")))[:-2]
+        oCursor = self._execute_bulk(
+            f'INSERT INTO {sTable} ({sColumns}) VALUES ({sSQL})', lRows)
+        if oCursor:
+            self.commit()
+            return len(lRows)
+
+        return False
+
+    def upsert_many(self, sTable, sColumns, lRows, sKey):
+        """ Inserts records or updates the other columns of the records that
+        already exist by the key (INSERT ... ON CONFLICT DO UPDATE).
+
+        Note:
+            The key column(s) must have a UNIQUE index or be a PRIMARY KEY.
+
+        :param sTable: Table name as string.
+        :type sTable: str
+        :param sColumns: Columns names of the table, the key column(s)
+            included. It can be empty if lRows is a DataFrame.
+        :type sColumns: str
+        :param lRows: Rows as an iterable of tuples or a DataFrame.
+        :type lRows: list or tuple or iterator or pd.DataFrame
+        :param sKey: Key column(s) separated by ', '.
+        :type sKey: str
+        :return: Number of processed rows if the upsert was successful.
+            Otherwise, False.
+        :rtype: int or bool
+        """
+        sColumns, lRows = self._rows(sColumns, lRows)
+        lKey = sKey.split(', ')
+        lSet = [f'{sColumn}=excluded.{sColumn}'
+                for sColumn in sColumns.split(', ') if sColumn not in lKey]
+        sSQL = ("?, " * len(sColumns.split(", ")))[:-2]
+        sAction = f'DO UPDATE SET {", ".join(lSet)}' if lSet else 'DO NOTHING'
+        oCursor = self._execute_bulk(
+            f'INSERT INTO {sTable} ({sColumns}) VALUES ({sSQL}) '
+            f'ON CONFLICT ({sKey}) {sAction}', lRows)
+        if oCursor:
+            self.commit()
+            return len(lRows)
+
+        return False
+
+    def update_many(self, sTable, sSetUpdate, sWhereUpdate, lValues):
+        """ Updates records of the database table by one executemany call.
+
+        :param sTable: A Table as string where update is need to do.
+        :type sTable: str
+        :param sSetUpdate: Column(s) where the value are writen.
+        :type sSetUpdate: str
+        :param sWhereUpdate: A column where values correspond to the required.
+        :type sWhereUpdate: str
+        :param lValues: Sets of values, every set contains values for
+            sSetUpdate and then for sWhereUpdate.
+        :type lValues: list or tuple or iterator or pd.DataFrame
+        :return: True if the update was successful, otherwise False.
+        :rtype: bool
+        """
+        _, lValues = self._rows(f'{sSetUpdate}, {sWhereUpdate}', lValues)
+        sSetUpdate = get_columns(sSetUpdate, ', ')
+        sWhereUpdate = get_columns(sWhereUpdate)
+        oCursor = self._execute_bulk(
+            f'UPDATE {sTable} SET {sSetUpdate} WHERE {sWhereUpdate}', lValues)
+        if oCursor:
+            self.commit()
+            return True
+
+        return False
+
+    def delete_many(self, sTable, sColumns, lValues):
+        """ Deletes rows of the database table by one executemany call.
+
+        :param sTable: A table as string in where need to delete rows.
+        :type sTable: str
+        :param sColumns: Column(s) where the values will be found.
+        :type sColumns: str
+        :param lValues: Sets of values for search of rows.
+        :type lValues: list or tuple or iterator or pd.DataFrame
+        :return: True if the deletion is successful, otherwise False.
+        :rtype: bool
+        """
+        _, lValues = self._rows(sColumns, lValues)
+        oCursor = self._execute_bulk(
+            f'DELETE FROM {sTable} WHERE {get_columns(sColumns)}', lValues)
+        if oCursor:
+            self.commit()
+            return True
+
+        return False
+
     # Average API level
     def sql_get_values(self, sTable, sColumns, sWhere, tValues, sConj=''):
         """ Looks for ID of the row by value(s) of table column(s).
@@ -422,7 +861,7 @@ class SQL:
             the tuple was not successful.
         :rtype: bool
         """
-        if type(lTable) is not str:
+        if type(lTable) is str:
             lTable = [lTable]
 
         for sTable in lTable:
@@ -478,7 +917,7 @@ class SQL:
         :return:
         :rtype: pd.DataFrame
         """
-        dfb = pd.read_sql_query(
+        dfb = self.read_sql(
             "SELECT Tools.tool_type, AccountEvents.event_id, "
             "AccountEvents.tool_code, BondsSecurities.SHORTNAME, "
             "AccountEvents.tool_price, AccountEvents.tool_count "
@@ -487,10 +926,9 @@ class SQL:
             "ON Tools.tool_id=AccountEvents.tool_id "
             "JOIN BondsSecurities "
             "ON BondsSecurities.SECID=AccountEvents.tool_code "
-            "WHERE AccountEvents.tool_price is not NULL; ",
-            self.oConnector)
+            "WHERE AccountEvents.tool_price is not NULL; ")
 
-        dfs = pd.read_sql_query(
+        dfs = self.read_sql(
             "SELECT Tools.tool_type, AccountEvents.event_id, "
             "AccountEvents.tool_code, SharesCollections.SHORTNAME, "
             "AccountEvents.tool_price, AccountEvents.tool_count "
@@ -499,80 +937,127 @@ class SQL:
             "ON Tools.tool_id=AccountEvents.tool_id "
             "JOIN SharesCollections "
             "ON SharesCollections.SECID=AccountEvents.tool_code "
-            "WHERE AccountEvents.tool_price is not NULL; ",
-            self.oConnector)
+            "WHERE AccountEvents.tool_price is not NULL; ")
 
         return pd.concat([dfb, dfs], axis=0, join='outer', ignore_index=True)
 
+    def get_account_events(self, iAfterId=0, lCodes=None):
+        """ Returns trades of the account in the order of their time.
+
+        :param iAfterId: Only events with a greater acc_events_id.
+        :type iAfterId: int
+        :param lCodes: Only events of these instruments, all if None.
+        :type lCodes: list or set or None
+        :return: Columns acc_events_id, event_date, event_time, event_id,
+            tool_code, tool_price, tool_count.
+        :rtype: pd.DataFrame
+        """
+        sWith, sJoin, tParams = '', '', (iAfterId,)
+        if lCodes is not None:
+            sWith = SECID_LIST
+            sJoin = ('JOIN SECIDList '
+                     'ON SECIDList.SECID=AccountEvents.tool_code ')
+            tParams = (self.secid_json(lCodes), iAfterId)
+
+        return self.read_sql(
+            f'{sWith}'
+            'SELECT acc_events_id, event_date, event_time, event_id, '
+            'tool_code, tool_price, tool_count '
+            f'FROM AccountEvents {sJoin}'
+            'WHERE tool_price IS NOT NULL AND acc_events_id>? '
+            'ORDER BY event_date, event_time, acc_events_id;', tParams)
+
+    def get_portfolio_tools(self, lCodes):
+        """ Returns types and short names of the instruments of the
+        portfolio; instruments unknown to the exchange tables are skipped.
+
+        :param lCodes: Codes of instruments.
+        :type lCodes: list or set or pd.Index
+        :return: Columns tool_code, tool_type, SHORTNAME.
+        :rtype: pd.DataFrame
+        """
+        return self.read_sql(
+            f'{SECID_LIST}'
+            'SELECT SECIDList.SECID AS tool_code, '
+            '(SELECT min(Tools.tool_type) FROM AccountEvents '
+            'JOIN Tools ON Tools.tool_id=AccountEvents.tool_id '
+            'WHERE AccountEvents.tool_code=SECIDList.SECID) '
+            'AS tool_type, '
+            'COALESCE((SELECT SHORTNAME FROM BondsSecurities '
+            'WHERE BondsSecurities.SECID=SECIDList.SECID), '
+            '(SELECT min(SHORTNAME) FROM SharesCollections '
+            'WHERE SharesCollections.SECID=SECIDList.SECID)) '
+            'AS SHORTNAME '
+            'FROM SECIDList '
+            'WHERE SHORTNAME IS NOT NULL AND tool_type IS NOT NULL '
+            'ORDER BY tool_type, tool_code;', (self.secid_json(lCodes),))
+
+    def get_market_snapshot(self, lCodes):
+        """ Returns the last market data of bonds and shares by one query.
+
+        :param lCodes: Codes of instruments.
+        :type lCodes: list or set or pd.Index
+        :return: Columns tool_code, PRICE (the last price in the currency,
+            for bonds it is the price in percent multiplied by the face
+            value), ACCRUEDINT and YIELD (only bonds).
+        :rtype: pd.DataFrame
+        """
+        return self.read_sql(
+            f'{SECID_LIST}'
+            'SELECT BondsSecurities.SECID AS tool_code, '
+            'BondDescription.FACEVALUE * BondsSecurities.PREVPRICE / 100 '
+            'AS PRICE, BondsSecurities.ACCRUEDINT AS ACCRUEDINT, '
+            'BondsSecurities.YIELDATPREVWAPRICE AS YIELD '
+            'FROM SECIDList '
+            'JOIN BondsSecurities '
+            'ON BondsSecurities.SECID=SECIDList.SECID '
+            'JOIN BondDescription '
+            'ON BondDescription.SECID=SECIDList.SECID '
+            'UNION ALL '
+            'SELECT SharesSecurities.SECID, SharesSecurities.PREVPRICE, 0, '
+            'NULL '
+            'FROM SECIDList '
+            'JOIN SharesSecurities '
+            'ON SharesSecurities.SECID=SECIDList.SECID;',
+            (self.secid_json(lCodes),))
+
     def get_bonds_by_value(self, pd, iInitialFaceValue=1000, sFaceUnit='SUR',
                            fMinYield=10, fMaxYield=30, bOFZ=False,
                            iMinPeriod=30, iMaxPeriod=182, fMinCouponValue=0,
                            fPercent=1.0, sMatDate="2028-01-01"):
         """ Выборка облигаций из Представления в базе данных.
 
+        Запрос один и тот же при любых значениях фильтров (SCREEN_BONDS),
+        значения передаются параметрами.
+
         :param pd: Объект Pandas
         :type pd: pd
         :param iInitialFaceValue: Номинальная стоимость одной ценной бумаги
         :param sFaceUnit: Валюта номинала
-        :param fMinYield: Минимальная доходность
-        :param fMaxYield: Максимальная доходность
+        :param fMinYield: Минимальная доходность (None - без ограничения)
+        :param fMaxYield: Максимальная доходность (None - без ограничения)
         :param bOFZ: Отбирать ли только ОФЗ
         :param iMinPeriod: Минимальный период купона
         :param iMaxPeriod: Максимальный период купона
         :param fMinCouponValue: Минимальное значение купона
         :param fPercent: Минимальное значение купона в процентах
+        :param sMatDate: Погашение не раньше этой даты (None - без
+            ограничения)
         :return: Возвращает таблицу значений по запросу в формате DataFrame
         :rtype: pd.DataFame
         """
-        sQuery = (
-            "SELECT BondsSecurities.SECID, BondsSecurities.ISIN, "
-            "BondsSecurities.SHORTNAME, BondsSecurities.MATDATE, "
-            "BondsSecurities.PREVPRICE, BondsSecurities.YIELDATPREVWAPRICE,"
-            "BondsMarketData.EFFECTIVEYIELD, BondsSecurities.COUPONPERCENT, "
-            "BondsSecurities.COUPONVALUE, BondsSecurities.ACCRUEDINT, "
-            "BondsSecurities.NEXTCOUPON, BondsSecurities.COUPONPERIOD, "
-            "BondDescription.INITIALFACEVALUE, BondDescription.FACEVALUE, "
-            "BondDescription.FACEUNIT, BondsSecurities.LISTLEVEL, "
-            "BondDescription.EMITTER "
-            "FROM BondsSecurities "
-            "JOIN BondDescription "
-            "ON BondDescription.SECID=BondsSecurities.SECID "
-            "JOIN BondsMarketData "
-            "ON BondsMarketData.SECID=BondsSecurities.SECID "
-            f"WHERE BondDescription.ISQUALIFIEDINVESTORS=0 "
-            "AND BondDescription.FACEUNIT='SUR' "
-            "AND BondsSecurities.PREVPRICE is not NULL "
-            "AND BondsSecurities.OFFERDATE is NULL "
-            "AND BondsSecurities.COUPONPERCENT>1 "
-            "AND BondsSecurities.MATDATE>DATE('now') "
-            "AND BondDescription.INITIALFACEVALUE=BondDescription.FACEVALUE "
-            "AND BondDescription.EMITTER not like \"%икрофинансовая%\" "
-            "AND BondDescription.EMITTER not like \"%коллектор%\" "
-            "AND BondDescription.EMITTER not like \"ООО %\" "
-            "AND BondsSecurities.SECNAME not like \"%ОФЗ-АД%\" "
-            "AND BondsSecurities.SECNAME not like \"%ОФЗ-ПК%\" "
-            "AND BondsSecurities.SECNAME not like \"%ОФЗ-ИН%\" "
-            "AND BondsSecurities.BONDTYPE like \"Фикс с известным купоном\" "
-            f"AND BondDescription.INITIALFACEVALUE<={iInitialFaceValue} "
-            f"AND BondDescription.FACEUNIT=\"{sFaceUnit}\" "
-            f"AND BondsSecurities.COUPONPERCENT>={fPercent} "
-            f"AND BondsSecurities.COUPONPERIOD>={int(iMinPeriod)} "
-            f"AND BondsSecurities.COUPONPERIOD<={int(iMaxPeriod)} "
-            f"AND BondsSecurities.COUPONVALUE>={fMinCouponValue} "
-        )
-
-        if bOFZ:
-            sQuery = f" {sQuery} AND BondsSecurities.SHORTNAME like \"%ОФЗ%\" "
-        else:
-            sQuery = (
-                f"{sQuery} AND BondsSecurities.YIELDATPREVWAPRICE>{fMinYield} "
-                f"AND BondsSecurities.YIELDATPREVWAPRICE<{fMaxYield} "
-                f"AND BondsSecurities.MATDATE>\"{sMatDate}\" "
-            )
-
-        sQuery = f" {sQuery} GROUP BY BondsSecurities.MATDATE;"
-
-        return pd.read_sql_query(sQuery, self.oConnector)
+        dParams = {'iInitialFaceValue': iInitialFaceValue,
+                   'sFaceUnit': sFaceUnit,
+                   'fPercent': fPercent,
+                   'iMinPeriod': int(iMinPeriod),
+                   'iMaxPeriod': int(iMaxPeriod),
+                   'fMinCouponValue': fMinCouponValue,
+                   'bOFZ': int(bool(bOFZ)),
+                   'fMinYield': fMinYield,
+                   'fMaxYield': fMaxYield,
+                   'sMatDate': sMatDate}
+
+        return self.read_sql(SCREEN_BONDS, dParams)
 
     def get_period_list(self,
                         iInitialFaceValue=1000,
@@ -581,26 +1066,179 @@ class SQL:
                         iMaxPeriod=182
                         ):
         lAnswer = self.execute_query(
-            "select distinct BondsSecurities.COUPONPERIOD "
-            "FROM BondsSecurities "
-            "JOIN BondDescription "
-            "ON BondDescription.SECID=BondsSecurities.SECID "
-            "WHERE BondDescription.ISQUALIFIEDINVESTORS=0 "
-            f"AND BondDescription.INITIALFACEVALUE <= {iInitialFaceValue} "
-            f"AND BondDescription.FACEUNIT = \"{sFaceUnit}\" "
-            "AND BondsSecurities.PREVPRICE is not NULL "
-            "AND BondsSecurities.COUPONPERCENT > 1 "
-            f"AND BondsSecurities.MATDATE > \"{sMatDateStart}\" "
-            f"AND BondsSecurities.COUPONPERIOD<={int(iMaxPeriod)} "
-            f"AND BondsSecurities.COUPONPERIOD<={int(iMaxPeriod)} "
-            "AND BondDescription.INITIALFACEVALUE=BondDescription.FACEVALUE "
-            "AND BondDescription.EMITTER not like \"%икрофинансовая%\" "
-            "AND BondDescription.EMITTER not like \"%коллектор%\" "
-            "AND BondDescription.EMITTER not like \"%ООО%\" "
-            "order by COUPONPERIOD;")
+            SCREEN_PERIODS, {'iInitialFaceValue': iInitialFaceValue,
+                             'sFaceUnit': sFaceUnit,
+                             'sMatDateStart': sMatDateStart,
+                             'iMaxPeriod': int(iMaxPeriod)})
 
         return lAnswer
 
+    def refresh_bond_screen(self, lSECID=None):
+        """ Refreshes the materialized table of the bond screener.
+
+        :param lSECID: Bonds that have changed. If it is None, the table is
+            rebuilt completely.
+        :type lSECID: list or set or None
+        :return: Number of rows written to the table or False.
+        :rtype: int or bool
+        """
+        sInsert = f'INSERT INTO BondScreen ({BOND_SCREEN_COLUMNS}) ' \
+                  f'{BOND_SCREEN_SELECT}'
+        if lSECID is not None and not len(lSECID):
+            return 0
+
+        with self.transaction():
+            if lSECID is None:
+                self.execute_query('DELETE FROM BondScreen;')
+                oCursor = self.execute_query(f'{sInsert};')
+            else:
+                self.set_secid_list(lSECID)
+                self.execute_query('DELETE FROM BondScreen WHERE SECID IN '
+                                   '(SELECT SECID FROM temp.SECIDList);')
+                oCursor = self.execute_query(
+                    f'{sInsert} AND BondsSecurities.SECID IN '
+                    f'(SELECT SECID FROM temp.SECIDList);')
+            self.bump_data_version('BondScreen')
+
+        return oCursor.rowcount if oCursor else False
+
+    @staticmethod
+    def secid_json(lSECID):
+        """ Packs codes of securities into the JSON parameter of SECID_LIST.
+
+        :param lSECID: Codes of securities.
+        :type lSECID: list or set or pd.Series or pd.Index
+        :rtype: str
+        """
+        return json.dumps(sorted({str(sSECID) for sSECID in lSECID}))
+
+    def set_secid_list(self, lSECID):
+        """ Fills the temporary table SECIDList with codes of securities.
+        Statements that change tables join it inside one transaction.
+
+        Note:
+            Only for the writing connection: a query_only connection
+            refuses to create the temporary table. Read queries use
+            SECID_LIST instead.
+
+        :param lSECID: Codes of securities.
+        :type lSECID: list or set or pd.Series
+        :raises DatabaseError: If the temporary table cannot be filled.
+        """
+        if not (self.execute_query('CREATE TEMP TABLE IF NOT EXISTS '
+                                   'SECIDList (SECID TEXT PRIMARY KEY);')
+                and self.execute_query('DELETE FROM temp.SECIDList;')
+                and self.execute_many(
+                    'INSERT INTO temp.SECIDList (SECID) VALUES (?);',
+                    [(sSECID,) for sSECID in set(lSECID)])):
+            raise DatabaseError('The temporary list of SECID cannot be '
+                                'filled, the connection may be query_only.')
+
+    def get_cashflows(self, sTable, sColumns, lSECID):
+        """ Returns coupons or amortizations of many bonds by one query.
+
+        :param sTable: BoundCoupons or BoundAmortizations.
+        :type sTable: str
+        :param sColumns: Columns without SECID, the first one is the date.
+        :type sColumns: str
+        :param lSECID: Codes of bonds.
+        :type lSECID: list or set or pd.Series
+        :return: Rows of all bonds ordered by SECID and date.
+        :rtype: pd.DataFrame
+        """
+        sDate = sColumns.split(', ')[0]
+        return self.read_sql(
+            f'{SECID_LIST}'
+            f'SELECT {sTable}.SECID, {sColumns} FROM {sTable} '
+            f'JOIN SECIDList ON SECIDList.SECID={sTable}.SECID '
+            f'ORDER BY {sTable}.SECID, {sDate};', (self.secid_json(lSECID),))
+
+    def count_cashflows(self, sTable, lSECID):
+        """ Counts coupons or amortizations of many bonds by one query.
+
+        :param sTable: BoundCoupons or BoundAmortizations.
+        :type sTable: str
+        :param lSECID: Codes of bonds.
+        :type lSECID: list or set or pd.Series
+        :return: Numbers of rows by SECID (bonds without rows are not
+            included) and the list of SECID that have no rows in the table.
+        :rtype: tuple[dict[str, int], list[str]]
+        """
+        oCursor = self.execute_query(
+            f'{SECID_LIST}'
+            f'SELECT SECIDList.SECID, COUNT({sTable}.SECID) '
+            f'FROM SECIDList LEFT JOIN {sTable} '
+            f'ON {sTable}.SECID=SECIDList.SECID '
+            f'GROUP BY SECIDList.SECID;', (self.secid_json(lSECID),))
+        if not oCursor:
+            raise DatabaseError(f'Cashflows of {sTable} cannot be counted.')
+        dCounts, lMissing = {}, []
+        for sSECID, iCount in oCursor.fetchall():
+            if iCount:
+                dCounts[sSECID] = iCount
+            else:
+                lMissing.append(sSECID)
+
+        return dCounts, lMissing
+
+    def get_bond_quotes(self, lSECID=None):
+        """ Returns face values, last prices and accrued interest of many
+        bonds by one query.
+
+        :param lSECID: Codes of bonds; codes of other securities are skipped.
+            If None, all bonds with a last price are returned.
+        :type lSECID: list or set or pd.Series or pd.Index or None
+        :return: Columns SECID, FACEVALUE, PREVPRICE, ACCRUEDINT.
+        :rtype: pd.DataFrame
+        """
+        sColumns = ('SELECT BondsSecurities.SECID, BondDescription.FACEVALUE, '
+                    'BondsSecurities.PREVPRICE, BondsSecurities.ACCRUEDINT ')
+        if lSECID is None:
+            return self.read_sql(
+                f'{sColumns}'
+                'FROM BondsSecurities '
+                'JOIN BondDescription '
+                'ON BondDescription.SECID=BondsSecurities.SECID '
+                'WHERE BondsSecurities.PREVPRICE>0 '
+                'ORDER BY BondsSecurities.SECID;')
+
+        return self.read_sql(
+            f'{SECID_LIST}{sColumns}'
+            'FROM SECIDList '
+            'JOIN BondsSecurities '
+            'ON BondsSecurities.SECID=SECIDList.SECID '
+            'JOIN BondDescription '
+            'ON BondDescription.SECID=SECIDList.SECID '
+            'ORDER BY BondsSecurities.SECID;', (self.secid_json(lSECID),))
+
+    def bump_data_version(self, sName):
+        """ Raises the version of the data and stamps the time of update.
+
+        :param sName: Name of the data, usually a table.
+        :type sName: str
+        """
+        self.execute_query(
+            "INSERT INTO DataVersion (name, version, updated_at) "
+            "VALUES (?, 1, datetime('now')) "
+            "ON CONFLICT (name) DO UPDATE SET version=version+1, "
+            "updated_at=excluded.updated_at;", (sName,))
+        self.commit()
+
+    def get_data_version(self, sName):
+        """ Returns the version of the data and the time of its update.
+
+        :param sName: Name of the data, usually a table.
+        :type sName: str
+        :return: (version, updated_at) or (0, None) if the data was never
+            refreshed.
+        :rtype: tuple
+        """
+        oCursor = self.execute_query(
+            'SELECT version, updated_at FROM DataVersion WHERE name=?;',
+            (sName,))
+        tRow = oCursor.fetchone() if oCursor else None
+        return tRow if tRow else (0, None)
+
     def get_bond_by_value(self, sSECID):
         lAnswer = self.execute_query(
             "SELECT BondsSecurities.SHORTNAME, "
@@ -19,17 +19,21 @@
 import pandas as pd
 import numpy as np
 
-from advisor.lib.math import F_0_T_eff, get_KBD_in_year_precent, years
+from advisor.lib.math import year_fractions
+from advisor.lib.zero_curve import ZeroCurve
 
 
 class YeldCurve:
-    def __init__(self, oConnector, oPD=pd):
+    def __init__(self, oConnector, oPD=pd, sDate=None):
         self.oPD = oPD
         self.oConnector = oConnector
+        # кривая на дату: последняя опубликованная не позже sDate
         lQuery = oConnector.execute_query('SELECT * '
                                           'FROM YieldCurve '
+                                          'WHERE tradedate<=? '
                                           'ORDER BY tradedate DESC '
-                                          'LIMIT 1;').fetchone()
+                                          'LIMIT 1;',
+                                          (sDate or '9999-99-99',)).fetchone()
 
         # Временные точки для расчета (например, от 0 до 30 лет)
         self.lTempVal = np.linspace(0.01, 17.5, 1500)
@@ -39,17 +43,15 @@ class YeldCurve:
         self.fBeta2 = lQuery[5]
         self.fTau = lQuery[6]
         self.lGValues = lQuery[7:]
+        # кривая строится один раз на строку YieldCurve
+        self.oCurve = ZeroCurve.from_row(lQuery)
 
     def get_KBD_values(self):
         """
 
         :return:
         """
-        return get_KBD_in_year_precent(self.lTempVal,
-                                       self.fBeta0, self.fBeta1, self.fBeta2,
-                                       self.fTau,
-                                       self.lGValues
-                                       )
+        return self.oCurve.spot_percent(self.lTempVal)
 
     def get_ofz_yeld(self, iDays=364):
         """ Получить доходности ОФЗ облигаций
@@ -62,12 +64,9 @@ class YeldCurve:
         oQuery = self.oConnector.get_bonds_by_value(pd=self.oPD,
                                                     bOFZ=True,
                                                     )
-        lMatData = oQuery['MATDATE'].tolist()
         lYield = oQuery['YIELDATPREVWAPRICE'].tolist()
 
-        lDate = []
-        for sDate in lMatData:
-            lDate.append(years(sDate, iDays))
+        lDate = year_fractions(oQuery['MATDATE'], iDays).tolist()
 
         return lDate, lYield
 
@@ -76,8 +75,4 @@ class YeldCurve:
 
         :return:
         """
-        return F_0_T_eff(self.lTempVal,
-                         self.fBeta0, self.fBeta1, self.fBeta2,
-                         self.fTau,
-                         self.lGValues, dt=1e-4
-                         )
+        return self.oCurve.forward_percent(self.lTempVal)
@@ -0,0 +1,395 @@
+#     This code is a part of program Advisor
+#     Copyright (C) 2022 contributors Advisor
+#     The full list is available at the link
+#     https://github.com/tagezi/advisor/blob/master/contributors.txt
+#
+#     This program is free software: you can redistribute it and/or modify
+#     it under the terms of the GNU General Public License as published by
+#     the Free Software Foundation, either version 3 of the License, or
+#     (at your option) any later version.
+#
+#     This program is distributed in the hope that it will be useful,
+#     but WITHOUT ANY WARRANTY; without even the implied warranty of
+#     MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#     GNU General Public License for more details.
+#
+#     You should have received a copy of the GNU General Public License
+#     along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+""" Кривая бескупонной доходности (КБД) Мосбиржи.
+
+Параметры кривой (beta0, beta1, beta2, tau и g1..g9) берутся из строки
+таблицы YieldCurve один раз, узлы гауссовых членов a_i, b_i считаются при
+создании объекта. Ставки для любых массивов сроков считаются одним
+выражением NumPy, форвардная ставка — по аналитической производной.
+
+Формулы те же, что у math.GT: девятый член не участвует, так как b_9 = 0.
+
+История кривых (CurveHistory) считает матрицу даты × сроки одним
+выражением: гауссовы множители зависят только от сроков и считаются один
+раз для всей истории.
+
+Function:
+    gauss_nodes(fK=1.6)
+    gauss_basis(aTenors, fK=1.6)
+
+Class:
+    ZeroCurve
+    CurveHistory
+
+Using:
+    oCurve = ZeroCurve.from_row(lRow)
+    aSpot = oCurve.spot_percent(np.linspace(0.01, 17.5, 1500))
+    oHistory = CurveHistory.from_db(oConnector, '2024-01-01')
+    aMatrix = oHistory.spot_percent(np.linspace(0.01, 17.5, 1500))
+"""
+
+import numpy as np
+import pandas as pd
+
+
+# столбцы параметров кривой в таблице YieldCurve
+CURVE_COLUMNS = ['B1', 'B2', 'B3', 'T1', 'G1', 'G2', 'G3', 'G4', 'G5', 'G6',
+                 'G7', 'G8', 'G9']
+
+
+def gauss_nodes(fK=1.6):
+    """ Узлы гауссовых членов КБД.
+
+    a_1 = 0, a_2 = 0.6, a_i = a_(i-1) + k^(i-2); b_1 = 0.6, b_i = b_(i-1) * k
+    до b_8, b_9 = 0. Член с b_9 = 0 не участвует в расчёте.
+
+    :param fK: Параметр рекуррентного расчёта узлов
+    :type fK: float
+    :return: Узлы a_i и квадраты ширин b_i^2 восьми членов
+    :rtype: tuple[np.ndarray, np.ndarray]
+    """
+    aA = np.zeros(8)
+    aA[1] = 0.6
+    aA[2:] = 0.6 + np.cumsum(fK ** np.arange(1, 7))
+    aB = 0.6 * fK ** np.arange(8)
+    return aA, aB ** 2
+
+
+def gauss_basis(aTenors, fK=1.6):
+    """ Гауссовы множители и их вклад в форвардную ставку для сетки сроков.
+    От параметров кривой они не зависят, поэтому для истории кривых
+    считаются один раз.
+
+    :param aTenors: Сроки в годах
+    :type aTenors: np.ndarray
+    :param fK: Параметр рекуррентного расчёта узлов
+    :type fK: float
+    :return: Матрицы (член × срок) exp(-(t - a_i)^2 / b_i^2) и
+        d(t * exp(...))/dt
+    :rtype: tuple[np.ndarray, np.ndarray]
+    """
+    aA, aB2 = gauss_nodes(fK)
+    aT = np.asarray(aTenors, dtype=float).ravel()
+    aDiff = np.subtract.outer(aA, aT)
+    aGauss = np.exp(-aDiff * aDiff / aB2[:, None])
+    return aGauss, aGauss * (1 + 2 * aT * aDiff / aB2[:, None])
+
+
+class ZeroCurve:
+    """ Кривая бескупонной доходности по параметрам Мосбиржи.
+
+    Ставки spot и forward непрерывные (доли единицы), *_percent — при
+    годовом начислении в процентах годовых.
+
+    *Methods*
+        * from_row -- Создаёт кривую из строки таблицы YieldCurve.
+        * from_db -- Создаёт кривую на дату из базы данных.
+        * spot -- Бескупонная ставка G(t).
+        * discount -- Коэффициент дисконтирования exp(-G(t) * t).
+        * forward -- Мгновенная форвардная ставка.
+        * spot_percent -- Бескупонная доходность в % годовых.
+        * forward_percent -- Форвардная доходность в % годовых.
+    """
+
+    def __init__(self, fBeta0, fBeta1, fBeta2, fTau, lGValues, fK=1.6):
+        """
+
+        :param fBeta0: beta0
+        :type fBeta0: float
+        :param fBeta1: beta1
+        :type fBeta1: float
+        :param fBeta2: beta2
+        :type fBeta2: float
+        :param fTau: tau
+        :type fTau: float
+        :param lGValues: g1..g9 в базисных пунктах
+        :type lGValues: list or tuple
+        :param fK: Параметр рекуррентного расчёта узлов
+        :type fK: float
+        """
+        self.fBeta0 = float(fBeta0)
+        self.fBeta1 = float(fBeta1)
+        self.fBeta2 = float(fBeta2)
+        self.fTau = float(fTau)
+
+        self.aA, self.aB2 = gauss_nodes(fK)
+        self.aG = np.asarray(lGValues[:len(self.aA)], dtype=float)
+
+    @classmethod
+    def from_row(cls, lRow):
+        """ Создаёт кривую из строки таблицы YieldCurve.
+
+        :param lRow: Строка: id, tradedate, tradetime, beta0, beta1, beta2,
+            tau, g1..g9
+        :type lRow: tuple or list
+        :rtype: ZeroCurve
+        """
+        return cls(lRow[3], lRow[4], lRow[5], lRow[6], lRow[7:])
+
+    @classmethod
+    def from_db(cls, oConnector, sDate=None):
+        """ Создаёт кривую по последней строке YieldCurve не позже даты.
+
+        :param oConnector: Соединение с базой данных
+        :type oConnector: advisor.lib.sql.SQL
+        :param sDate: Дата в формате ГГГГ-ММ-ДД (по умолчанию последняя)
+        :type sDate: str or None
+        :return: Кривая или None, если кривых в базе нет
+        :rtype: ZeroCurve or None
+        """
+        oCursor = oConnector.execute_query(
+            'SELECT * FROM YieldCurve WHERE tradedate<=? '
+            'ORDER BY tradedate DESC LIMIT 1;', (sDate or '9999-99-99',))
+        lRow = oCursor.fetchone() if oCursor else None
+        return cls.from_row(lRow) if lRow else None
+
+    def _terms(self, aT):
+        """ Возвращает exp(-t / tau), разности a_i - t и гауссовы множители
+        exp(-(t - a_i)^2 / b_i^2); первая ось двух последних — номер члена.
+        """
+        aShape = (-1,) + (1,) * aT.ndim
+        aDiff = np.subtract.outer(self.aA, aT)
+        aGauss = aDiff * aDiff
+        aGauss /= -self.aB2.reshape(aShape)
+        np.exp(aGauss, out=aGauss)
+        return np.exp(-aT / self.fTau), aDiff, aGauss
+
+    def spot(self, t):
+        """ Бескупонная непрерывная ставка G(t) (доли единицы).
+
+        :param t: Сроки в годах
+        :type t: float or np.ndarray
+        :rtype: np.ndarray
+        """
+        aT = np.asarray(t, dtype=float)
+        aExp, _, aGauss = self._terms(aT)
+        aFactor = self.fTau * (1 - aExp) / aT
+        aG = (self.fBeta0 + self.fBeta1 * aFactor +
+              self.fBeta2 * (aFactor - aExp) +
+              np.tensordot(self.aG, aGauss, axes=1))
+        return aG / 10000
+
+    def discount(self, t):
+        """ Коэффициент дисконтирования (цена бескупонной облигации).
+
+        :param t: Сроки в годах
+        :type t: float or np.ndarray
+        :rtype: np.ndarray
+        """
+        aT = np.asarray(t, dtype=float)
+        return np.exp(-self.spot(aT) * aT)
+
+    def forward(self, t):
+        """ Мгновенная форвардная ставка d(G(t) * t)/dt (доли единицы).
+
+        :param t: Сроки в годах
+        :type t: float or np.ndarray
+        :rtype: np.ndarray
+        """
+        aT = np.asarray(t, dtype=float)
+        aExp, aDiff, aGauss = self._terms(aT)
+        # производная t * (член Нельсона-Сигеля) и t * (гауссовы члены)
+        aNS = (self.fBeta0 + self.fBeta1 * aExp +
+               self.fBeta2 * aT / self.fTau * aExp)
+        aSum = np.tensordot(self.aG, aGauss, axes=1)
+        aSlope = np.tensordot(self.aG / self.aB2, aGauss * aDiff, axes=1)
+        return (aNS + aSum + 2 * aT * aSlope) / 10000
+
+    def spot_percent(self, t):
+        """ Бескупонная доходность при годовом начислении, % годовых.
+
+        :param t: Сроки в годах
+        :type t: float or np.ndarray
+        :rtype: np.ndarray
+        """
+        return 100 * (np.exp(self.spot(t)) - 1)
+
+    def forward_percent(self, t):
+        """ Форвардная доходность при годовом начислении, % годовых.
+
+        :param t: Сроки в годах
+        :type t: float or np.ndarray
+        :rtype: np.ndarray
+        """
+        return 100 * (np.exp(self.forward(t)) - 1)
+
+
+class CurveHistory:
+    """ История кривых бескупонной доходности по торговым дням.
+
+    *Methods*
+        * from_db -- Загружает историю кривых из таблицы YieldCurve.
+        * components -- Вклады членов кривой (даты × сроки).
+        * spot -- Бескупонные ставки (даты × сроки).
+        * forward -- Форвардные ставки (даты × сроки).
+        * spot_percent -- Бескупонная доходность в % годовых.
+        * forward_percent -- Форвардная доходность в % годовых.
+        * as_of -- Кривая на дату.
+        * attribution -- Изменение ставок между датами по членам кривой.
+    """
+
+    def __init__(self, oRows, fK=1.6):
+        """
+
+        :param oRows: Строки YieldCurve со столбцами tradedate, B1, B2, B3,
+            T1, G1..G9
+        :type oRows: pd.DataFrame
+        :param fK: Параметр рекуррентного расчёта узлов
+        :type fK: float
+        """
+        oRows = oRows.sort_values('tradedate').reset_index(drop=True)
+        self.aDates = oRows['tradedate'].to_numpy(dtype=str)
+        aParams = oRows[CURVE_COLUMNS].to_numpy(dtype=float)
+        self.aBeta0, self.aBeta1, self.aBeta2, self.aTau = aParams[:, :4].T
+        self.aG = aParams[:, 4:12]
+        self.fK = fK
+
+    @classmethod
+    def from_db(cls, oConnector, sFrom=None, sTill=None, fK=1.6):
+        """ Загружает историю кривых за период по индексу tradedate.
+
+        :param oConnector: Доступ к базе данных
+        :type oConnector: advisor.lib.sql.SQL
+        :param sFrom: Начало периода (по умолчанию вся история)
+        :type sFrom: str or None
+        :param sTill: Конец периода (по умолчанию вся история)
+        :type sTill: str or None
+        :param fK: Параметр рекуррентного расчёта узлов
+        :type fK: float
+        :rtype: CurveHistory
+        """
+        oRows = oConnector.read_sql(
+            f'SELECT tradedate, {", ".join(CURVE_COLUMNS)} FROM YieldCurve '
+            f'WHERE tradedate BETWEEN :sFrom AND :sTill '
+            f'ORDER BY tradedate;',
+            {'sFrom': sFrom or '0000-00-00', 'sTill': sTill or '9999-99-99'})
+        return cls(oRows, fK)
+
+    def __len__(self):
+        return len(self.aDates)
+
+    def components(self, aTenors):
+        """ Вклады членов кривой в непрерывную ставку G(t) (доли единицы):
+        уровень (beta0), наклон (beta1), кривизна (beta2) и гауссовы члены.
+
+        :param aTenors: Сроки в годах
+        :type aTenors: np.ndarray
+        :return: Словарь матриц даты × сроки: level, slope, curvature, gauss
+        :rtype: dict[str, np.ndarray]
+        """
+        aT = np.asarray(aTenors, dtype=float).ravel()
+        aExp = np.exp(-aT / self.aTau[:, None])
+        aFactor = self.aTau[:, None] * (1 - aExp) / aT
+        aGauss, _ = gauss_basis(aT, self.fK)
+        return {'level': np.broadcast_to(self.aBeta0[:, None] / 10000,
+                                         aExp.shape),
+                'slope': self.aBeta1[:, None] * aFactor / 10000,
+                'curvature': self.aBeta2[:, None] * (aFactor - aExp) / 10000,
+                'gauss': self.aG @ aGauss / 10000}
+
+    def spot(self, aTenors):
+        """ Бескупонные непрерывные ставки (доли единицы).
+
+        :param aTenors: Сроки в годах
+        :type aTenors: np.ndarray
+        :return: Матрица даты × сроки
+        :rtype: np.ndarray
+        """
+        return sum(self.components(aTenors).values())
+
+    def forward(self, aTenors):
+        """ Мгновенные форвардные ставки (доли единицы).
+
+        :param aTenors: Сроки в годах
+        :type aTenors: np.ndarray
+        :return: Матрица даты × сроки
+        :rtype: np.ndarray
+        """
+        aT = np.asarray(aTenors, dtype=float).ravel()
+        aExp = np.exp(-aT / self.aTau[:, None])
+        _, aGaussForward = gauss_basis(aT, self.fK)
+        aNS = (self.aBeta0[:, None] + self.aBeta1[:, None] * aExp +
+               self.aBeta2[:, None] * aT / self.aTau[:, None] * aExp)
+        return (aNS + self.aG @ aGaussForward) / 10000
+
+    def spot_percent(self, aTenors):
+        """ Бескупонная доходность при годовом начислении, % годовых.
+
+        :param aTenors: Сроки в годах
+        :type aTenors: np.ndarray
+        :return: Матрица даты × сроки
+        :rtype: np.ndarray
+        """
+        return 100 * np.expm1(self.spot(aTenors))
+
+    def forward_percent(self, aTenors):
+        """ Форвардная доходность при годовом начислении, % годовых.
+
+        :param aTenors: Сроки в годах
+        :type aTenors: np.ndarray
+        :return: Матрица даты × сроки
+        :rtype: np.ndarray
+        """
+        return 100 * np.expm1(self.forward(aTenors))
+
+    def _index(self, sDate):
+        """ Номер последней кривой не позже даты или -1. """
+        return int(np.searchsorted(self.aDates, sDate, side='right')) - 1
+
+    def as_of(self, sDate):
+        """ Кривая на дату: последняя опубликованная не позже даты.
+
+        :param sDate: Дата в формате ГГГГ-ММ-ДД
+        :type sDate: str
+        :return: Кривая или None, если раньше даты кривых нет
+        :rtype: ZeroCurve or None
+        """
+        i = self._index(sDate)
+        if i < 0:
+            return None
+
+        return ZeroCurve(self.aBeta0[i], self.aBeta1[i], self.aBeta2[i],
+                         self.aTau[i], self.aG[i], self.fK)
+
+    def attribution(self, sFrom, sTill, aTenors):
+        """ Изменение бескупонной ставки между кривыми на две даты,
+        разложенное по членам кривой, в базисных пунктах.
+
+        :param sFrom: Первая дата
+        :type sFrom: str
+        :param sTill: Вторая дата
+        :type sTill: str
+        :param aTenors: Сроки в годах
+        :type aTenors: np.ndarray
+        :return: Таблица: строки — level, slope, curvature, gauss и total,
+            столбцы — сроки
+        :rtype: pd.DataFrame
+        """
+        iFrom, iTill = self._index(sFrom), self._index(sTill)
+        if iFrom < 0 or iTill < 0:
+            raise ValueError(f'No curve before {min(sFrom, sTill)}')
+
+        dComponents = self.components(aTenors)
+        oAttribution = pd.DataFrame(
+            {sName: (aValues[iTill] - aValues[iFrom]) * 10000
+             for sName, aValues in dComponents.items()},
+            index=np.asarray(aTenors, dtype=float).ravel()).T
+        oAttribution.loc['total'] = oAttribution.sum()
+
+        return oAttribution
@@ -19,8 +19,12 @@ import pandas as pd
 from PyQt6.QtWidgets import QTextBrowser
 
 from advisor.lib.bond_analysis import BondAnalysis
+from advisor.lib.bond_engine import BondEngine
+from advisor.lib.bond_risk import RISK_COLUMNS, bond_risk
 from advisor.lib.math import price_normalization
+from advisor.lib.spreads import SPREAD_COLUMNS, bond_spreads
 from advisor.lib.str import str_by_locale
+from advisor.lib.zero_curve import ZeroCurve
 
 
 class HTMLDoc:
@@ -153,8 +157,10 @@ class HTMLPage(QTextBrowser):
 
 
 class InfoBonds(HTMLPage):
-    def __init__(self, oConnector, sSECID):
+    def __init__(self, oConnector, sSECID, bRisk=False, bSpreads=False):
         super().__init__(oConnector, sSECID)
+        self.bRisk = bRisk
+        self.bSpreads = bSpreads
         self._doc(sSECID)
 
     def _doc(self, sSECID):
@@ -206,6 +212,27 @@ class InfoBonds(HTMLPage):
         sFutureAmort = self.oHTML.set_df_to_table(oFutureAmort, lColumns)
         self.oHTML.set_string(sFutureAmort)
 
+        oQuotes = self.oConnector.get_bond_quotes([sSECID]).dropna()
+        if self.bRisk and not oQuotes.empty:
+            self.oHTML.set_title_doc('Чувствительность к доходности', 3)
+            oRisk = bond_risk(BondEngine(oBond), oQuotes)
+            dRisk = {sColumn: str_by_locale(oRisk[sColumn].iloc[0])
+                     for sColumn in ['YIELD', *RISK_COLUMNS]
+                     if pd.notna(oRisk[sColumn].iloc[0])}
+            self.oHTML.set_dict_to_table(
+                dRisk, {'YIELD': 'Доходность к погашению, %',
+                        **RISK_COLUMNS})
+
+        oCurve = ZeroCurve.from_db(self.oConnector) if self.bSpreads else None
+        if oCurve is not None and not oQuotes.empty:
+            self.oHTML.set_title_doc('Спреды к КБД', 3)
+            oSpreads = bond_spreads(BondEngine(oBond), oQuotes, oCurve)
+            dSpreads = {sColumn: str_by_locale(
+                            round(oSpreads[sColumn].iloc[0], 1))
+                        for sColumn in SPREAD_COLUMNS
+                        if pd.notna(oSpreads[sColumn].iloc[0])}
+            self.oHTML.set_dict_to_table(dSpreads, SPREAD_COLUMNS)
+
         self.oHTML.set_title_doc('Страницы облигации', 3)
         self.oHTML.set_link('ММВБ', sSECID)
         self.oHTML.set_link('Smart-Lab', sSECID)
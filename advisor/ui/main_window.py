@@ -16,6 +16,7 @@
 #     You should have received a copy of the GNU General Public License
 #     along with this program.  If not, see <https://www.gnu.org/licenses/>.
 
+from os.path import splitext
 from pathlib import Path
 
 import numpy as np
@@ -24,10 +25,20 @@ from PyQt6.QtGui import QIcon, QAction
 from PyQt6.QtWidgets import QApplication, QMainWindow
 from dateutil.utils import today
 
-from advisor.lib.bond_analysis import bond_analysis_without, bond_analysis_ofz
+from advisor.lib.bond_analysis import BondAnalysis, bond_analysis_without, \
+    bond_analysis_ofz
+from advisor.lib.bond_risk import RISK_COLUMNS, portfolio_risk
+from advisor.lib.cache import ResponseCache
+from advisor.lib.cashflow_calendar import CALENDAR_COLUMNS, \
+    cashflow_calendar
+from advisor.lib.connect import ISSFetcher, create_session, get_cache, \
+    session_stats, set_cache, set_rate_limit, set_session
 from advisor.lib.constants import Constants
 from advisor.lib.moex import MOEXUpdate
+from advisor.lib.nss_curve import fit_ofz
 from advisor.lib.portfolio import Portfolio
+from advisor.lib.scenarios import SCENARIO_COLUMNS, portfolio_scenarios
+from advisor.lib.spreads import SPREAD_COLUMNS, universe_spreads
 from advisor.ui.help_dialog import About
 from advisor.ui.html_pages import InfoBonds
 from advisor.ui.plots import MplCanvas
@@ -52,6 +63,8 @@ class MainWindow(QMainWindow):
         super().__init__()
 
         self.oYieldCurve = None
+        # портфель хранит оценку позиций до нового импорта данных
+        self.oPortfolio = None
         self.oForwardRate = None
         self.oExportToCSV = None
         self.oOFZBondAnalysis = None
@@ -73,6 +86,16 @@ class MainWindow(QMainWindow):
         self.oTableDataOFZ = pd.DataFrame()
         self.sPathApp = sPath
         self.oConstants = Constants(oConfig)
+        set_rate_limit(self.oConstants.API_DELAY, self.oConstants.API_BURST)
+        set_session(create_session(self.oConstants.API_POOL_SIZE,
+                                   self.oConstants.API_RETRIES,
+                                   self.oConstants.API_BACKOFF),
+                    self.oConstants.API_TIMEOUT)
+        if self.oConstants.CACHE_ENABLED:
+            sCacheDir = str_get_file_patch(self.oConstants.sBasePath,
+                                           self.oConstants.CACHE_DIR)
+            set_cache(ResponseCache(sCacheDir,
+                                    self.oConstants.CACHE_MAX_SIZE))
         sDBFile = None
         sBasePath = self.oConstants.sBasePath
         sDBPath = self.oConstants.DB_PATH
@@ -82,8 +105,19 @@ class MainWindow(QMainWindow):
             sDBPath = str_get_file_patch(sBasePath, sDBDir)
             sDBPath = str_get_file_patch(sDBPath, sDBFile)
 
-        self.oConnector = SQL(sDBPath)
+        dProfiles = self.oConstants.DB_PROFILES
+        self.oConnector = SQL(sDBPath, dProfiles.get('ingest'))
         check_connect_db(self.oConnector, sBasePath, sDBDir, sDBFile)
+        # соединение только для выборок: таблицы, графики, портфель
+        self.oReader = SQL(sDBPath, dProfiles.get('analysis'))
+        if self.oConstants.DB_PROFILER:
+            sProfilerFile = self.oConstants.DB_PROFILER_FILE
+            self.oConnector.start_profiling(sFile=sProfilerFile)
+            # статистика читателя пишется рядом: profile.reader.json
+            if sProfilerFile:
+                sName, sExt = splitext(sProfilerFile)
+                sProfilerFile = f'{sName}.reader{sExt}'
+            self.oReader.start_profiling(sFile=sProfilerFile)
         self.setWindowTitle('Advisor')
         self.oCentralWidget = TabWidget(self)
         self.onPortfolio()
@@ -113,11 +147,14 @@ class MainWindow(QMainWindow):
         self.oStockAnalysis = QAction('Таблица акций')
         self.oBondAnalysis = QAction('Таблица облигаций')
         self.oOFZBondAnalysis = QAction('Таблица ОФЗ')
+        self.oBondSpreads = QAction('Спреды облигаций к КБД')
 
         # Plots
         self.oYieldCurve = QAction('Кривая бескупонной доходности')
         self.oForwardRate = QAction('Форвардная кривая')
         self.oTrandLine = QAction('Тренд')
+        self.oCashflowCalendar = QAction('Календарь выплат портфеля')
+        self.oCurveScenarios = QAction('Сценарии сдвига КБД')
 
         # Info
         self.oBoundInfo = QAction('Облигация')
@@ -152,12 +189,15 @@ class MainWindow(QMainWindow):
         oToolsMenu.addSeparator()
         oToolsMenu.addAction(self.oBondAnalysis)
         oToolsMenu.addAction(self.oOFZBondAnalysis)
+        oToolsMenu.addAction(self.oBondSpreads)
 
         # Create Plots
         oPlotsMenu = oMenuBar.addMenu('&Диаграммы')
         oPlotsMenu.addAction(self.oYieldCurve)
         oPlotsMenu.addAction(self.oForwardRate)
         oPlotsMenu.addAction(self.oTrandLine)
+        oPlotsMenu.addAction(self.oCashflowCalendar)
+        oPlotsMenu.addAction(self.oCurveScenarios)
 
         # Create Info menu
         oInfoMenu = oMenuBar.addMenu('&Данные')
@@ -171,13 +211,24 @@ class MainWindow(QMainWindow):
         oHelpMenu.addAction(self.oAbout)
 
     def onPortfolio(self):
-        oPortfolio = Portfolio(self.oConnector)
+        if self.oPortfolio is None:
+            self.oPortfolio = Portfolio(self.oConnector, self.oReader)
 
-        dTableData = oPortfolio.portfolio_data()
+        dTableData = self.oPortfolio.portfolio_data()
         oTableWidget = TableWidget(dTableData)
 
         self.oCentralWidget.add_tab(oTableWidget, 'Портфель')
 
+        if self.oConstants.BOND_RISK:
+            oRisk = portfolio_risk(BondAnalysis(self.oConnector,
+                                                oReader=self.oReader),
+                                   dTableData)
+            oRisk = oRisk.rename(columns={'VALUE': 'Стоимость, руб',
+                                          'YIELD': 'Доходность, %',
+                                          **RISK_COLUMNS}).round(2)
+            self.oCentralWidget.add_tab(TableWidget(oRisk),
+                                        'Риск портфеля')
+
     def connect_actions(self):
         """ It is PyQt6 slots or other words is connecting from GUI element to
         method or function in program. """
@@ -193,29 +244,88 @@ class MainWindow(QMainWindow):
         # Tool menu
         self.oBondAnalysis.triggered.connect(self.onBoundSelect)
         self.oOFZBondAnalysis.triggered.connect(self.onOFZBondAnalysis)
+        self.oBondSpreads.triggered.connect(self.onBondSpreads)
 
         # Plots Menu
         self.oYieldCurve.triggered.connect(self.onYieldCurvePlots)
         self.oForwardRate.triggered.connect(self.onForwardRatePlots)
         self.oTrandLine.triggered.connect(self.onTrandLinePlots)
+        self.oCashflowCalendar.triggered.connect(self.onCashflowCalendar)
+        self.oCurveScenarios.triggered.connect(self.onCurveScenarios)
 
         # Menu Help
         self.oAbout.triggered.connect(self.onDisplayAbout)
 
+    def onCashflowCalendar(self):
+        """ Показывает выплаты по облигациям портфеля по месяцам. """
+        if self.oPortfolio is None:
+            self.oPortfolio = Portfolio(self.oConnector, self.oReader)
+        oCalendar = cashflow_calendar(
+            BondAnalysis(self.oConnector, oReader=self.oReader),
+            self.oPortfolio.portfolio_data(), 'month', self.oConstants.TAX)
+
+        oCanvas = MplCanvas(self)
+        oCanvas.ax.bar(oCalendar.index, oCalendar['COUPONS'],
+                       label='Купоны после налога', color='blue')
+        oCanvas.ax.bar(oCalendar.index, oCalendar['AMORT'],
+                       bottom=oCalendar['COUPONS'], label='Погашения',
+                       color='green')
+        oCanvas.ax.set_xlabel('Месяц', fontsize=14)
+        oCanvas.ax.set_ylabel('Сумма, руб', fontsize=14)
+        oCanvas.ax.tick_params(axis='x', labelrotation=90)
+        sTitle = 'Календарь выплат портфеля'
+        oCanvas.ax.set_title(sTitle, fontsize=22)
+        oCanvas.ax.grid(linestyle='--', color='gray', linewidth=0.8, alpha=0.7)
+        oCanvas.ax.legend(fontsize=14)
+        self.oCentralWidget.add_tab(oCanvas, sTitle)
+
+        oCalendar = oCalendar.rename(columns=CALENDAR_COLUMNS).round(2)
+        self.oCentralWidget.add_tab(TableWidget(oCalendar),
+                                    'Выплаты по месяцам')
+
+    def onCurveScenarios(self):
+        """ Показывает результат портфеля при сдвигах КБД и изменение цен
+        всех облигаций. """
+        if self.oPortfolio is None:
+            self.oPortfolio = Portfolio(self.oConnector, self.oReader)
+        oTable, oBonds = portfolio_scenarios(
+            BondAnalysis(self.oConnector, oReader=self.oReader),
+            self.oPortfolio.portfolio_data(),
+            oCurve=YeldCurve(self.oReader).oCurve)
+
+        oCanvas = MplCanvas(self)
+        oCanvas.ax.barh(oTable.index, oTable['PNL'],
+                        color=['green' if fPnL >= 0 else 'red'
+                               for fPnL in oTable['PNL']])
+        oCanvas.ax.set_xlabel('Результат, руб', fontsize=14)
+        sTitle = 'Сценарии сдвига КБД'
+        oCanvas.ax.set_title(sTitle, fontsize=22)
+        oCanvas.ax.grid(linestyle='--', color='gray', linewidth=0.8, alpha=0.7)
+        self.oCentralWidget.add_tab(oCanvas, sTitle)
+
+        self.oCentralWidget.add_tab(
+            TableWidget(oTable.rename(columns=SCENARIO_COLUMNS).round(2)),
+            'Сценарии портфеля')
+        self.oCentralWidget.add_tab(
+            TableWidget(oBonds.rename(columns={'PRICE': 'Цена, руб'})
+                        .round(2)),
+            'Сценарии облигаций')
+
     def onTrandLinePlots(self):
         """
 
         """
         oCanvas = MplCanvas(self)
-        oYeldCurve = YeldCurve(self.oConnector)
+        oYeldCurve = YeldCurve(self.oReader)
         lTempVal = oYeldCurve.lTempVal
         lKBDValues = oYeldCurve.get_KBD_values()
         lDate, lYield = oYeldCurve.get_ofz_yeld(self.oConstants.DAYS)
-        lCoefs = np.polyfit(lDate, lYield, deg=2)
+        # кривая NSS по ценам ОФЗ вместо параболы по доходностям
+        oCurve, oResiduals = fit_ofz(BondAnalysis(self.oConnector,
+                                                  oReader=self.oReader))
         lXs = np.linspace(min(lDate), max(lDate), 100)
-        oP = np.poly1d(lCoefs)
-        lYs = oP(lXs)
-        oCanvas.ax.plot(lXs, lYs, color='green', label='Линия тренда')
+        lYs = oCurve.spot_percent(lXs)
+        oCanvas.ax.plot(lXs, lYs, color='green', label='Кривая NSS по ОФЗ')
         oCanvas.ax.plot(lTempVal, lKBDValues, label='КБД Мосбиржи',
                         linestyle='-', color='red')
         fMin = min(min(lKBDValues), min(lYield))
@@ -230,12 +340,19 @@ class MainWindow(QMainWindow):
         oCanvas.ax.legend(fontsize=14)
         self.oCentralWidget.add_tab(oCanvas, sTitle)
 
+        oResiduals = oResiduals.rename(columns={
+            'SHORTNAME': 'Имя', 'DURATION': 'Дюрация, лет',
+            'PRICE': 'Цена, руб', 'MODEL': 'Цена по кривой, руб',
+            'RICHCHEAP': 'Дешевизна, б.п.'}).round(2)
+        self.oCentralWidget.add_tab(TableWidget(oResiduals),
+                                    'Дешевизна ОФЗ к кривой NSS')
+
     def onYieldCurvePlots(self):
         """
 
         """
         oCanvas = MplCanvas(self)
-        oYeldCurve = YeldCurve(self.oConnector)
+        oYeldCurve = YeldCurve(self.oReader)
         lTempVal = oYeldCurve.lTempVal
         lKBDValues = oYeldCurve.get_KBD_values()
         lDate, lYield = oYeldCurve.get_ofz_yeld()
@@ -258,7 +375,7 @@ class MainWindow(QMainWindow):
 
         """
         oCanvas = MplCanvas(self)
-        oYeldCurve = YeldCurve(self.oConnector)
+        oYeldCurve = YeldCurve(self.oReader)
         lTempVal = oYeldCurve.lTempVal
         lKBDValues = oYeldCurve.get_KBD_values()
         lForwardVal = oYeldCurve.get_forwards_val()
@@ -281,7 +398,11 @@ class MainWindow(QMainWindow):
         oTableData = bond_analysis_without(self.oConnector,
                                            iMinPeriod,
                                            iMaxPeriod,
-                                           fPercent)
+                                           fPercent,
+                                           oReader=self.oReader,
+                                           bRisk=self.oConstants.BOND_RISK,
+                                           bSpreads=(
+                                               self.oConstants.BOND_SPREADS))
 
         # запускаем всю эту херь
         oTableWidget = TableWidget(oTableData, bColor=True,
@@ -289,12 +410,23 @@ class MainWindow(QMainWindow):
                                    lColorMatDate=self.oConstants.COLORMATDATE)
         self.oCentralWidget.add_tab(oTableWidget, 'Список облигаций')
 
+    def onBondSpreads(self):
+        """ Показывает Z-спред и G-спред всех облигаций базы с ценой. """
+        oSpreads = universe_spreads(
+            BondAnalysis(self.oConnector, oReader=self.oReader))
+        oSpreads = oSpreads.rename(columns=SPREAD_COLUMNS).rename(
+            columns={'YIELD': 'Доходность, %', 'DURATION': 'Дюрация, лет'})
+        self.oCentralWidget.add_tab(TableWidget(oSpreads.round(2)),
+                                    'Спреды облигаций')
+
     def onBondInfo(self, sSECID):
-        oBondInfo = InfoBonds(self.oConnector, sSECID)
+        oBondInfo = InfoBonds(self.oConnector, sSECID,
+                              self.oConstants.BOND_RISK,
+                              self.oConstants.BOND_SPREADS)
         self.oCentralWidget.add_tab(oBondInfo, sSECID)
 
     def onBoundSelect(self):
-        oSelectBondsDialog = SelectBondsDialog(self.oConnector)
+        oSelectBondsDialog = SelectBondsDialog(self.oReader)
         oSelectBondsDialog.exec()
         lData = oSelectBondsDialog.GetValue()
         self.onBondAnalysis(lData[0], lData[1], lData[2])
@@ -305,23 +437,55 @@ class MainWindow(QMainWindow):
         oAbout.exec()
 
     def onImportStock(self):
-        aMOEX = MOEXUpdate(self.oConnector)
+        oFetcher = ISSFetcher(self.oConstants.API_WORKERS,
+                              self.oConstants.API_DELAY)
+        aMOEX = MOEXUpdate(self.oConnector, oFetcher=oFetcher)
         # обновляет данные для Кривой бескупонной доходности
         aMOEX.get_kbd()
         # обновляет облигации
-        aMOEX.get_collection(sType='ОФЗ', iLevel=0)
-        aMOEX.get_collection(sType='Корпоративные', iLevel=0)
-        aMOEX.get_collection(sType='Муниципальные', iLevel=0)
-        aMOEX.get_collection(sType='Биржевые', iLevel=0)
-        aMOEX.get_collection(sType='Субъектов РФ', iLevel=0)
+        aMOEX.get_collection(sType='ОФЗ', iLevel=0,
+                             fnProgress=self.onImportProgress)
+        aMOEX.get_collection(sType='Корпоративные', iLevel=0,
+                             fnProgress=self.onImportProgress)
+        aMOEX.get_collection(sType='Муниципальные', iLevel=0,
+                             fnProgress=self.onImportProgress)
+        aMOEX.get_collection(sType='Биржевые', iLevel=0,
+                             fnProgress=self.onImportProgress)
+        aMOEX.get_collection(sType='Субъектов РФ', iLevel=0,
+                             fnProgress=self.onImportProgress)
         aMOEX.get_markets_bonds()
-        aMOEX.get_bond_description()
+        aMOEX.get_bond_description(fnProgress=self.onImportProgress)
         # обновляем акции
         aMOEX.get_collection(sGroup='stock_shares_tplus',
-                             sCollectionName='stock_shares_one')
+                             sCollectionName='stock_shares_one',
+                             fnProgress=self.onImportProgress)
         aMOEX.get_collection(sGroup='stock_shares_tplus',
-                             sCollectionName='stock_shares_two')
+                             sCollectionName='stock_shares_two',
+                             fnProgress=self.onImportProgress)
         aMOEX.get_markets_shares()
+        # таблица для отбора облигаций по изменившимся бумагам
+        aMOEX.refresh_screen()
+        # оценка портфеля и другие расчёты по ценам устарели
+        self.oConnector.bump_data_version('MarketData')
+        # отложенная контрольная точка журнала и отображение в память
+        # выросшего файла базы
+        self.oConnector.checkpoint()
+        self.oReader.apply_profile({'mmap_size': 'auto'})
+
+        dStats = session_stats()
+        sMessage = (f'Запросов к API: {dStats["requests"]}, '
+                    f'открыто соединений: {dStats["connections"]}, '
+                    f'переиспользовано: {dStats["reused"]}')
+        oCache = get_cache()
+        if oCache is not None:
+            dCache = oCache.stats()
+            sMessage = (f'{sMessage}; кэш: попаданий {dCache["hits"]}, '
+                        f'промахов {dCache["misses"]}')
+        self.onSetStatusBarMessage(sMessage)
+
+    def onImportProgress(self, iDone, iTotal):
+        self.onSetStatusBarMessage(f'Обновляем: {iDone} из {iTotal}')
+        QApplication.processEvents()
 
     def onExportToCSV(self):
         iIndex = self.oCentralWidget.currentIndex()
@@ -333,7 +497,9 @@ class MainWindow(QMainWindow):
                                          date_format='%Y.%m.%d')
 
     def onOFZBondAnalysis(self):
-        oTableData = bond_analysis_ofz(self.oConnector)
+        oTableData = bond_analysis_ofz(self.oConnector, oReader=self.oReader,
+                                       bRisk=self.oConstants.BOND_RISK,
+                                       bSpreads=self.oConstants.BOND_SPREADS)
 
         # запускаем всю эту херь
         oTableWidget = TableWidget(oTableData, bColor=True,
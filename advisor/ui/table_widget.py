@@ -22,7 +22,7 @@ from PyQt6.QtCore import QAbstractTableModel, QModelIndex, Qt
 from PyQt6.QtGui import QColor
 from PyQt6.QtWidgets import QTableView
 
-from advisor.lib.math import bring_number_into_range, years
+from advisor.lib.math import bring_number_into_range, year_fractions
 
 
 class PandasModel(QAbstractTableModel):
@@ -35,6 +35,11 @@ class PandasModel(QAbstractTableModel):
         self.bColor = bColor
         self.lColorYield = lColorYield
         self.lColorMatDate = lColorMatDate
+        # годы до погашения считаются один раз, а не для каждой ячейки
+        self._MatYears = None
+        if 'Дата погашения' in DataFrame.columns:
+            self._MatYears = year_fractions(
+                DataFrame['Дата погашения']).to_numpy()
 
     def rowCount(self, parent=QModelIndex()) -> int:
         """ Override method from QAbstractTableModel
@@ -89,9 +94,7 @@ class PandasModel(QAbstractTableModel):
 
                 if self._DataFrame.columns[index.column()] == 'Дата погашения':
                     lColor = self.lColorMatDate.copy()
-                    fYears = years(self._DataFrame.iloc[
-                                       index.row(), index.column()
-                                   ])
+                    fYears = self._MatYears[index.row()]
                     if fYears < 1:
                         return QColor(lColor[0])
                     elif 1 < fYears < 3:
@@ -121,6 +124,25 @@ class PandasModel(QAbstractTableModel):
 
         return None
 
+    def sort(self, column, order=Qt.SortOrder.AscendingOrder):
+        """Override method from QAbstractTableModel
+
+        Sort rows of the pandas DataFrame by the column, empty values last.
+        Column -1 (no sorting) keeps the current order.
+        """
+        if column < 0:
+            return
+
+        self.layoutAboutToBeChanged.emit()
+        oOrder = self._DataFrame.iloc[:, column].reset_index(drop=True)
+        oOrder = oOrder.sort_values(
+            ascending=order == Qt.SortOrder.AscendingOrder,
+            kind='stable', na_position='last').index.to_numpy()
+        self._DataFrame = self._DataFrame.iloc[oOrder]
+        if self._MatYears is not None:
+            self._MatYears = self._MatYears[oOrder]
+        self.layoutChanged.emit()
+
 
 class TableWidget(QTableView):
     def __init__(self, data, bColor=False, lColorYield=None,
@@ -157,6 +179,10 @@ class TableWidget(QTableView):
         oModel = PandasModel(self.dTableData, self.bColor, self.lColorYield,
                  self.lColorMatDate)
         self.setModel(oModel)
+        # строки в исходном порядке, пока не нажат заголовок столбца
+        self.horizontalHeader().setSortIndicator(-1,
+                                                 Qt.SortOrder.AscendingOrder)
+        self.setSortingEnabled(True)
 
 
 if __name__ == '__main__':
@@ -0,0 +1,111 @@
+#     This code is a part of program Advisor
+#     Copyright (C) 2022 contributors Advisor
+#     The full list is available at the link
+#     https://github.com/tagezi/advisor/blob/master/contributors.txt
+#
+#     This program is free software: you can redistribute it and/or modify
+#     it under the terms of the GNU General Public License as published by
+#     the Free Software Foundation, either version 3 of the License, or
+#     (at your option) any later version.
+#
+#     This program is distributed in the hope that it will be useful,
+#     but WITHOUT ANY WARRANTY; without even the implied warranty of
+#     MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#     GNU General Public License for more details.
+#
+#     You should have received a copy of the GNU General Public License
+#     along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+""" Shared fixtures of the unit tests.
+
+Function:
+    get_date(iDays)
+    load_structure(oConnector, bMigrate=True)
+    create_db(sFile=':memory:', dProfile=None, bMigrate=True)
+    config_profiles()
+
+Class:
+    FakeFetcher
+"""
+
+import logging
+from configparser import ConfigParser
+from datetime import date, timedelta
+
+from advisor.lib.constants import db_profiles
+from advisor.lib.migrations import migrate
+from advisor.lib.sql import SQL
+from advisor.lib.str import str_get_file_patch
+
+
+def get_date(iDays):
+    """ Returns the date iDays from today as YYYY-MM-DD. """
+    return (date.today() + timedelta(days=iDays)).strftime('%Y-%m-%d')
+
+
+def load_structure(oConnector, bMigrate=True):
+    """ Creates the program structure in the database and switches off
+    logging.
+
+    :param oConnector: Database.
+    :type oConnector: SQL
+    :param bMigrate: Whether to apply the migrations.
+    :type bMigrate: bool
+    :return: The same database.
+    :rtype: SQL
+    """
+    sFile = str_get_file_patch('../db', 'advisor_structure.sql')
+    with open(sFile) as fScript:
+        oConnector.execute_script(fScript.read())
+    logging.disable(logging.CRITICAL)
+    if bMigrate:
+        migrate(oConnector)
+
+    return oConnector
+
+
+def create_db(sFile=':memory:', dProfile=None, bMigrate=True):
+    """ Opens the database and creates the program structure in it.
+
+    :param sFile: Path to the database.
+    :type sFile: str
+    :param dProfile: Connection profile.
+    :type dProfile: dict or None
+    :param bMigrate: Whether to apply the migrations.
+    :type bMigrate: bool
+    :rtype: SQL
+    """
+    return load_structure(SQL(sFile, dProfile), bMigrate)
+
+
+def config_profiles():
+    """ Returns the connection profiles of config.ini.
+
+    :rtype: dict[str, dict]
+    """
+    oConfig = ConfigParser()
+    oConfig.read(str_get_file_patch('..', 'config.ini'))
+    return db_profiles(oConfig)
+
+
+class FakeFetcher:
+    """ Stands for ISSFetcher: keeps the batches of requests and answers
+    every request by fnAnswer(sURL, **dParams), empty answers by default.
+    """
+
+    def __init__(self, fnAnswer=None):
+        self.fnAnswer = fnAnswer
+        self.lBatches = []
+        self.lRequests = []
+
+    def fetch_many(self, lRequests, fnProgress=None):
+        lRequests = list(lRequests)
+        self.lBatches.append(lRequests)
+        self.lRequests.extend(lRequests)
+        lResults = [self.fnAnswer(sURL, **dParams) if self.fnAnswer else {}
+                    for sURL, dParams in lRequests]
+        if fnProgress:
+            for iDone in range(1, len(lRequests) + 1):
+                fnProgress(iDone, len(lRequests))
+
+        return lResults
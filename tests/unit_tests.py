@@ -19,9 +19,25 @@
 """ The main module for UnitTest. Runs all tests for the program. """
 import unittest
 
+from ut_bond_engine import TestBondEngine
+from ut_bond_risk import TestBondRisk
+from ut_cache import TestCache
+from ut_cashflow_calendar import TestCashflowCalendar
+from ut_connect import TestConnect
+from ut_ledger import TestLedger
+from ut_math import TestMath
+from ut_migrations import TestMigrations
+from ut_moex import TestMOEX
+from ut_nss_curve import TestNSSCurve
+from ut_options import TestOptions
 from ut_pep8 import TestPEP8
-from ut_sql import TestSQLite
+from ut_profiler import TestProfiler
+from ut_scenarios import TestScenarios
+from ut_spreads import TestSpreads
+from ut_sql import TestSQLite, TestSQLBulk, TestSQLProfiles, \
+    TestSQLScreen
 from ut_str import TestStr
+from ut_zero_curve import TestZeroCurve
 
 
 def suite():
@@ -49,6 +65,68 @@ def suite():
     oSuite.addTest(TestSQLite('test_sql_get_values'))
     oSuite.addTest(TestSQLite('test_sql_check_value'))
     oSuite.addTest(TestSQLite('test_sql_get_id'))
+    oSuite.addTest(TestSQLBulk('test_sql_insert_many'))
+    oSuite.addTest(TestSQLBulk('test_sql_upsert_many'))
+    oSuite.addTest(TestSQLBulk('test_sql_update_delete_many'))
+    oSuite.addTest(TestSQLBulk('test_sql_transaction'))
+    oSuite.addTest(TestSQLBulk('test_sql_transaction_bulk_error'))
+    oSuite.addTest(TestSQLProfiles('test_sql_ingest_profile'))
+    oSuite.addTest(TestSQLProfiles('test_sql_analysis_profile'))
+    oSuite.addTest(TestSQLProfiles('test_sql_analysis_profile_lists'))
+    oSuite.addTest(TestSQLProfiles('test_sql_read_only_missing'))
+    oSuite.addTest(TestSQLScreen('test_sql_get_bonds_by_value'))
+    oSuite.addTest(TestSQLScreen('test_sql_refresh_bond_screen'))
+    oSuite.addTest(TestSQLScreen('test_sql_get_period_list'))
+    oSuite.addTest(TestConnect('test_connect_token_bucket_burst'))
+    oSuite.addTest(TestConnect('test_connect_token_bucket_wait'))
+    oSuite.addTest(TestConnect('test_connect_fetch_many_order'))
+    oSuite.addTest(TestConnect('test_connect_retries'))
+    oSuite.addTest(TestCache('test_cache_store_lookup'))
+    oSuite.addTest(TestCache('test_cache_not_cached_url'))
+    oSuite.addTest(TestCache('test_cache_revalidate'))
+    oSuite.addTest(TestCache('test_cache_evict_lru'))
+    oSuite.addTest(TestMOEX('test_moex_get_collection'))
+    oSuite.addTest(TestMOEX('test_moex_update_data'))
+    oSuite.addTest(TestMOEX('test_moex_backfill_kbd'))
+    oSuite.addTest(TestMigrations('test_migrations_migrate'))
+    oSuite.addTest(TestMigrations('test_migrations_index_lookup'))
+    oSuite.addTest(TestProfiler('test_profiler_get_template'))
+    oSuite.addTest(TestProfiler('test_profiler_execute_query'))
+    oSuite.addTest(TestProfiler('test_profiler_dump'))
+    oSuite.addTest(TestMath('test_math_year_fractions'))
+    oSuite.addTest(TestMath('test_math_year_fractions_basis'))
+    oSuite.addTest(TestMath('test_math_bond_ytm'))
+    oSuite.addTest(TestMath('test_math_bond_zspread'))
+    oSuite.addTest(TestBondEngine('test_bond_engine_amortized'))
+    oSuite.addTest(TestBondEngine('test_bond_engine_amort_counts'))
+    oSuite.addTest(TestBondEngine('test_bond_engine_analyse'))
+    oSuite.addTest(TestBondEngine('test_bond_engine_ytm'))
+    oSuite.addTest(TestBondRisk('test_bond_risk_risk_measures'))
+    oSuite.addTest(TestBondRisk('test_bond_risk_portfolio_risk'))
+    oSuite.addTest(TestBondRisk('test_bond_risk_bond_table'))
+    oSuite.addTest(TestBondRisk('test_bond_risk_single_load'))
+    oSuite.addTest(TestZeroCurve('test_zero_curve_spot'))
+    oSuite.addTest(TestZeroCurve('test_zero_curve_forward'))
+    oSuite.addTest(TestZeroCurve('test_zero_curve_history'))
+    oSuite.addTest(TestSpreads('test_spreads_universe_spreads'))
+    oSuite.addTest(TestSpreads('test_spreads_bond_table'))
+    oSuite.addTest(TestNSSCurve('test_nss_curve_fit_rates'))
+    oSuite.addTest(TestNSSCurve('test_nss_curve_fit_prices'))
+    oSuite.addTest(TestNSSCurve('test_nss_curve_kbd_history'))
+    oSuite.addTest(TestLedger('test_ledger_position'))
+    oSuite.addTest(TestLedger('test_ledger_update'))
+    oSuite.addTest(TestLedger('test_ledger_portfolio_data'))
+    oSuite.addTest(TestLedger('test_ledger_portfolio_valuation'))
+    oSuite.addTest(TestLedger('test_ledger_analysis_profile'))
+    oSuite.addTest(TestLedger('test_ledger_analysis_valuation'))
+    oSuite.addTest(TestCashflowCalendar('test_cashflow_calendar_month'))
+    oSuite.addTest(TestCashflowCalendar('test_cashflow_calendar_year'))
+    oSuite.addTest(TestScenarios('test_scenarios_scenario_values'))
+    oSuite.addTest(TestScenarios('test_scenarios_portfolio_scenarios'))
+    oSuite.addTest(TestOptions('test_options_bs_price'))
+    oSuite.addTest(TestOptions('test_options_monte_carlo'))
+    oSuite.addTest(TestOptions('test_options_monte_carlo_chunks'))
+    oSuite.addTest(TestOptions('test_options_monte_carlo_odd_chunk'))
 
     return oSuite
 
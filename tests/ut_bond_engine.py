@@ -0,0 +1,171 @@
+#     This code is a part of program Advisor
+#     Copyright (C) 2022 contributors Advisor
+#     The full list is available at the link
+#     https://github.com/tagezi/advisor/blob/master/contributors.txt
+#
+#     This program is free software: you can redistribute it and/or modify
+#     it under the terms of the GNU General Public License as published by
+#     the Free Software Foundation, either version 3 of the License, or
+#     (at your option) any later version.
+#
+#     This program is distributed in the hope that it will be useful,
+#     but WITHOUT ANY WARRANTY; without even the implied warranty of
+#     MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#     GNU General Public License for more details.
+#
+#     You should have received a copy of the GNU General Public License
+#     along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+import logging
+import unittest
+
+import pandas as pd
+
+from advisor.lib.bond_analysis import BondAnalysis, acc_inflation_bond
+from advisor.lib.bond_engine import BondEngine
+from advisor.lib.math import percent_year
+from advisor.lib.sql import SQL
+
+from helpers import FakeFetcher, get_date
+
+
+def suite():
+    oSuite = unittest.TestSuite()
+    oSuite.addTest(TestBondEngine('test_bond_engine_amortized'))
+    oSuite.addTest(TestBondEngine('test_bond_engine_amort_counts'))
+    oSuite.addTest(TestBondEngine('test_bond_engine_analyse'))
+    oSuite.addTest(TestBondEngine('test_bond_engine_ytm'))
+
+    return oSuite
+
+
+def amortization_answer(sURL, **dParams):
+    """ Answers with one amortization at the maturity of RU4. """
+    lColumns = ['isin', 'name', 'amortdate', 'facevalue', 'initialfacevalue',
+                'faceunit', 'valueprc', 'value', 'value_rub', 'data_source',
+                'secid', 'primary_boardid', 'issuevalue']
+    lData = [['RU', 'name', get_date(900), 1000, 1000, 'SUR', 100, 1000, 1000,
+              'maturity', 'RU4', 'TQCB', 1000]]
+    return {'amortizations': {'columns': lColumns, 'data': lData}}
+
+
+class TestBondEngine(unittest.TestCase):
+    def setUp(self):
+        """ Creates an in-memory database with coupons and amortizations of
+        three bonds, the last one is amortized. """
+        self.oConnector = SQL(':memory:')
+        self.oConnector.execute_script(
+            'CREATE TABLE BoundCoupons (SECID TEXT, coupon_date DATE, '
+            'face_value DOUBLE, coupon_value DOUBLE, valueprc DOUBLE);'
+            'CREATE TABLE BoundAmortizations (SECID TEXT, amort_date DATE, '
+            'face_value DOUBLE, valueprc DOUBLE, amort_value DOUBLE);'
+            'CREATE UNIQUE INDEX ux_BoundCoupons '
+            'ON BoundCoupons (SECID, coupon_date);'
+            'CREATE UNIQUE INDEX ux_BoundAmortizations '
+            'ON BoundAmortizations (SECID, amort_date);')
+        logging.disable(logging.CRITICAL)
+
+        # SECID, maturity in days, price, accrued interest, coupon
+        lBonds = [('RU1', 2000, 97.5, 12.3, 41.14),
+                  ('RU2', 700, 101.2, 3.05, 23.93),
+                  ('RU3', 1500, 99.0, 1.0, 30.0)]
+        lCoupons, lAmort = [], []
+        for sSECID, iDays, _, _, fCoupon in lBonds:
+            lCoupons.append((sSECID, get_date(-90), 1000, fCoupon, 8))
+            for iDay in range(iDays % 182, iDays + 1, 182):
+                lCoupons.append((sSECID, get_date(iDay), 1000, fCoupon, 8))
+            lAmort.append((sSECID, get_date(iDays), 1000, 100, 1000))
+        lAmort.append(('RU3', get_date(700), 1000, 50, 500))
+        self.oConnector.insert_many('BoundCoupons',
+                                    'SECID, coupon_date, face_value, '
+                                    'coupon_value, valueprc', lCoupons)
+        self.oConnector.insert_many('BoundAmortizations',
+                                    'SECID, amort_date, face_value, '
+                                    'valueprc, amort_value', lAmort)
+
+        self.oTableData = pd.DataFrame(
+            [(sSECID, 'ISIN', sSECID, get_date(iDays), fPrice, 10.0, 11.0,
+              9.0, fCoupon, fACC, get_date(iDays % 182), 182, 1000, 1000,
+              'SUR', 2, 'ПАО')
+             for sSECID, iDays, fPrice, fACC, fCoupon in lBonds],
+            columns=['SECID', 'ISIN', 'SHORTNAME', 'MATDATE', 'PREVPRICE',
+                     'YIELDATPREVWAPRICE', 'EFFECTIVEYIELD', 'COUPONPERCENT',
+                     'COUPONVALUE', 'ACCRUEDINT', 'NEXTCOUPON', 'COUPONPERIOD',
+                     'INITIALFACEVALUE', 'FACEVALUE', 'FACEUNIT',
+                     'LISTLEVEL', 'EMITTER'])
+        self.oAnalysis = BondAnalysis(self.oConnector)
+
+    def tearDown(self):
+        del self.oConnector
+
+    def test_bond_engine_amortized(self):
+        oAmortized = BondEngine(self.oAnalysis).amortized(['RU1', 'RU2',
+                                                           'RU3'])
+        self.assertEqual(oAmortized.tolist(), [False, False, True])
+
+    def test_bond_engine_amort_counts(self):
+        """ Check that missing bonds are fetched by one batch and counted
+        with the others by one query. """
+        oFetcher = FakeFetcher(amortization_answer)
+        self.oAnalysis.oQuery.oFetcher = oFetcher
+        oProfiler = self.oConnector.start_profiling(bExplain=False)
+
+        oCounts = self.oAnalysis.get_amort_counts(['RU1', 'RU3', 'RU4'])
+        self.assertEqual(oCounts.to_dict(), {'RU1': 1, 'RU3': 2, 'RU4': 1})
+        self.assertEqual(len(oFetcher.lBatches), 1)
+        self.assertEqual(len(oFetcher.lBatches[0]), 1)
+        self.assertEqual(self.oConnector.sql_get_values(
+            'BoundAmortizations', 'amort_date, amort_value', 'SECID',
+            ('RU4',)), [(get_date(900), 1000)])
+
+        lCounts = [dTemplate['count'] for dTemplate in oProfiler.summary()
+                   if 'COUNT' in dTemplate['template']]
+        self.assertEqual(lCounts, [2])
+        self.assertFalse(self.oAnalysis.get_check_amort('RU4'))
+        self.assertTrue(self.oAnalysis.get_check_amort('RU3'))
+        self.assertEqual(len(oFetcher.lBatches), 1)
+
+    def test_bond_engine_analyse(self):
+        """ Check that the engine gives the same values as the calculation
+        bond by bond. """
+        oTableData = BondEngine(self.oAnalysis).analyse(
+            self.oTableData.copy(), True, 0.07, 0.08)
+        self.assertEqual(oTableData['SECID'].tolist(), ['RU1', 'RU2'])
+
+        for sSECID, fPercent5, fPercent10 in oTableData[
+                ['SECID', 'Процент (инфл 5) в год, %',
+                 'Процент (инфл 10) в год, %']].itertuples(index=False):
+            fIAPP5, fIAPP10, sMatDate = acc_inflation_bond(
+                self.oAnalysis, self.oTableData, sSECID, 0.07, 0.08)
+            self.assertEqual(fPercent5, percent_year(fIAPP5, sMatDate))
+            self.assertEqual(fPercent10, percent_year(fIAPP10, sMatDate))
+
+    def test_bond_engine_ytm(self):
+        """ Check that discounted payments give the price, and that a fee,
+        a tax and an offer change the yield in the right direction. """
+        oEngine = BondEngine(self.oAnalysis)
+        oYields = oEngine.ytm(self.oTableData)
+        self.assertTrue(oYields['CONVERGED'].all())
+
+        oFlows = oEngine.cashflows(['RU2'])
+        fPrice = 1000 / 100 * 101.2 + 3.05
+        fYield = oYields.loc['RU2', 'YIELD'] / 100
+        self.assertAlmostEqual(
+            (oFlows['value'] * (1 + fYield) ** -oFlows['YEARS']).sum(),
+            fPrice, places=6)
+
+        oNet = oEngine.ytm(self.oTableData, fFee=0.003, fTax=0.13)
+        self.assertTrue((oNet['YIELD'] < oYields['YIELD']).all())
+
+        oTableData = self.oTableData.assign(
+            OFFERDATE=[get_date(365), None, None], BUYBACKPRICE=[100.0] * 3)
+        oOffer = oEngine.ytm(oTableData, oPrice=[100.0] * 3, bOffer=True)
+        oPar = oEngine.ytm(oTableData, oPrice=[100.0] * 3)
+        self.assertNotAlmostEqual(oOffer.loc['RU1', 'YIELD'],
+                                  oPar.loc['RU1', 'YIELD'])
+        self.assertEqual(oOffer.loc['RU2', 'YIELD'],
+                         oPar.loc['RU2', 'YIELD'])
+
+
+if __name__ == '__main__':
+    unittest.TextTestRunner(verbosity=2).run(suite())
@@ -0,0 +1,166 @@
+#     This code is a part of program Advisor
+#     Copyright (C) 2022 contributors Advisor
+#     The full list is available at the link
+#     https://github.com/tagezi/advisor/blob/master/contributors.txt
+#
+#     This program is free software: you can redistribute it and/or modify
+#     it under the terms of the GNU General Public License as published by
+#     the Free Software Foundation, either version 3 of the License, or
+#     (at your option) any later version.
+#
+#     This program is distributed in the hope that it will be useful,
+#     but WITHOUT ANY WARRANTY; without even the implied warranty of
+#     MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#     GNU General Public License for more details.
+#
+#     You should have received a copy of the GNU General Public License
+#     along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+import unittest
+from unittest import mock
+
+import numpy as np
+import pandas as pd
+
+from advisor.lib.bond_analysis import BondAnalysis, bond_analysis_without
+from advisor.lib.bond_engine import BondEngine
+from advisor.lib.bond_risk import bond_risk, portfolio_risk, risk_measures
+from advisor.lib.math import cashflow_matrix
+
+from helpers import create_db, get_date
+
+
+def suite():
+    oSuite = unittest.TestSuite()
+    oSuite.addTest(TestBondRisk('test_bond_risk_risk_measures'))
+    oSuite.addTest(TestBondRisk('test_bond_risk_portfolio_risk'))
+    oSuite.addTest(TestBondRisk('test_bond_risk_bond_table'))
+    oSuite.addTest(TestBondRisk('test_bond_risk_single_load'))
+
+    return oSuite
+
+
+def get_connector():
+    """ Creates the database with two bonds, their coupons and
+    amortizations. """
+    oConnector = create_db()
+    lBonds = [('RU1', 99.0, 5.0, 730), ('RU2', 101.0, 0.0, 1460)]
+    oConnector.insert_many(
+        'BondsSecurities', 'SECID, PREVPRICE, ACCRUEDINT',
+        [(sSECID, fPrice, fACC) for sSECID, fPrice, fACC, _ in lBonds])
+    oConnector.insert_many(
+        'BondDescription', 'SECID, FACEVALUE',
+        [(tBond[0], 1000) for tBond in lBonds])
+    lCoupons, lAmort = [], []
+    for sSECID, _, _, iDays in lBonds:
+        lCoupons.extend((sSECID, get_date(iDay), 1000, 40, 8)
+                        for iDay in range(iDays % 182, iDays + 1, 182))
+        lAmort.append((sSECID, get_date(iDays), 1000, 100, 1000))
+    oConnector.insert_many('BoundCoupons', 'SECID, coupon_date, '
+                           'face_value, coupon_value, valueprc', lCoupons)
+    oConnector.insert_many('BoundAmortizations', 'SECID, amort_date, '
+                           'face_value, valueprc, amort_value', lAmort)
+    return oConnector
+
+
+def add_screen(oConnector):
+    """ Adds RU3 with a price for which the yield has no root and puts
+    all bonds into the table of the bond screener. """
+    oConnector.insert_many('BondDescription', 'SECID, FACEVALUE',
+                           [('RU3', 1000)])
+    oConnector.insert_many('BondsSecurities', 'SECID, PREVPRICE, ACCRUEDINT',
+                           [('RU3', 0.01, 0.0)])
+    oConnector.insert_many('BoundCoupons', 'SECID, coupon_date, '
+                           'face_value, coupon_value, valueprc',
+                           [('RU3', get_date(iDay), 1000, 40, 8)
+                            for iDay in range(182, 1100, 182)])
+    oConnector.insert_many('BoundAmortizations', 'SECID, amort_date, '
+                           'face_value, valueprc, amort_value',
+                           [('RU3', get_date(1100), 1000, 100, 1000)])
+    oConnector.insert_many(
+        'BondScreen', 'SECID, ISIN, SHORTNAME, MATDATE, PREVPRICE, '
+        'YIELDATPREVWAPRICE, EFFECTIVEYIELD, COUPONPERCENT, COUPONVALUE, '
+        'ACCRUEDINT, NEXTCOUPON, COUPONPERIOD, INITIALFACEVALUE, FACEVALUE, '
+        'FACEUNIT, LISTLEVEL, EMITTER, IS_OFZ, IS_SCREEN, HAS_OOO',
+        [(sSECID, sSECID, sSECID, get_date(iDays), fPrice, 15.0, 15.0, 8.0,
+          40.0, fACC, get_date(182), 182, 1000, 1000, 'SUR', 2, 'ПАО', 0, 1,
+          0)
+         for sSECID, fPrice, fACC, iDays in (('RU1', 99.0, 5.0, 730),
+                                             ('RU2', 101.0, 0.0, 1460),
+                                             ('RU3', 0.01, 0.0, 1100))])
+
+
+class TestBondRisk(unittest.TestCase):
+    def test_bond_risk_risk_measures(self):
+        """ Check a zero-coupon bond by formulas and a coupon bond by
+        the change of price. """
+        aTimes = np.array([[5.0, 0, 0], [1, 2, 3]])
+        aAmounts = np.array([[1000.0, 0, 0], [80, 80, 1080]])
+        aPrice, aDuration, aModified, aConvexity, aDV01 = risk_measures(
+            [0.1, 0.08], aTimes, aAmounts)
+        self.assertAlmostEqual(aDuration[0], 5)
+        self.assertAlmostEqual(aModified[0], 5 / 1.1)
+        self.assertAlmostEqual(aConvexity[0], 30 / 1.21)
+        self.assertAlmostEqual(aPrice[1], 1000)
+
+        aUp = risk_measures([0.1001, 0.0801], aTimes, aAmounts)[0]
+        aDown = risk_measures([0.0999, 0.0799], aTimes, aAmounts)[0]
+        np.testing.assert_allclose((aDown - aUp) / 2, aDV01, rtol=1e-6)
+
+    def test_bond_risk_portfolio_risk(self):
+        """ Check that the portfolio DV01 is the sum of positions and
+        shares are skipped. """
+        oConnector = get_connector()
+        oPortfolio = pd.DataFrame({'Код актива': ['RU1', 'RU2', 'SBER'],
+                                   'Количество': [10, 5, 100]})
+        oRisk = portfolio_risk(BondAnalysis(oConnector), oPortfolio)
+
+        self.assertEqual(oRisk.index.tolist(), ['RU1', 'RU2', 'Портфель'])
+        self.assertAlmostEqual(oRisk.loc['Портфель', 'DV01'],
+                               oRisk['DV01'].iloc[:2].sum())
+        self.assertAlmostEqual(oRisk.loc['RU1', 'VALUE'], 10 * 995)
+        self.assertTrue(oRisk.loc['RU1', 'DURATION'] <
+                        oRisk.loc['Портфель', 'DURATION'] <
+                        oRisk.loc['RU2', 'DURATION'])
+
+    def test_bond_risk_bond_table(self):
+        """ Check that a bond without the yield stays in the table of bonds
+        with empty risk measures. """
+        oConnector = get_connector()
+        add_screen(oConnector)
+        oTable = bond_analysis_without(oConnector, iMaxPeriod=182,
+                                       bInfl=False, bRisk=True)
+
+        self.assertEqual(sorted(oTable['ID']), ['RU1', 'RU2', 'RU3'])
+        oTable = oTable.set_index('ID')
+        self.assertTrue(np.isnan(oTable.loc['RU3', 'Дюрация, лет']))
+        self.assertGreater(oTable.loc['RU1', 'Дюрация, лет'], 0)
+
+    def test_bond_risk_single_load(self):
+        """ Check that cashflows are read once for both the yield and the
+        risk measures and that the yield is the same as BondEngine.ytm. """
+        oConnector = get_connector()
+        oEngine = BondEngine(BondAnalysis(oConnector), bFetch=False)
+        oQuotes = oConnector.get_bond_quotes(['RU1', 'RU2'])
+        oYields = oEngine.ytm(oQuotes)
+
+        with mock.patch.object(oConnector, 'get_cashflows',
+                               wraps=oConnector.get_cashflows) as oRead:
+            oRisk = bond_risk(oEngine, oQuotes)
+        # по одному запросу на купоны и амортизации
+        self.assertEqual(oRead.call_count, 2)
+        np.testing.assert_allclose(oRisk['YIELD'], oYields['YIELD'])
+
+        # готовые матрицы и доходности: выплаты не читаются совсем
+        oIndex = pd.Index(oQuotes['SECID'])
+        tMatrix = cashflow_matrix(oEngine.cashflows(oIndex), oIndex)
+        with mock.patch.object(oConnector, 'get_cashflows',
+                               wraps=oConnector.get_cashflows) as oRead:
+            oShared = bond_risk(oEngine, oQuotes, tMatrix=tMatrix,
+                                oYields=oYields)
+        self.assertEqual(oRead.call_count, 0)
+        pd.testing.assert_frame_equal(oShared, oRisk)
+
+
+if __name__ == '__main__':
+    unittest.TextTestRunner(verbosity=2).run(suite())
@@ -0,0 +1,102 @@
+#     This code is a part of program Advisor
+#     Copyright (C) 2022 contributors Advisor
+#     The full list is available at the link
+#     https://github.com/tagezi/advisor/blob/master/contributors.txt
+#
+#     This program is free software: you can redistribute it and/or modify
+#     it under the terms of the GNU General Public License as published by
+#     the Free Software Foundation, either version 3 of the License, or
+#     (at your option) any later version.
+#
+#     This program is distributed in the hope that it will be useful,
+#     but WITHOUT ANY WARRANTY; without even the implied warranty of
+#     MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#     GNU General Public License for more details.
+#
+#     You should have received a copy of the GNU General Public License
+#     along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+import gzip
+import shutil
+import tempfile
+import time
+import unittest
+
+from advisor.lib.cache import ResponseCache
+
+sURL = 'https://iss.moex.com/iss/securities/SU26207RMFS9.json'
+
+
+def suite():
+    oSuite = unittest.TestSuite()
+    oSuite.addTest(TestCache('test_cache_store_lookup'))
+    oSuite.addTest(TestCache('test_cache_not_cached_url'))
+    oSuite.addTest(TestCache('test_cache_revalidate'))
+    oSuite.addTest(TestCache('test_cache_evict_lru'))
+
+    return oSuite
+
+
+class TestCache(unittest.TestCase):
+    def setUp(self):
+        self.sDir = tempfile.mkdtemp()
+        self.oCache = ResponseCache(self.sDir)
+
+    def tearDown(self):
+        del self.oCache
+        shutil.rmtree(self.sDir)
+
+    def test_cache_store_lookup(self):
+        """ Check that a stored answer is returned for the same request. """
+        dParams = {'iss.meta': 'off', 'iss.only': 'description'}
+        jJSON, dHeaders = self.oCache.lookup(sURL, dParams)
+        self.assertIsNone(jJSON)
+        self.oCache.store(sURL, dParams, b'{"description": 1}')
+
+        jJSON, dHeaders = self.oCache.lookup(sURL, dict(dParams))
+        self.assertEqual(jJSON, {'description': 1})
+        jJSON, dHeaders = self.oCache.lookup(sURL, {'iss.meta': 'off'})
+        self.assertIsNone(jJSON)
+
+        dStats = self.oCache.stats()
+        self.assertEqual(dStats['hits'], 1)
+        self.assertEqual(dStats['misses'], 2)
+        self.assertEqual(dStats['entries'], 1)
+
+    def test_cache_not_cached_url(self):
+        """ Check that URLs without TTL are never stored. """
+        sMarket = ('https://iss.moex.com/'
+                   'iss/engines/stock/markets/bonds/securities.json')
+        self.oCache.store(sMarket, {}, b'{}')
+        self.assertEqual(self.oCache.stats()['entries'], 0)
+
+    def test_cache_revalidate(self):
+        """ Check that expired answers are revalidated by ETag. """
+        oCache = ResponseCache(self.sDir, lTTL=((r'securities', 0.01),))
+        oCache.store(sURL, {}, b'[1]', {'ETag': '"abc"'})
+        time.sleep(0.02)
+        jJSON, dHeaders = oCache.lookup(sURL, {})
+        self.assertIsNone(jJSON)
+        self.assertEqual(dHeaders, {'If-None-Match': '"abc"'})
+        self.assertEqual(oCache.revalidate(sURL, {}), [1])
+        self.assertEqual(oCache.stats()['revalidated'], 1)
+
+    def test_cache_evict_lru(self):
+        """ Check that the least recently used answers are evicted. """
+        bContent = str(list(range(40))).encode()
+        oCache = ResponseCache(self.sDir,
+                               iMaxSize=len(gzip.compress(bContent)) * 2)
+        for i in range(3):
+            oCache.store(sURL, {'n': i}, bContent)
+            time.sleep(0.01)
+            oCache.lookup(sURL, {'n': 0})
+            time.sleep(0.01)
+
+        self.assertGreater(oCache.stats()['evicted'], 0)
+        self.assertIsNotNone(oCache.lookup(sURL, {'n': 0})[0])
+        self.assertIsNone(oCache.lookup(sURL, {'n': 1})[0])
+
+
+if __name__ == '__main__':
+    runner = unittest.TextTestRunner()
+    runner.run(suite())
@@ -0,0 +1,133 @@
+#     This code is a part of program Advisor
+#     Copyright (C) 2022 contributors Advisor
+#     The full list is available at the link
+#     https://github.com/tagezi/advisor/blob/master/contributors.txt
+#
+#     This program is free software: you can redistribute it and/or modify
+#     it under the terms of the GNU General Public License as published by
+#     the Free Software Foundation, either version 3 of the License, or
+#     (at your option) any later version.
+#
+#     This program is distributed in the hope that it will be useful,
+#     but WITHOUT ANY WARRANTY; without even the implied warranty of
+#     MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#     GNU General Public License for more details.
+#
+#     You should have received a copy of the GNU General Public License
+#     along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+import unittest
+
+import pandas as pd
+
+from advisor.lib.bond_analysis import BondAnalysis
+from advisor.lib.cashflow_calendar import cashflow_calendar
+
+from helpers import FakeFetcher, create_db
+
+
+def suite():
+    oSuite = unittest.TestSuite()
+    oSuite.addTest(TestCashflowCalendar('test_cashflow_calendar_month'))
+    oSuite.addTest(TestCashflowCalendar('test_cashflow_calendar_year'))
+
+    return oSuite
+
+
+# одна выплата купона и погашение RU3 для каждого запроса
+ANSWERS = {
+    'coupons': {
+        'columns': ['isin', 'name', 'issuevalue', 'coupondate', 'recorddate',
+                    'startdate', 'initialfacevalue', 'facevalue', 'faceunit',
+                    'value', 'valueprc', 'value_rub', 'secid',
+                    'primary_boardid'],
+        'data': [['RU', 'name', 1000, '2031-03-01', '2031-02-28',
+                  '2030-09-01', 1000, 1000, 'SUR', 30, 6, 30, 'RU3',
+                  'TQCB']]},
+    'amortizations': {
+        'columns': ['isin', 'name', 'amortdate', 'facevalue',
+                    'initialfacevalue', 'faceunit', 'valueprc', 'value',
+                    'value_rub', 'data_source', 'secid', 'primary_boardid',
+                    'issuevalue'],
+        'data': [['RU', 'name', '2031-03-01', 1000, 1000, 'SUR', 100, 1000,
+                  1000, 'maturity', 'RU3', 'TQCB', 1000]]}}
+
+
+def payment_answer(sURL, values, **dParams):
+    """ Answers with the payments of RU3 of the asked kind. """
+    return {values: ANSWERS[values]}
+
+
+class TestCashflowCalendar(unittest.TestCase):
+    def setUp(self):
+        """ Creates a base with three bonds: RU1 and RU2 have their payments
+        in the base (one coupon of RU2 is not announced yet), RU3 is fetched
+        from the exchange. The portfolio also holds a share. """
+        self.oConnector = create_db()
+
+        lBonds = ['RU1', 'RU2', 'RU3']
+        self.oConnector.insert_many('BondsSecurities', 'SECID, PREVPRICE',
+                                    [(sSECID, 100.0) for sSECID in lBonds])
+        self.oConnector.insert_many('BondDescription', 'SECID, FACEVALUE',
+                                    [(sSECID, 1000) for sSECID in lBonds])
+        self.oConnector.insert_many(
+            'BoundCoupons', 'SECID, coupon_date, face_value, coupon_value, '
+            'valueprc',
+            [('RU1', '2020-01-15', 1000, 40, 8),
+             ('RU1', '2030-01-15', 1000, 40, 8),
+             ('RU1', '2030-01-20', 1000, 40, 8),
+             ('RU1', '2030-07-15', 1000, 40, 8),
+             ('RU2', '2030-01-10', 1000, 25, 5),
+             ('RU2', '2030-07-10', 1000, None, None)])
+        self.oConnector.insert_many(
+            'BoundAmortizations', 'SECID, amort_date, face_value, valueprc, '
+            'amort_value',
+            [('RU1', '2030-07-15', 1000, 100, 1000),
+             ('RU2', '2031-01-10', 1000, 100, 1000)])
+
+        self.oFetcher = FakeFetcher(payment_answer)
+        self.oAnalysis = BondAnalysis(self.oConnector)
+        self.oAnalysis.oQuery.oFetcher = self.oFetcher
+        self.oPortfolio = pd.DataFrame(
+            [('RU1', 3), ('RU1', 2), ('RU2', 10), ('RU3', 1), ('SBER', 20)],
+            columns=['Код актива', 'Количество'])
+
+    def tearDown(self):
+        del self.oConnector
+
+    def test_cashflow_calendar_month(self):
+        """ Check the months: coupons after tax and by quantity, past
+        payments are skipped, RU3 is fetched by one batch per table. """
+        oCalendar = cashflow_calendar(self.oAnalysis, self.oPortfolio)
+
+        self.assertEqual(oCalendar.index.tolist(),
+                         ['2030-01', '2030-07', '2031-01', '2031-03'])
+        pd.testing.assert_series_equal(
+            oCalendar['COUPONS'],
+            pd.Series([565.5, 174.0, 0.0, 26.1], index=oCalendar.index,
+                      name='COUPONS'))
+        self.assertEqual(oCalendar['AMORT'].tolist(),
+                         [0.0, 5000.0, 10000.0, 1000.0])
+        self.assertEqual(oCalendar['UNKNOWN'].tolist(), [0, 1, 0, 0])
+        pd.testing.assert_series_equal(
+            oCalendar['TOTAL'], oCalendar['COUPONS'] + oCalendar['AMORT'],
+            check_names=False)
+
+        self.assertEqual(len(self.oFetcher.lBatches), 2)
+        self.assertEqual([len(lBatch) for lBatch in self.oFetcher.lBatches],
+                         [1, 1])
+
+    def test_cashflow_calendar_year(self):
+        oCalendar = cashflow_calendar(self.oAnalysis, self.oPortfolio,
+                                      'year', fTax=0.0)
+
+        self.assertEqual(oCalendar.index.tolist(), ['2030', '2031'])
+        self.assertEqual(oCalendar['COUPONS'].round(2).tolist(),
+                         [850.0, 30.0])
+        self.assertEqual(oCalendar['AMORT'].tolist(), [5000.0, 11000.0])
+        self.assertRaises(ValueError, cashflow_calendar, self.oAnalysis,
+                          self.oPortfolio, 'week')
+
+
+if __name__ == '__main__':
+    unittest.TextTestRunner(verbosity=2).run(suite())
@@ -0,0 +1,107 @@
+#     This code is a part of program Advisor
+#     Copyright (C) 2022 contributors Advisor
+#     The full list is available at the link
+#     https://github.com/tagezi/advisor/blob/master/contributors.txt
+#
+#     This program is free software: you can redistribute it and/or modify
+#     it under the terms of the GNU General Public License as published by
+#     the Free Software Foundation, either version 3 of the License, or
+#     (at your option) any later version.
+#
+#     This program is distributed in the hope that it will be useful,
+#     but WITHOUT ANY WARRANTY; without even the implied warranty of
+#     MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#     GNU General Public License for more details.
+#
+#     You should have received a copy of the GNU General Public License
+#     along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+import time
+import unittest
+from unittest import mock
+
+from advisor.lib import connect as oConnect
+from advisor.lib.connect import ISSFetcher, TokenBucket, connect, \
+    create_session, reset_session_stats, session_stats, set_cache, \
+    set_rate_limit, set_session
+
+
+def suite():
+    oSuite = unittest.TestSuite()
+    oSuite.addTest(TestConnect('test_connect_token_bucket_burst'))
+    oSuite.addTest(TestConnect('test_connect_token_bucket_wait'))
+    oSuite.addTest(TestConnect('test_connect_fetch_many_order'))
+    oSuite.addTest(TestConnect('test_connect_retries'))
+
+    return oSuite
+
+
+class TestConnect(unittest.TestCase):
+    def test_connect_token_bucket_burst(self):
+        """ Check that the bucket does not sleep while it has tokens. """
+        oBucket = TokenBucket(fApiDelay=10, iBurst=3)
+        fStart = time.monotonic()
+        for _ in range(3):
+            self.assertEqual(oBucket.acquire(), 0)
+        self.assertLess(time.monotonic() - fStart, 1)
+
+    def test_connect_token_bucket_wait(self):
+        """ Check that the bucket sleeps only when it is empty. """
+        oBucket = TokenBucket(fApiDelay=0.05)
+        self.assertEqual(oBucket.acquire(), 0)
+        fStart = time.monotonic()
+        oBucket.acquire()
+        self.assertGreaterEqual(time.monotonic() - fStart, 0.04)
+
+    def test_connect_fetch_many_order(self):
+        """ Check that a batch returns answers in the order of requests. """
+        def fake_connect(sURL, **dParams):
+            time.sleep(0.01 * (5 - int(sURL)))
+            return {'url': sURL, 'only': dParams.get('only')}
+
+        oFetcher = ISSFetcher(iWorkers=4)
+        lRequests = [(str(i), {'only': 'description'}) for i in range(5)]
+        lProgress = []
+        with mock.patch('advisor.lib.connect.connect', fake_connect):
+            lResults = oFetcher.fetch_many(
+                lRequests, lambda iDone, iTotal: lProgress.append(iDone))
+
+        self.assertEqual([d['url'] for d in lResults],
+                         ['0', '1', '2', '3', '4'])
+        self.assertEqual(lResults[0]['only'], 'description')
+        self.assertEqual(lProgress, [1, 2, 3, 4, 5])
+
+    def test_connect_retries(self):
+        """ Check that every retry takes a token of the limiter and is
+        counted in the session statistics. """
+        oSession = create_session(iRetries=3, fBackoff=0)
+        lAnswers = []
+        for iStatus in (503, 502, 200):
+            oResponse = mock.Mock(status_code=iStatus)
+            oResponse.json.return_value = {'status': iStatus}
+            lAnswers.append(oResponse)
+        oSession.get = mock.Mock(side_effect=lAnswers)
+        oOldSession, oOldLimiter = oConnect.oSession, oConnect.oLimiter
+        set_session(oSession)
+        set_cache(None)
+        oBucket = set_rate_limit(0)
+        reset_session_stats()
+        try:
+            with mock.patch.object(oBucket, 'acquire',
+                                   wraps=oBucket.acquire) as oAcquire:
+                jJSON = connect('http://iss.test/a.json')
+            dStats = session_stats()
+        finally:
+            oConnect.oSession, oConnect.oLimiter = oOldSession, oOldLimiter
+            reset_session_stats()
+
+        self.assertEqual(jJSON, {'status': 200})
+        self.assertEqual(oSession.get.call_count, 3)
+        self.assertEqual(oAcquire.call_count, 3)
+        self.assertEqual(dStats['requests'], 3)
+        self.assertEqual(dStats['retries'], 2)
+
+
+if __name__ == '__main__':
+    runner = unittest.TextTestRunner()
+    runner.run(suite())
@@ -0,0 +1,220 @@
+#     This code is a part of program Advisor
+#     Copyright (C) 2022 contributors Advisor
+#     The full list is available at the link
+#     https://github.com/tagezi/advisor/blob/master/contributors.txt
+#
+#     This program is free software: you can redistribute it and/or modify
+#     it under the terms of the GNU General Public License as published by
+#     the Free Software Foundation, either version 3 of the License, or
+#     (at your option) any later version.
+#
+#     This program is distributed in the hope that it will be useful,
+#     but WITHOUT ANY WARRANTY; without even the implied warranty of
+#     MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#     GNU General Public License for more details.
+#
+#     You should have received a copy of the GNU General Public License
+#     along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+import tempfile
+import unittest
+from os.path import join
+
+import pandas as pd
+
+from advisor.lib.ledger import Position, PositionLedger
+from advisor.lib.portfolio import Portfolio
+from advisor.lib.sql import SQL
+
+from helpers import config_profiles, create_db
+
+# acc_events_id, event_date, event_time, event_id, tool_id, tool_code,
+# tool_price, tool_count
+EVENTS = [(1, '2023-01-10', '10:00', 1, 1, 'SBER', 100.0, 10),
+          (2, '2023-02-10', '10:00', 1, 1, 'SBER', 110.0, 10),
+          (3, '2023-03-10', '10:00', 5, 1, 'SBER', 120.0, 15),
+          (4, '2023-03-11', '10:00', 1, 2, 'RU1', 990.0, 3)]
+EVENT_COLUMNS = ('acc_events_id, event_date, event_time, event_id, tool_id, '
+                 'tool_code, tool_price, tool_count')
+
+
+def suite():
+    oSuite = unittest.TestSuite()
+    oSuite.addTest(TestLedger('test_ledger_position'))
+    oSuite.addTest(TestLedger('test_ledger_update'))
+    oSuite.addTest(TestLedger('test_ledger_portfolio_data'))
+    oSuite.addTest(TestLedger('test_ledger_portfolio_valuation'))
+    oSuite.addTest(TestLedger('test_ledger_analysis_profile'))
+    oSuite.addTest(TestLedger('test_ledger_analysis_valuation'))
+
+    return oSuite
+
+
+class TestLedger(unittest.TestCase):
+    def setUp(self):
+        self.oConnector = self.fill(create_db())
+
+    @staticmethod
+    def fill(oConnector):
+        """ Adds trades to the database. """
+        oConnector.insert_many('Tools', 'tool_id, tool_type',
+                               [(1, 'Акции'), (2, 'Облигации')])
+        oConnector.insert_many('Events', 'event_id, event',
+                               [(1, 'Покупка'), (5, 'Продажа')])
+        oConnector.insert_many('AccountEvents', EVENT_COLUMNS, EVENTS)
+        return oConnector
+
+    @staticmethod
+    def analysis_connectors(sFile):
+        """ Returns the writer and the reader built by the profiles of
+        config.ini. """
+        dProfiles = config_profiles()
+        oConnector = TestLedger.fill(create_db(sFile, dProfiles.get('ingest')))
+        return oConnector, SQL(sFile, dProfiles.get('analysis'))
+
+    def test_ledger_position(self):
+        """ Check the average cost and FIFO results of a partial sale and
+        a sale over the position. """
+        oPosition = Position('SBER')
+        oPosition.buy(10, 100)
+        oPosition.buy(10, 110)
+        oPosition.sell(15, 120)
+        self.assertAlmostEqual(oPosition.fRealized, 225)
+        self.assertAlmostEqual(oPosition.fRealizedFIFO, 250)
+        self.assertAlmostEqual(oPosition.fCost / oPosition.fCount, 105)
+        self.assertEqual(oPosition.lLots, [[5, 110]])
+
+        oPosition.sell(8, 100)
+        self.assertEqual(oPosition.fCount, -3)
+        self.assertEqual(oPosition.lLots, [])
+        oPosition.buy(5, 90)
+        self.assertEqual(oPosition.lLots, [[2, 90]])
+        self.assertAlmostEqual(oPosition.fCost, 180)
+
+    def test_ledger_update(self):
+        """ Check that new events update the snapshot and that backdated
+        or deleted events give the same result as a full rebuild. """
+        oPositions = PositionLedger(self.oConnector).update()
+        self.assertEqual(oPositions.loc['SBER', 'quantity'], 5)
+        self.assertAlmostEqual(oPositions.loc['SBER', 'realized'], 225)
+        self.assertAlmostEqual(oPositions.loc['RU1', 'wac'], 990)
+
+        self.oConnector.insert_many(
+            'AccountEvents', EVENT_COLUMNS,
+            [(5, '2023-04-01', '10:00', 1, 2, 'RU1', 1010.0, 1),
+             (6, '2023-01-01', '10:00', 1, 1, 'SBER', 90.0, 10)])
+        oPositions = PositionLedger(self.oConnector).update()
+        oFull = PositionLedger(self.oConnector)
+        oFull.apply(self.oConnector.get_account_events())
+        pd.testing.assert_frame_equal(oPositions, oFull.positions())
+        self.assertAlmostEqual(oPositions.loc['RU1', 'wac'], 995)
+        self.assertAlmostEqual(oPositions.loc['SBER', 'realized_fifo'], 400)
+
+        self.oConnector.execute_query(
+            'DELETE FROM AccountEvents WHERE acc_events_id=6;')
+        oPositions = PositionLedger(self.oConnector).update()
+        self.assertEqual(oPositions.loc['SBER', 'quantity'], 5)
+        self.assertAlmostEqual(oPositions.loc['SBER', 'realized_fifo'], 250)
+
+    def test_ledger_portfolio_data(self):
+        """ Check the table of the portfolio built from the ledger. """
+        self.oConnector.insert_many('SharesCollections', 'SECID, SHORTNAME',
+                                    [('SBER', 'Сбербанк')])
+        self.oConnector.insert_many('BondsSecurities', 'SECID, SHORTNAME',
+                                    [('RU1', 'Облигация 1')])
+
+        oPortfolio = Portfolio(self.oConnector).portfolio_data()
+        self.assertEqual(oPortfolio['Код актива'].tolist(), ['SBER', 'RU1'])
+        self.assertEqual(oPortfolio['Количество'].tolist(), [5, 3])
+        self.assertEqual(oPortfolio['Средняя цена покупки'].tolist(),
+                         [105, 990])
+        self.assertEqual(oPortfolio['Средняя цена FIFO'].tolist(),
+                         [110, 990])
+        self.assertEqual(oPortfolio.loc[1, 'Сумма'], 525)
+
+    def test_ledger_portfolio_valuation(self):
+        """ Check the market value of positions and that the valuation is
+        cached until the market data version is raised. """
+        self.oConnector.insert_many('SharesCollections', 'SECID, SHORTNAME',
+                                    [('SBER', 'Сбербанк')])
+        self.oConnector.insert_many('SharesSecurities', 'SECID, PREVPRICE',
+                                    [('SBER', 130.0)])
+        self.oConnector.insert_many(
+            'BondsSecurities', 'SECID, SHORTNAME, PREVPRICE, ACCRUEDINT, '
+            'YIELDATPREVWAPRICE', [('RU1', 'Облигация 1', 101.0, 5.0, 12.5)])
+        self.oConnector.insert_many('BondDescription', 'SECID, FACEVALUE',
+                                    [('RU1', 1000)])
+
+        oPortfolio = Portfolio(self.oConnector)
+        oData = oPortfolio.portfolio_data().set_index('Код актива')
+        self.assertEqual(oData.loc['SBER', 'Стоимость'], 650)
+        self.assertEqual(oData.loc['RU1', 'Стоимость'], 3045)
+        self.assertEqual(oData.loc['RU1', 'НКД'], 15)
+        self.assertEqual(oData.loc['SBER', 'Нереализованный результат'],
+                         125)
+        self.assertEqual(oData.loc['RU1', 'Нереализованный результат'], 60)
+        self.assertEqual(oData.loc['RU1', 'Доходность, %'], 12.5)
+        self.assertAlmostEqual(oData['Доля, %'].sum(), 100)
+
+        self.oConnector.execute_query(
+            "UPDATE SharesSecurities SET PREVPRICE=140 WHERE SECID='SBER';")
+        oData = oPortfolio.portfolio_data().set_index('Код актива')
+        self.assertEqual(oData.loc['SBER', 'Стоимость'], 650)
+
+        self.oConnector.bump_data_version('MarketData')
+        oData = oPortfolio.portfolio_data().set_index('Код актива')
+        self.assertEqual(oData.loc['SBER', 'Стоимость'], 700)
+
+    def test_ledger_analysis_profile(self):
+        """ Check the ledger and the instruments of the portfolio read
+        through the query_only connection of the analysis profile. """
+        with tempfile.TemporaryDirectory() as sDir:
+            oConnector, oReader = self.analysis_connectors(
+                join(sDir, 'test.db'))
+            oConnector.insert_many('SharesCollections', 'SECID, SHORTNAME',
+                                   [('SBER', 'Сбербанк')])
+            oConnector.insert_many('BondsSecurities', 'SECID, SHORTNAME',
+                                   [('RU1', 'Облигация 1')])
+            PositionLedger(oConnector, oReader).update()
+            # операция задним числом: SBER считается заново по читателю
+            oConnector.insert_many(
+                'AccountEvents', EVENT_COLUMNS,
+                [(5, '2023-01-01', '10:00', 1, 1, 'SBER', 90.0, 10)])
+            oPositions = PositionLedger(oConnector, oReader).update()
+            self.assertEqual(oPositions.loc['SBER', 'quantity'], 15)
+            self.assertAlmostEqual(oPositions.loc['SBER', 'realized_fifo'],
+                                   400)
+
+            oTools = oReader.get_portfolio_tools(oPositions.index)
+            self.assertEqual(oTools['tool_code'].tolist(), ['SBER', 'RU1'])
+            self.assertEqual(oTools['SHORTNAME'].tolist(),
+                             ['Сбербанк', 'Облигация 1'])
+            del oReader, oConnector
+
+    def test_ledger_analysis_valuation(self):
+        """ Check the valuation of the portfolio through the query_only
+        connection of the analysis profile. """
+        with tempfile.TemporaryDirectory() as sDir:
+            oConnector, oReader = self.analysis_connectors(
+                join(sDir, 'test.db'))
+            oConnector.insert_many('SharesCollections', 'SECID, SHORTNAME',
+                                   [('SBER', 'Сбербанк')])
+            oConnector.insert_many('SharesSecurities', 'SECID, PREVPRICE',
+                                   [('SBER', 130.0)])
+            oConnector.insert_many(
+                'BondsSecurities', 'SECID, SHORTNAME, PREVPRICE, ACCRUEDINT, '
+                'YIELDATPREVWAPRICE',
+                [('RU1', 'Облигация 1', 101.0, 5.0, 12.5)])
+            oConnector.insert_many('BondDescription', 'SECID, FACEVALUE',
+                                   [('RU1', 1000)])
+
+            oData = Portfolio(oConnector, oReader).portfolio_data().set_index(
+                'Код актива')
+            self.assertEqual(oData.loc['SBER', 'Стоимость'], 650)
+            self.assertEqual(oData.loc['RU1', 'Стоимость'], 3045)
+            self.assertEqual(oData.loc['RU1', 'Доходность, %'], 12.5)
+            del oReader, oConnector
+
+
+if __name__ == '__main__':
+    unittest.TextTestRunner(verbosity=2).run(suite())
@@ -0,0 +1,108 @@
+#     This code is a part of program Advisor
+#     Copyright (C) 2022 contributors Advisor
+#     The full list is available at the link
+#     https://github.com/tagezi/advisor/blob/master/contributors.txt
+#
+#     This program is free software: you can redistribute it and/or modify
+#     it under the terms of the GNU General Public License as published by
+#     the Free Software Foundation, either version 3 of the License, or
+#     (at your option) any later version.
+#
+#     This program is distributed in the hope that it will be useful,
+#     but WITHOUT ANY WARRANTY; without even the implied warranty of
+#     MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#     GNU General Public License for more details.
+#
+#     You should have received a copy of the GNU General Public License
+#     along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+import unittest
+from datetime import date, datetime, timedelta
+
+import numpy as np
+import pandas as pd
+
+from advisor.lib.math import bond_ytm, bond_zspread, cashflow_matrix, \
+    year_fractions, years
+
+
+def suite():
+    oSuite = unittest.TestSuite()
+    oSuite.addTest(TestMath('test_math_year_fractions'))
+    oSuite.addTest(TestMath('test_math_year_fractions_basis'))
+    oSuite.addTest(TestMath('test_math_bond_ytm'))
+    oSuite.addTest(TestMath('test_math_bond_zspread'))
+
+    return oSuite
+
+
+class TestMath(unittest.TestCase):
+    def test_math_year_fractions(self):
+        """ Check that the array kernel and the scalar wrapper agree. """
+        lDates = [(date.today() + timedelta(days=iDays)).strftime('%Y-%m-%d')
+                  for iDays in (-10, 0, 182, 364, 2000)]
+        oYears = year_fractions(pd.Series(lDates, index=list('abcde')))
+        self.assertEqual(oYears.index.tolist(), list('abcde'))
+        self.assertEqual(oYears.tolist(),
+                         [years(sDate) for sDate in lDates])
+        self.assertEqual(oYears['d'], 1.0)
+        self.assertEqual(years(lDates[3], 365), 364 / 365)
+        self.assertTrue(np.isnan(year_fractions([None])[0]))
+
+    def test_math_year_fractions_basis(self):
+        oToday = datetime(2024, 1, 31)
+        lDates = ['2025-01-31', '2024-07-31', '2024-02-29']
+        dExpected = {
+            'ACT/365': [366 / 365, 182 / 365, 29 / 365],
+            'ACT/ACT': [336 / 366 + 30 / 365, 182 / 366, 29 / 366],
+            '30/360': [1, 0.5, 29 / 360]}
+        for sBasis, lExpected in dExpected.items():
+            np.testing.assert_allclose(
+                year_fractions(lDates, sBasis=sBasis, oToday=oToday),
+                lExpected)
+
+        with self.assertRaises(ValueError):
+            year_fractions(lDates, sBasis='30E/360')
+
+    def test_math_bond_ytm(self):
+        """ A bond at par yields its coupon rate; a bond without payments
+        or with the root out of bounds is not solved. """
+        oFlows = pd.DataFrame({'SECID': ['A'] * 5 + ['B'] * 2,
+                               'YEARS': [1, 2, 3, 4, 5, 0.5, 1],
+                               'value': [10, 10, 10, 10, 110, 52, 1052]})
+        aTimes, aAmounts = cashflow_matrix(oFlows, ['A', 'B', 'C', 'D'])
+        self.assertEqual(aTimes.shape, (4, 5))
+        self.assertEqual(aAmounts[1].tolist(), [52, 1052, 0, 0, 0])
+
+        aAmounts[3] = aAmounts[0]
+        aTimes[3] = aTimes[0]
+        aYield, bConverged, aIterations, _ = bond_ytm(
+            [100, 950, 100, 0.0001], aTimes, aAmounts)
+        self.assertAlmostEqual(aYield[0], 0.1, places=10)
+        self.assertEqual(bConverged.tolist(), [True, True, False, False])
+        self.assertTrue(np.isnan(aYield[2:]).all())
+        self.assertAlmostEqual(
+            (aAmounts[1] * (1 + aYield[1]) ** -aTimes[1]).sum(), 950)
+        self.assertLess(aIterations.max(), 20)
+
+    def test_math_bond_zspread(self):
+        """ Over a flat curve the Z-spread is the continuous yield minus
+        the curve rate; a rising curve needs a smaller spread. """
+        aTimes = np.array([[1.0, 2, 3], [0.5, 1, 0]])
+        aAmounts = np.array([[80.0, 80, 1080], [40, 1040, 0]])
+        aYield = bond_ytm([980, 1010], aTimes, aAmounts)[0]
+
+        aFlat = np.where(aAmounts > 0, 0.05, 0)
+        aZSpread, bConverged, _, _ = bond_zspread(
+            [980, 1010], aTimes, aAmounts, aFlat)
+        self.assertTrue(bConverged.all())
+        np.testing.assert_allclose(aZSpread, np.log1p(aYield) - 0.05,
+                                   atol=1e-10)
+
+        aRising = aFlat + 0.01 * aTimes
+        self.assertTrue((bond_zspread([980, 1010], aTimes, aAmounts,
+                                      aRising)[0] < aZSpread).all())
+
+
+if __name__ == '__main__':
+    unittest.TextTestRunner(verbosity=2).run(suite())
@@ -0,0 +1,83 @@
+#     This code is a part of program Advisor
+#     Copyright (C) 2022 contributors Advisor
+#     The full list is available at the link
+#     https://github.com/tagezi/advisor/blob/master/contributors.txt
+#
+#     This program is free software: you can redistribute it and/or modify
+#     it under the terms of the GNU General Public License as published by
+#     the Free Software Foundation, either version 3 of the License, or
+#     (at your option) any later version.
+#
+#     This program is distributed in the hope that it will be useful,
+#     but WITHOUT ANY WARRANTY; without even the implied warranty of
+#     MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#     GNU General Public License for more details.
+#
+#     You should have received a copy of the GNU General Public License
+#     along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+import logging
+import unittest
+
+from advisor.lib.migrations import MIGRATIONS, get_version, migrate
+
+from helpers import create_db
+
+
+def suite():
+    oSuite = unittest.TestSuite()
+    oSuite.addTest(TestMigrations('test_migrations_migrate'))
+    oSuite.addTest(TestMigrations('test_migrations_index_lookup'))
+
+    return oSuite
+
+
+class TestMigrations(unittest.TestCase):
+    def setUp(self):
+        """ Creates an in-memory database with the program structure. """
+        self.oConnector = create_db(bMigrate=False)
+
+    def tearDown(self):
+        del self.oConnector
+
+    def test_migrations_migrate(self):
+        """ Check that duplicates are removed and logged, keys are created
+        and the migration is applied only once. """
+        self.oConnector.insert_many('BondsSecurities', 'SECID, SHORTNAME',
+                                    [('A', 'old'), ('B', 'b'), ('A', 'new')])
+        self.assertEqual(get_version(self.oConnector), 0)
+
+        logging.disable(logging.NOTSET)
+        with self.assertLogs(level=logging.WARNING) as oLogs:
+            iVersion = migrate(self.oConnector)
+        logging.disable(logging.CRITICAL)
+        self.assertEqual(oLogs.output, [
+            'WARNING:root:The migration 1 deleted 1 rows from '
+            'BondsSecurities.'])
+        self.assertEqual(iVersion, MIGRATIONS[-1][0])
+        self.assertEqual(get_version(self.oConnector), iVersion)
+        self.assertEqual(
+            self.oConnector.sql_get_all('BondsSecurities', 'SECID, SHORTNAME'),
+            [('B', 'b'), ('A', 'new')])
+        self.assertFalse(self.oConnector.insert_row(
+            'BondsSecurities', 'SECID, SHORTNAME', ('A', 'again')))
+
+        self.assertEqual(migrate(self.oConnector), iVersion)
+
+    def test_migrations_index_lookup(self):
+        """ Check that the join of a bond card uses the indexes. """
+        migrate(self.oConnector)
+        lPlan = self.oConnector.execute_query(
+            'EXPLAIN QUERY PLAN SELECT * FROM BondDescription '
+            'JOIN BondsSecurities '
+            'ON BondDescription.SECID=BondsSecurities.SECID '
+            'JOIN BondsMarketData '
+            'ON BondDescription.SECID=BondsMarketData.SECID '
+            'WHERE BondDescription.SECID=?;', ('A',)).fetchall()
+        lDetails = [tRow[-1] for tRow in lPlan]
+        self.assertTrue(all('USING INDEX' in sDetail
+                            for sDetail in lDetails), lDetails)
+
+
+if __name__ == '__main__':
+    unittest.TextTestRunner(verbosity=2).run(suite())
@@ -0,0 +1,139 @@
+#     This code is a part of program Advisor
+#     Copyright (C) 2022 contributors Advisor
+#     The full list is available at the link
+#     https://github.com/tagezi/advisor/blob/master/contributors.txt
+#
+#     This program is free software: you can redistribute it and/or modify
+#     it under the terms of the GNU General Public License as published by
+#     the Free Software Foundation, either version 3 of the License, or
+#     (at your option) any later version.
+#
+#     This program is distributed in the hope that it will be useful,
+#     but WITHOUT ANY WARRANTY; without even the implied warranty of
+#     MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#     GNU General Public License for more details.
+#
+#     You should have received a copy of the GNU General Public License
+#     along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+import unittest
+from datetime import date
+from unittest import mock
+
+from advisor.lib.migrations import migrate
+from advisor.lib.moex import MOEXUpdate
+
+from helpers import FakeFetcher, create_db
+
+
+def suite():
+    oSuite = unittest.TestSuite()
+    oSuite.addTest(TestMOEX('test_moex_get_collection'))
+    oSuite.addTest(TestMOEX('test_moex_update_data'))
+    oSuite.addTest(TestMOEX('test_moex_backfill_kbd'))
+
+    return oSuite
+
+
+class TestMOEX(unittest.TestCase):
+    def setUp(self):
+        """ Creates an in-memory database with the program structure. """
+        self.oConnector = create_db(bMigrate=False)
+        self.oConnector.insert_row('UpdateData', 'date, id',
+                                   (date.today().isoformat(), 1))
+
+    def tearDown(self):
+        del self.oConnector
+
+    def test_moex_get_collection(self):
+        """ Check that all pages of a collection are saved in order. """
+        lColumns = ['SECID', 'SHORTNAME', 'ISIN']
+
+        def answer(sURL, start=-1, limit=100, **dParams):
+            lData = [[f'S{i}', f'name {i}', f'RU{i:04}']
+                     for i in range(start, min(start + limit, 250))]
+            return {'securities': {'columns': lColumns, 'data': lData},
+                    'securities.cursor': {'columns': ['INDEX', 'TOTAL'],
+                                          'data': [[start, 250]]}}
+
+        self.oConnector.insert_row('BondsCollections',
+                                   'SECID, SHORTNAME, ISIN',
+                                   ('S0', 'old name', 'RU0000'))
+        oFetcher = FakeFetcher(answer)
+        oMOEX = MOEXUpdate(self.oConnector, oFetcher=oFetcher)
+        lProgress = []
+        with mock.patch('advisor.lib.moex.connect', answer):
+            oMOEX.get_collection(sCollectionName='stock_bonds_all',
+                                 fnProgress=lambda iDone, iTotal:
+                                 lProgress.append((iDone, iTotal)))
+
+        self.assertEqual([dParams['start'] for _, dParams
+                          in oFetcher.lRequests], [100, 200])
+        self.assertEqual(lProgress, [(1, 3), (2, 3), (3, 3)])
+        self.assertEqual(self.oConnector.sql_count('BondsCollections'), 250)
+        lRow = self.oConnector.sql_get_values('BondsCollections',
+                                              'SHORTNAME', 'ISIN',
+                                              ('RU0000',))
+        self.assertEqual(lRow[0][0], 'name 0')
+
+    def test_moex_update_data(self):
+        """ Check that the delta sync counts and applies every category. """
+        lColumns = ['SECID', 'SHORTNAME', 'PREVPRICE']
+        self.oConnector.insert_row('BondsSecurities', ', '.join(lColumns),
+                                   ('A', 'bond A', 99.5))
+        self.oConnector.insert_row('BondsSecurities', ', '.join(lColumns),
+                                   ('B', 'bond B', 100.0))
+        jJSON = {'securities': {'columns': lColumns,
+                                'data': [['A', 'bond A', 99.5],
+                                         ['B', 'bond B', 101],
+                                         ['C', 'bond C', 98],
+                                         ['C', 'bond C', 97]]}}
+        oMOEX = MOEXUpdate(self.oConnector, oFetcher=FakeFetcher())
+        dCounts = oMOEX.update_data(jJSON, 'securities', 'BondsSecurities')
+
+        self.assertEqual(dCounts,
+                         {'inserted': 1, 'changed': 1, 'unchanged': 1})
+        self.assertEqual(oMOEX.setChanged, {'B', 'C'})
+        lRows = self.oConnector.sql_get_all('BondsSecurities',
+                                            'SECID, PREVPRICE')
+        self.assertEqual(sorted(lRows),
+                         [('A', 99.5), ('B', 101.0), ('C', 97.0)])
+
+        dCounts = oMOEX.update_data(jJSON, 'securities', 'BondsSecurities')
+        self.assertEqual(dCounts,
+                         {'inserted': 0, 'changed': 0, 'unchanged': 3})
+
+    def test_moex_backfill_kbd(self):
+        """ Check that only missing days are requested and a weekend
+        answer with the curve of Friday is stored once. """
+        migrate(self.oConnector)
+        lColumns = ['tradedate', 'tradetime', 'B1', 'B2', 'B3', 'T1', 'G1',
+                    'G2', 'G3', 'G4', 'G5', 'G6', 'G7', 'G8', 'G9']
+        self.oConnector.insert_row(
+            'YieldCurve', ', '.join(lColumns),
+            ['2024-01-09', '18:00:00', 800, -100, -200, 2] + [0.0] * 9)
+
+        def answer(sURL, only=None, parameter=None, values=''):
+            sDate = '2024-01-10' if values == '2024-01-11' else values
+            return {'params': {'columns': lColumns, 'data': [
+                [sDate, '18:00:00', 810, -100, -200, 2] + [0.0] * 9]}}
+
+        oFetcher = FakeFetcher(answer)
+        oMOEX = MOEXUpdate(self.oConnector, oFetcher=oFetcher)
+        iRows = oMOEX.backfill_kbd('2024-01-08', '2024-01-14')
+
+        self.assertEqual([dParams['values'] for _, dParams
+                          in oFetcher.lRequests],
+                         ['2024-01-08', '2024-01-10', '2024-01-11',
+                          '2024-01-12'])
+        self.assertEqual(iRows, 3)
+        lRows = self.oConnector.execute_query(
+            'SELECT tradedate, B1 FROM YieldCurve ORDER BY tradedate;'
+        ).fetchall()
+        self.assertEqual(lRows, [('2024-01-08', 810), ('2024-01-09', 800),
+                                 ('2024-01-10', 810), ('2024-01-12', 810)])
+
+
+if __name__ == '__main__':
+    runner = unittest.TextTestRunner()
+    runner.run(suite())
@@ -0,0 +1,113 @@
+#     This code is a part of program Advisor
+#     Copyright (C) 2022 contributors Advisor
+#     The full list is available at the link
+#     https://github.com/tagezi/advisor/blob/master/contributors.txt
+#
+#     This program is free software: you can redistribute it and/or modify
+#     it under the terms of the GNU General Public License as published by
+#     the Free Software Foundation, either version 3 of the License, or
+#     (at your option) any later version.
+#
+#     This program is distributed in the hope that it will be useful,
+#     but WITHOUT ANY WARRANTY; without even the implied warranty of
+#     MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#     GNU General Public License for more details.
+#
+#     You should have received a copy of the GNU General Public License
+#     along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+import unittest
+
+import numpy as np
+
+from advisor.lib.nss_curve import KBD_TENORS, NSSCurve, fit_kbd_history, \
+    fit_prices, fit_rates
+from advisor.lib.zero_curve import CurveHistory
+
+from helpers import create_db
+
+
+def suite():
+    oSuite = unittest.TestSuite()
+    oSuite.addTest(TestNSSCurve('test_nss_curve_fit_rates'))
+    oSuite.addTest(TestNSSCurve('test_nss_curve_fit_prices'))
+    oSuite.addTest(TestNSSCurve('test_nss_curve_kbd_history'))
+
+    return oSuite
+
+
+def get_bonds(lMaturities):
+    """ Полугодовые купоны 45 и номинал 1000 на сроки погашения. """
+    iFlows = max(int(fMaturity * 2) for fMaturity in lMaturities)
+    aTimes = np.zeros((len(lMaturities), iFlows))
+    aAmounts = np.zeros_like(aTimes)
+    for iBond, fMaturity in enumerate(lMaturities):
+        iCount = int(fMaturity * 2)
+        aTimes[iBond, :iCount] = fMaturity - 0.5 * np.arange(iCount)[::-1]
+        aAmounts[iBond, :iCount] = 45
+        aAmounts[iBond, iCount - 1] += 1000
+    return aTimes, aAmounts
+
+
+class TestNSSCurve(unittest.TestCase):
+    def setUp(self):
+        self.oCurve = NSSCurve([0.14, -0.03, 0.02, -0.01], 1.2, 6.0)
+
+    def test_nss_curve_fit_rates(self):
+        """ Check that the curve is found by its rates and that a warm
+        start gives the same fit. """
+        aT = np.array([0.25, 0.5, 1, 2, 3, 5, 7, 10, 15])
+        oFit = fit_rates(aT, self.oCurve.spot(aT))
+        self.assertLess(oFit.fRMSE, 0.5)
+        aGrid = np.linspace(0.25, 15, 50)
+        np.testing.assert_allclose(oFit.spot(aGrid),
+                                   self.oCurve.spot(aGrid), atol=1e-4)
+
+        oWarm = fit_rates(aT, self.oCurve.spot(aT) + 0.001, oStart=oFit)
+        self.assertLess(oWarm.fRMSE, 0.5)
+        self.assertAlmostEqual(oWarm.aBetas[0] - oFit.aBetas[0], 0.001,
+                               places=4)
+
+    def test_nss_curve_fit_prices(self):
+        """ Check that the curve is found by prices and that an expensive
+        bond has a negative rich/cheap value. """
+        aTimes, aAmounts = get_bonds([0.7, 1.5, 2.5, 3.5, 5, 6.5, 8, 10,
+                                      12, 14])
+        aPrice = (aAmounts * self.oCurve.discount(aTimes)).sum(axis=1)
+        oFit, aModel, aDuration = fit_prices(aPrice, aTimes, aAmounts)
+        self.assertLess(oFit.fRMSE, 0.1)
+        np.testing.assert_allclose(aModel, aPrice, rtol=1e-5)
+        self.assertTrue((aDuration > 0).all())
+
+        aPrice[4] *= 1.01
+        oRich, aModel, aDuration = fit_prices(aPrice, aTimes, aAmounts,
+                                              oStart=oFit)
+        aRichCheap = (aModel - aPrice) / (aPrice * aDuration) * 10000
+        self.assertEqual(aRichCheap.argmin(), 4)
+        self.assertLess(aRichCheap[4], -10)
+
+    def test_nss_curve_kbd_history(self):
+        """ Check that the KBD history is fitted in two processes and
+        stored by date. """
+        oConnector = create_db()
+
+        lDates = ['2024-01-09', '2024-01-10', '2024-01-11', '2024-01-12']
+        oConnector.insert_many(
+            'YieldCurve', 'tradedate, B1, B2, B3, T1, G1, G2, G3, G4, G5, '
+            'G6, G7, G8, G9',
+            [(sDate, 1100 + 10 * iDay, -200, 150, 1.5, 20, -10, 5, 0, 0, 0,
+              0, 0, 0) for iDay, sDate in enumerate(lDates)])
+
+        oParams = fit_kbd_history(oConnector, iWorkers=2)
+        self.assertEqual(oParams.index.tolist(), lDates)
+        self.assertTrue((oParams['RMSE'] < 20).all())
+
+        oHistory = CurveHistory.from_db(oConnector)
+        oCurve = NSSCurve.from_db(oConnector, 'KBD', '2024-01-11')
+        np.testing.assert_allclose(oCurve.spot(KBD_TENORS),
+                                   oHistory.spot(KBD_TENORS)[2], atol=2e-3)
+        self.assertIsNone(NSSCurve.from_db(oConnector, 'OFZ'))
+
+
+if __name__ == '__main__':
+    unittest.TextTestRunner(verbosity=2).run(suite())
@@ -0,0 +1,109 @@
+#     This code is a part of program Advisor
+#     Copyright (C) 2022 contributors Advisor
+#     The full list is available at the link
+#     https://github.com/tagezi/advisor/blob/master/contributors.txt
+#
+#     This program is free software: you can redistribute it and/or modify
+#     it under the terms of the GNU General Public License as published by
+#     the Free Software Foundation, either version 3 of the License, or
+#     (at your option) any later version.
+#
+#     This program is distributed in the hope that it will be useful,
+#     but WITHOUT ANY WARRANTY; without even the implied warranty of
+#     MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#     GNU General Public License for more details.
+#
+#     You should have received a copy of the GNU General Public License
+#     along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+import unittest
+
+import numpy as np
+import pandas as pd
+
+from advisor.lib.math import black_scholes
+from advisor.lib.options import bs_price, monte_carlo, norm_cdf, option_grid
+
+
+def suite():
+    oSuite = unittest.TestSuite()
+    oSuite.addTest(TestOptions('test_options_bs_price'))
+    oSuite.addTest(TestOptions('test_options_monte_carlo'))
+    oSuite.addTest(TestOptions('test_options_monte_carlo_chunks'))
+    oSuite.addTest(TestOptions('test_options_monte_carlo_odd_chunk'))
+
+    return oSuite
+
+
+class TestOptions(unittest.TestCase):
+    def test_options_bs_price(self):
+        self.assertAlmostEqual(float(norm_cdf(0.0)), 0.5)
+        self.assertAlmostEqual(float(norm_cdf(1.96)), 0.9750021048517795)
+        self.assertAlmostEqual(float(bs_price(100, 105, 1.0, 0.05, 0.2)),
+                               8.021352235143176, places=9)
+
+        # паритет колл-пут: C - P = S - K * exp(-rT)
+        aStrike = np.array([80.0, 100.0, 120.0])
+        aCall = bs_price(100, aStrike, 0.5, 0.05, 0.3)
+        aPut = bs_price(100, aStrike, 0.5, 0.05, 0.3, False)
+        np.testing.assert_allclose(aCall - aPut,
+                                   100 - aStrike * np.exp(-0.025))
+
+    def test_options_monte_carlo(self):
+        """ Check that prices of calls and puts agree with the formula
+        within their standard errors and that the antithetic paths and
+        the control variate reduce the error. """
+        oOptions = pd.concat([option_grid([90, 100, 110], [0.5, 2.0],
+                                          [0.2, 0.4]),
+                              option_grid([90, 110], [1.0], [0.3], False)],
+                             ignore_index=True)
+        oPrices = monte_carlo(oOptions, 100.0, 0.05, iPaths=40000,
+                              iChunk=7000)
+
+        self.assertEqual(len(oPrices), 14)
+        self.assertTrue((oPrices['STDERR'] > 0).all())
+        self.assertTrue(((oPrices['PRICE'] - oPrices['BS']).abs() <
+                         4 * oPrices['STDERR']).all())
+
+        oPlain = monte_carlo(oOptions, 100.0, 0.05, iPaths=40000,
+                             iChunk=7000, bAntithetic=False, bControl=False)
+        self.assertTrue(((oPlain['PRICE'] - oPlain['BS']).abs() <
+                         4 * oPlain['STDERR']).all())
+        self.assertTrue((oPrices['STDERR'] < oPlain['STDERR']).all())
+
+        self.assertAlmostEqual(black_scholes(), 8.021352235143176, delta=0.05)
+
+    def test_options_monte_carlo_chunks(self):
+        """ Check that the result does not depend on the processes and
+        that blocks of paths are independent streams. """
+        oOptions = option_grid([95, 105], [1.0], [0.25])
+        oOne = monte_carlo(oOptions, 100.0, 0.03, iPaths=30000, iChunk=10000)
+        oPool = monte_carlo(oOptions, 100.0, 0.03, iPaths=30000,
+                            iChunk=10000, iWorkers=2)
+        pd.testing.assert_frame_equal(oOne, oPool)
+
+        oWhole = monte_carlo(oOptions, 100.0, 0.03, iPaths=30000,
+                             iChunk=30000)
+        self.assertFalse(np.allclose(oOne['PRICE'], oWhole['PRICE'],
+                                     rtol=0, atol=1e-12))
+        np.testing.assert_allclose(oOne['PRICE'], oWhole['PRICE'],
+                                   atol=float(5 * oOne['STDERR'].max()))
+
+    def test_options_monte_carlo_odd_chunk(self):
+        """ Check that the last block of one antithetic path does not make
+        prices NaN. """
+        oOptions = option_grid([100], [1.0], [0.2])
+        oPrices = monte_carlo(oOptions, 100.0, 0.05, iPaths=20001,
+                              iChunk=20000)
+        self.assertTrue(np.isfinite(oPrices[['PRICE', 'STDERR']]).all(
+            axis=None))
+        self.assertLess(abs(oPrices.loc[0, 'PRICE'] - oPrices.loc[0, 'BS']),
+                        4 * oPrices.loc[0, 'STDERR'])
+
+        oPrices = monte_carlo(oOptions, 100.0, 0.05, iPaths=5, iChunk=3)
+        self.assertTrue(np.isfinite(oPrices[['PRICE', 'STDERR']]).all(
+            axis=None))
+
+
+if __name__ == '__main__':
+    unittest.TextTestRunner(verbosity=2).run(suite())
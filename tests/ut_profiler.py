@@ -0,0 +1,98 @@
+#     This code is a part of program Advisor
+#     Copyright (C) 2022 contributors Advisor
+#     The full list is available at the link
+#     https://github.com/tagezi/advisor/blob/master/contributors.txt
+#
+#     This program is free software: you can redistribute it and/or modify
+#     it under the terms of the GNU General Public License as published by
+#     the Free Software Foundation, either version 3 of the License, or
+#     (at your option) any later version.
+#
+#     This program is distributed in the hope that it will be useful,
+#     but WITHOUT ANY WARRANTY; without even the implied warranty of
+#     MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#     GNU General Public License for more details.
+#
+#     You should have received a copy of the GNU General Public License
+#     along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+import json
+import logging
+import tempfile
+import unittest
+from os.path import join
+
+from advisor.lib.profiler import get_template
+from advisor.lib.sql import SQL
+
+
+def suite():
+    oSuite = unittest.TestSuite()
+    oSuite.addTest(TestProfiler('test_profiler_get_template'))
+    oSuite.addTest(TestProfiler('test_profiler_execute_query'))
+    oSuite.addTest(TestProfiler('test_profiler_dump'))
+
+    return oSuite
+
+
+class TestProfiler(unittest.TestCase):
+    def setUp(self):
+        """ Creates an in-memory database with an indexed table. """
+        self.oConnector = SQL(':memory:')
+        self.oConnector.execute_script(
+            'CREATE TABLE Items (code TEXT UNIQUE, value REAL);')
+        self.oConnector.insert_many('Items', 'code, value',
+                                    [(str(i), i) for i in range(100)])
+        logging.disable(logging.CRITICAL)
+
+    def tearDown(self):
+        del self.oConnector
+
+    def test_profiler_get_template(self):
+        self.assertEqual(
+            get_template("SELECT * FROM T1  WHERE a='x' AND b>10.5 "
+                         "AND c IN (?, ?, ?) AND d like \"%ОФЗ%\""),
+            'SELECT * FROM T1 WHERE a=? AND b>? AND c IN (?...) AND d like ?')
+
+    def test_profiler_execute_query(self):
+        """ Check counts, rows, plans and the cursor with fetched rows. """
+        oProfiler = self.oConnector.start_profiling()
+        for i in range(3):
+            oCursor = self.oConnector.execute_query(
+                f'SELECT value FROM Items WHERE code="{i}";')
+            self.assertEqual(oCursor.fetchone(), (i,))
+            self.assertIsNone(oCursor.fetchone())
+        lRows = self.oConnector.execute_query(
+            'SELECT * FROM Items WHERE value>?;', (89,)).fetchall()
+        self.assertEqual(len(lRows), 10)
+
+        dSummary = {d['template']: d for d in oProfiler.summary()}
+        dLookup = dSummary['SELECT value FROM Items WHERE code=?;']
+        self.assertEqual((dLookup['count'], dLookup['rows']), (3, 3))
+        self.assertFalse(dLookup['scan'])
+        dScan = dSummary['SELECT * FROM Items WHERE value>?;']
+        self.assertEqual(dScan['rows'], 10)
+        self.assertTrue(dScan['scan'])
+
+        self.assertIs(self.oConnector.stop_profiling(), oProfiler)
+        oCursor = self.oConnector.execute_query('SELECT 1;')
+        self.assertEqual(len(oProfiler.summary()), 2)
+        self.assertEqual(oCursor.fetchall(), [(1,)])
+
+    def test_profiler_dump(self):
+        oProfiler = self.oConnector.start_profiling(bExplain=False)
+        self.oConnector.update_many('Items', 'value', 'code',
+                                    [(1.5, '1'), (2.5, '2')])
+        self.oConnector.read_sql('SELECT * FROM Items;')
+        with tempfile.TemporaryDirectory() as sDir:
+            sFile = join(sDir, 'profile.json')
+            oProfiler.dump(sFile)
+            with open(sFile) as fFile:
+                lSummary = json.load(fFile)
+
+        self.assertEqual(sorted(d['rows'] for d in lSummary), [2, 100])
+        self.assertTrue(all(d['plan'] is None for d in lSummary))
+
+
+if __name__ == '__main__':
+    unittest.TextTestRunner(verbosity=2).run(suite())
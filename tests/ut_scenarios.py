@@ -0,0 +1,125 @@
+#     This code is a part of program Advisor
+#     Copyright (C) 2022 contributors Advisor
+#     The full list is available at the link
+#     https://github.com/tagezi/advisor/blob/master/contributors.txt
+#
+#     This program is free software: you can redistribute it and/or modify
+#     it under the terms of the GNU General Public License as published by
+#     the Free Software Foundation, either version 3 of the License, or
+#     (at your option) any later version.
+#
+#     This program is distributed in the hope that it will be useful,
+#     but WITHOUT ANY WARRANTY; without even the implied warranty of
+#     MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#     GNU General Public License for more details.
+#
+#     You should have received a copy of the GNU General Public License
+#     along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+import unittest
+
+import numpy as np
+import pandas as pd
+
+from advisor.lib.bond_analysis import BondAnalysis
+from advisor.lib.scenarios import default_scenarios, portfolio_scenarios, \
+    scenario_grid, scenario_values, shift_weights
+
+from helpers import FakeFetcher, create_db, get_date
+
+
+def suite():
+    oSuite = unittest.TestSuite()
+    oSuite.addTest(TestScenarios('test_scenarios_scenario_values'))
+    oSuite.addTest(TestScenarios('test_scenarios_portfolio_scenarios'))
+
+    return oSuite
+
+
+class TestScenarios(unittest.TestCase):
+    def test_scenarios_scenario_values(self):
+        """ Check the moves of the curve and that blocks of scenarios give
+        the same values as one block. """
+        aTwist, aButterfly = shift_weights(np.array([0.0, 5.0, 10.0, 20.0]))
+        np.testing.assert_allclose(aTwist, [-1, 0, 1, 1])
+        np.testing.assert_allclose(aButterfly, [-1, 1, -1, -1])
+
+        oScenarios = scenario_grid([-100, 0, 100], [-50, 50], [0, 25])
+        self.assertEqual(len(oScenarios), 12)
+        self.assertEqual(oScenarios.index[0], 'S-100 T-50 B+0')
+
+        aTimes = np.array([[1.0, 2.0, 0.0], [0.5, 5.0, 10.0]])
+        aPV = np.array([[50.0, 950.0, 0.0], [30.0, 30.0, 900.0]])
+        aValues = scenario_values(aPV, aTimes, oScenarios)
+        np.testing.assert_allclose(
+            scenario_values(aPV, aTimes, oScenarios, iBlock=1), aValues)
+
+        # второй сценарий: -100 б.п., поворот -50, бабочка +25
+        aRate = (-100 - 50 * np.clip(aTimes / 5 - 1, -1, 1) +
+                 25 * np.clip(1 - 2 * np.abs(aTimes - 5) / 5, -1, 1)) / 10000
+        np.testing.assert_allclose(
+            aValues[1], (aPV * np.exp(-aRate * aTimes)).sum(axis=1))
+
+    def test_scenarios_portfolio_scenarios(self):
+        """ Over a flat curve the zero scenario gives no result, a zero
+        coupon bond follows exp(-dr * t) and the portfolio sums its
+        positions. """
+        oConnector = create_db()
+        oAnalysis = BondAnalysis(oConnector)
+        oFetcher = FakeFetcher()
+        oAnalysis.oQuery.oFetcher = oFetcher
+        oPortfolio = pd.DataFrame([('RU1', 2), ('RU2', 3), ('SBER', 10)],
+                                  columns=['Код актива', 'Количество'])
+
+        oTable, oBonds = portfolio_scenarios(oAnalysis, oPortfolio)
+        self.assertTrue(oTable['PNL'].isna().all())
+        self.assertTrue(oBonds.empty)
+
+        lBonds = [('RU1', 95.0, 730), ('RU2', 80.0, 1820),
+                  ('RU3', 100.0, 365)]
+        oConnector.insert_many(
+            'BondsSecurities', 'SECID, PREVPRICE, ACCRUEDINT',
+            [(sSECID, fPrice, 0.0) for sSECID, fPrice, _ in lBonds])
+        oConnector.insert_many('BondDescription', 'SECID, FACEVALUE',
+                               [(tBond[0], 1000) for tBond in lBonds])
+        lCoupons = [('RU1', get_date(iDay), 1000, 50, 10)
+                    for iDay in range(182, 731, 182)]
+        oConnector.insert_many('BoundCoupons', 'SECID, coupon_date, '
+                               'face_value, coupon_value, valueprc', lCoupons)
+        oConnector.insert_many('BoundAmortizations', 'SECID, amort_date, '
+                               'face_value, valueprc, amort_value',
+                               [(sSECID, get_date(iDays), 1000, 100, 1000)
+                                for sSECID, _, iDays in lBonds])
+        # ровная кривая: 1000 б.п. на любом сроке
+        oConnector.insert_many(
+            'YieldCurve', 'tradedate, B1, B2, B3, T1, G1, G2, G3, G4, G5, '
+            'G6, G7, G8, G9', [(get_date(0), 1000, 0, 0, 1) + (0,) * 9])
+
+        oScenarios = pd.concat([scenario_grid([-100, 0, 100]),
+                                default_scenarios()])
+        oTable, oBonds = portfolio_scenarios(oAnalysis, oPortfolio,
+                                             oScenarios)
+
+        # купоны ищутся на бирже только у RU2 из портфеля
+        self.assertEqual(len(oFetcher.lBatches), 1)
+        self.assertEqual(len(oFetcher.lBatches[0]), 1)
+        self.assertEqual(oBonds.index.tolist(), ['RU1', 'RU2', 'RU3'])
+        self.assertEqual(oTable.index.tolist(), oScenarios.index.tolist())
+        np.testing.assert_allclose(oBonds['S+0 T+0 B+0'], 0, atol=1e-6)
+        fYears = 1820 / 364
+        self.assertAlmostEqual(oBonds.loc['RU2', 'S+100 T+0 B+0'],
+                               800 * np.expm1(-0.01 * fYears), places=6)
+        self.assertLess(oTable.loc['Сдвиг +100', 'PNL'], 0)
+        self.assertGreater(oTable.loc['Сдвиг -100', 'PNL'], 0)
+        self.assertAlmostEqual(
+            oTable.loc['S+100 T+0 B+0', 'PNL'],
+            2 * oBonds.loc['RU1', 'S+100 T+0 B+0'] +
+            3 * oBonds.loc['RU2', 'S+100 T+0 B+0'], places=6)
+        self.assertAlmostEqual(
+            oTable.loc['S+100 T+0 B+0', 'PNL_PERCENT'],
+            oTable.loc['S+100 T+0 B+0', 'PNL'] / (2 * 950 + 3 * 800) * 100,
+            places=9)
+
+
+if __name__ == '__main__':
+    unittest.TextTestRunner(verbosity=2).run(suite())
@@ -0,0 +1,133 @@
+#     This code is a part of program Advisor
+#     Copyright (C) 2022 contributors Advisor
+#     The full list is available at the link
+#     https://github.com/tagezi/advisor/blob/master/contributors.txt
+#
+#     This program is free software: you can redistribute it and/or modify
+#     it under the terms of the GNU General Public License as published by
+#     the Free Software Foundation, either version 3 of the License, or
+#     (at your option) any later version.
+#
+#     This program is distributed in the hope that it will be useful,
+#     but WITHOUT ANY WARRANTY; without even the implied warranty of
+#     MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#     GNU General Public License for more details.
+#
+#     You should have received a copy of the GNU General Public License
+#     along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+import unittest
+from unittest import mock
+
+import numpy as np
+
+from advisor.lib.bond_analysis import BondAnalysis, bond_analysis_without
+from advisor.lib.spreads import universe_spreads
+
+from helpers import create_db, get_date
+
+
+def suite():
+    oSuite = unittest.TestSuite()
+    oSuite.addTest(TestSpreads('test_spreads_universe_spreads'))
+    oSuite.addTest(TestSpreads('test_spreads_bond_table'))
+
+    return oSuite
+
+
+class TestSpreads(unittest.TestCase):
+    def test_spreads_universe_spreads(self):
+        """ Over a flat curve of 10 % the spreads follow the yield; bonds
+        without a price or without payments in the base are skipped or
+        left empty; cashflows are read once for the yield and spreads. """
+        oConnector = create_db()
+
+        oAnalysis = BondAnalysis(oConnector)
+        self.assertTrue(universe_spreads(oAnalysis).empty)
+
+        lBonds = [('RU1', 95.0, 730), ('RU2', 105.0, 1460),
+                  ('RU3', 100.0, 365), ('RU4', None, 365)]
+        oConnector.insert_many(
+            'BondsSecurities', 'SECID, PREVPRICE, ACCRUEDINT',
+            [(sSECID, fPrice, 0.0) for sSECID, fPrice, _ in lBonds])
+        oConnector.insert_many('BondDescription', 'SECID, FACEVALUE',
+                               [(tBond[0], 1000) for tBond in lBonds])
+        lCoupons, lAmort = [], []
+        for sSECID, _, iDays in lBonds[:2]:
+            lCoupons.extend((sSECID, get_date(iDay), 1000, 50, 10)
+                            for iDay in range(182, iDays + 1, 182))
+            lAmort.append((sSECID, get_date(iDays), 1000, 100, 1000))
+        oConnector.insert_many('BoundCoupons', 'SECID, coupon_date, '
+                               'face_value, coupon_value, valueprc', lCoupons)
+        oConnector.insert_many('BoundAmortizations', 'SECID, amort_date, '
+                               'face_value, valueprc, amort_value', lAmort)
+        # ровная кривая: 1000 б.п. на любом сроке
+        oConnector.insert_many(
+            'YieldCurve', 'tradedate, B1, B2, B3, T1, G1, G2, G3, G4, G5, '
+            'G6, G7, G8, G9', [(get_date(0), 1000, 0, 0, 1) + (0,) * 9])
+
+        with mock.patch.object(oConnector, 'get_cashflows',
+                               wraps=oConnector.get_cashflows) as oRead:
+            oSpreads = universe_spreads(oAnalysis)
+        # выплаты читаются один раз: купоны и амортизации
+        self.assertEqual(oRead.call_count, 2)
+
+        self.assertEqual(oSpreads.index.tolist(), ['RU1', 'RU2', 'RU3'])
+        self.assertTrue(oSpreads.loc['RU3'].isna().all())
+        aYield = oSpreads['YIELD'].iloc[:2].to_numpy() / 100
+        np.testing.assert_allclose(oSpreads['ZSPREAD'].iloc[:2],
+                                   (np.log1p(aYield) - 0.1) * 10000,
+                                   atol=1e-6)
+        np.testing.assert_allclose(
+            oSpreads['GSPREAD'].iloc[:2],
+            (aYield - np.expm1(0.1)) * 10000, atol=1e-6)
+        self.assertGreater(oSpreads.loc['RU1', 'ZSPREAD'], 0)
+        self.assertLess(oSpreads.loc['RU2', 'ZSPREAD'], 0)
+
+    def test_spreads_bond_table(self):
+        """ Check that a bond without a root of the Z-spread stays in the
+        table of bonds with empty spreads and that risk measures and
+        spreads share one load of cashflows. """
+        oConnector = create_db()
+
+        # RU2 стоит 0,01 % номинала: ни доходность, ни Z-спред не находятся
+        lBonds = [('RU1', 95.0, 730), ('RU2', 0.01, 1100)]
+        oConnector.insert_many(
+            'BondScreen', 'SECID, ISIN, SHORTNAME, MATDATE, PREVPRICE, '
+            'YIELDATPREVWAPRICE, EFFECTIVEYIELD, COUPONPERCENT, '
+            'COUPONVALUE, ACCRUEDINT, NEXTCOUPON, COUPONPERIOD, '
+            'INITIALFACEVALUE, FACEVALUE, FACEUNIT, LISTLEVEL, EMITTER, '
+            'IS_OFZ, IS_SCREEN, HAS_OOO',
+            [(sSECID, sSECID, sSECID, get_date(iDays), fPrice, 15.0, 15.0,
+              10.0, 50.0, 0.0, get_date(182), 182, 1000, 1000, 'SUR', 2,
+              'ПАО', 0, 1, 0) for sSECID, fPrice, iDays in lBonds])
+        lCoupons, lAmort = [], []
+        for sSECID, _, iDays in lBonds:
+            lCoupons.extend((sSECID, get_date(iDay), 1000, 50, 10)
+                            for iDay in range(182, iDays + 1, 182))
+            lAmort.append((sSECID, get_date(iDays), 1000, 100, 1000))
+        oConnector.insert_many('BoundCoupons', 'SECID, coupon_date, '
+                               'face_value, coupon_value, valueprc', lCoupons)
+        oConnector.insert_many('BoundAmortizations', 'SECID, amort_date, '
+                               'face_value, valueprc, amort_value', lAmort)
+        oConnector.insert_many(
+            'YieldCurve', 'tradedate, B1, B2, B3, T1, G1, G2, G3, G4, G5, '
+            'G6, G7, G8, G9', [(get_date(0), 1000, 0, 0, 1) + (0,) * 9])
+
+        with mock.patch.object(oConnector, 'get_cashflows',
+                               wraps=oConnector.get_cashflows) as oRead:
+            oTable = bond_analysis_without(oConnector, iMaxPeriod=182,
+                                           bInfl=False, bRisk=True,
+                                           bSpreads=True)
+        # риск и спреды считаются по одной загрузке купонов и амортизаций
+        self.assertEqual(oRead.call_count, 2)
+
+        self.assertEqual(sorted(oTable['ID']), ['RU1', 'RU2'])
+        oTable = oTable.set_index('ID')
+        self.assertTrue(oTable.loc['RU2', ['Z-спред, б.п.',
+                                           'G-спред, б.п.']].isna().all())
+        self.assertGreater(oTable.loc['RU1', 'Z-спред, б.п.'], 0)
+
+
+if __name__ == '__main__':
+    unittest.TextTestRunner(verbosity=2).run(suite())
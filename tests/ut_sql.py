@@ -16,12 +16,17 @@
 #     You should have received a copy of the GNU General Public License
 #     along with this program.  If not, see <https://www.gnu.org/licenses/>.
 
+import tempfile
 import unittest
+from os.path import join
 from unittest import TestCase
 
+from advisor.lib.migrations import migrate
 from advisor.lib.sql import *
 from advisor.lib.str import str_get_file_patch
 
+from helpers import config_profiles, create_db, load_structure
+
 
 def type_connector():
     """ Creates temporal object of sqlite3.Connection and return its type.
@@ -49,6 +54,18 @@ def suite():
     oSuite.addTest(TestSQLite('test_sql_get_values'))
     oSuite.addTest(TestSQLite('test_sql_check_value'))
     oSuite.addTest(TestSQLite('test_sql_get_id'))
+    oSuite.addTest(TestSQLBulk('test_sql_insert_many'))
+    oSuite.addTest(TestSQLBulk('test_sql_upsert_many'))
+    oSuite.addTest(TestSQLBulk('test_sql_update_delete_many'))
+    oSuite.addTest(TestSQLBulk('test_sql_transaction'))
+    oSuite.addTest(TestSQLBulk('test_sql_transaction_bulk_error'))
+    oSuite.addTest(TestSQLProfiles('test_sql_ingest_profile'))
+    oSuite.addTest(TestSQLProfiles('test_sql_analysis_profile'))
+    oSuite.addTest(TestSQLProfiles('test_sql_analysis_profile_lists'))
+    oSuite.addTest(TestSQLProfiles('test_sql_read_only_missing'))
+    oSuite.addTest(TestSQLScreen('test_sql_get_bonds_by_value'))
+    oSuite.addTest(TestSQLScreen('test_sql_refresh_bond_screen'))
+    oSuite.addTest(TestSQLScreen('test_sql_get_period_list'))
 
     return oSuite
 
@@ -284,6 +301,234 @@ class TestSQLite(TestCase):
                                      oValue[1])
 
 
+class TestSQLBulk(TestCase):
+    def setUp(self):
+        """ Creates an in-memory database with one table for bulk methods. """
+        self.oConnector = SQL(':memory:')
+        self.oConnector.execute_script(
+            'CREATE TABLE Items (code TEXT UNIQUE, value REAL);')
+        logging.disable(logging.CRITICAL)
+
+    def tearDown(self):
+        del self.oConnector
+
+    def test_sql_insert_many(self):
+        iRows = self.oConnector.insert_many('Items', 'code, value',
+                                            [('A', 1.0), ('B', 2.0)])
+        self.assertEqual(iRows, 2)
+
+        oFrame = pd.DataFrame({'value': [3.0, None], 'code': ['C', 'D']})
+        self.assertEqual(self.oConnector.insert_many('Items', '', oFrame), 2)
+        self.assertEqual(self.oConnector.sql_get_all('Items'),
+                         [('A', 1.0), ('B', 2.0), ('C', 3.0), ('D', None)])
+
+        # the unique key is broken, nothing is written
+        self.assertFalse(self.oConnector.insert_many(
+            'Items', 'code, value', [('E', 5.0), ('A', 6.0)]))
+        self.assertEqual(self.oConnector.sql_count('Items'), 4)
+
+    def test_sql_upsert_many(self):
+        self.oConnector.insert_many('Items', 'code, value', [('A', 1.0)])
+        iRows = self.oConnector.upsert_many('Items', 'code, value',
+                                            [('A', 10.0), ('B', 2.0)],
+                                            'code')
+        self.assertEqual(iRows, 2)
+        self.assertEqual(self.oConnector.sql_get_all('Items'),
+                         [('A', 10.0), ('B', 2.0)])
+
+    def test_sql_update_delete_many(self):
+        self.oConnector.insert_many('Items', 'code, value',
+                                    [('A', 1.0), ('B', 2.0), ('C', 3.0)])
+        self.assertTrue(self.oConnector.update_many(
+            'Items', 'value', 'code', [(10.0, 'A'), (30.0, 'C')]))
+        self.assertTrue(self.oConnector.delete_many('Items', 'code',
+                                                    [('B',)]))
+        self.assertEqual(self.oConnector.sql_get_all('Items'),
+                         [('A', 10.0), ('C', 30.0)])
+
+    def test_sql_transaction(self):
+        with self.oConnector.transaction():
+            self.oConnector.insert_row('Items', 'code, value', ('A', 1.0))
+            with self.oConnector.transaction():
+                self.oConnector.insert_row('Items', 'code, value',
+                                           ('B', 2.0))
+            self.assertTrue(self.oConnector.oConnector.in_transaction)
+        self.assertFalse(self.oConnector.oConnector.in_transaction)
+
+        with self.assertRaises(ValueError):
+            with self.oConnector.transaction():
+                self.oConnector.insert_row('Items', 'code, value',
+                                           ('C', 3.0))
+                raise ValueError
+        self.assertEqual(self.oConnector.sql_count('Items'), 2)
+
+    def test_sql_transaction_bulk_error(self):
+        """ Check that a failed bulk call rolls back the whole block. """
+        self.oConnector.insert_many('Items', 'code, value', [('A', 1.0)])
+        with self.assertRaises(DatabaseError):
+            with self.oConnector.transaction():
+                self.oConnector.delete_many('Items', 'code', [('A',)])
+                self.oConnector.insert_many('Items', 'code, value',
+                                            [('B', 2.0), ('B', 3.0)])
+        self.assertFalse(self.oConnector.oConnector.in_transaction)
+        self.assertEqual(self.oConnector.sql_get_all('Items'), [('A', 1.0)])
+
+
+class TestSQLProfiles(TestCase):
+    def setUp(self):
+        """ Creates a database file with one table. """
+        self.oDir = tempfile.TemporaryDirectory()
+        self.sFile = join(self.oDir.name, 'test.db')
+        self.oConnector = SQL(self.sFile, {'journal_mode': 'WAL',
+                                           'synchronous': 'NORMAL',
+                                           'cache_size': -65536,
+                                           'wal_autocheckpoint': 10000})
+        self.oConnector.execute_script(
+            'CREATE TABLE Items (code TEXT UNIQUE, value REAL);')
+        self.oConnector.insert_many('Items', 'code, value',
+                                    [(str(i), i) for i in range(1000)])
+        logging.disable(logging.CRITICAL)
+
+    def tearDown(self):
+        del self.oConnector
+        self.oDir.cleanup()
+
+    def test_sql_ingest_profile(self):
+        dPragmas = self.oConnector.pragmas()
+        self.assertEqual(dPragmas['journal_mode'], 'wal')
+        self.assertEqual(dPragmas['synchronous'], 1)
+        self.assertEqual(dPragmas['cache_size'], -65536)
+        self.assertEqual(dPragmas['wal_autocheckpoint'], 10000)
+        self.assertEqual(self.oConnector.checkpoint()[0], 0)
+        self.assertFalse(self.oConnector.apply_profile({'unknown': 1}))
+
+    def test_sql_analysis_profile(self):
+        oReader = SQL(self.sFile, {'read_only': True, 'mmap_size': 'auto',
+                                   'query_only': 1})
+        dPragmas = oReader.pragmas()
+        self.assertEqual(dPragmas['query_only'], 1)
+        self.assertEqual(dPragmas['mmap_size'], oReader.file_size())
+        self.assertEqual(oReader.sql_count('Items'), 1000)
+        self.assertFalse(oReader.insert_row('Items', 'code, value',
+                                            ('new', 1.0)))
+        del oReader
+
+    def test_sql_analysis_profile_lists(self):
+        """ Check that queries by lists of SECID work on the connection
+        with the analysis profile of config.ini. """
+        load_structure(self.oConnector)
+        self.oConnector.insert_many('BondsSecurities', 'SECID, PREVPRICE',
+                                    [('RU1', 99.0), ('RU2', 101.0)])
+        self.oConnector.insert_many('BondDescription', 'SECID, FACEVALUE',
+                                    [('RU1', 1000), ('RU2', 500)])
+        self.oConnector.insert_many(
+            'BoundCoupons', 'SECID, coupon_date, coupon_value',
+            [('RU1', '2030-01-01', 30.0), ('RU1', '2030-07-01', 30.0)])
+
+        oReader = SQL(self.sFile, config_profiles()['analysis'])
+        self.assertEqual(oReader.pragmas()['query_only'], 1)
+
+        self.assertEqual(oReader.count_cashflows('BoundCoupons',
+                                                 ['RU1', 'RU2', 'RU1']),
+                         ({'RU1': 2}, ['RU2']))
+        self.assertEqual(oReader.get_cashflows(
+            'BoundCoupons', 'coupon_date, coupon_value',
+            ['RU1'])['coupon_date'].tolist(), ['2030-01-01', '2030-07-01'])
+        self.assertEqual(oReader.get_bond_quotes(
+            ['RU2', 'RU1', 'SBER'])['FACEVALUE'].tolist(), [1000, 500])
+        self.assertRaises(DatabaseError, oReader.set_secid_list, ['RU1'])
+        del oReader
+
+    def test_sql_read_only_missing(self):
+        """ Check that a read-only connection to a missing file raises
+        instead of leaving the object without a connection. """
+        sMissing = join(self.oDir.name, 'missing.db')
+        with self.assertRaises(DatabaseError):
+            SQL(sMissing, {'read_only': True})
+
+
+class TestSQLScreen(TestCase):
+    def setUp(self):
+        """ Creates an in-memory database with the program structure and
+        three bonds: an OFZ and two corporate ones. """
+        self.oConnector = create_db(bMigrate=False)
+
+        # SECID, SHORTNAME, yield, maturity, coupon period
+        lBonds = [('SU1', 'ОФЗ 1', 12.0, '2030-01-01', 182),
+                  ('RU1', 'Корп 1', 15.0, '2029-01-01', 91),
+                  ('RU2', 'Корп 2', 40.0, '2027-01-01', 30)]
+        self.oConnector.insert_many(
+            'BondsSecurities',
+            'SECID, SHORTNAME, SECNAME, YIELDATPREVWAPRICE, MATDATE, '
+            'COUPONPERIOD, PREVPRICE, COUPONPERCENT, COUPONVALUE, BONDTYPE',
+            [(sSECID, sName, sName, fYield, sMatDate, iPeriod, 100, 10, 40,
+              'Фикс с известным купоном')
+             for sSECID, sName, fYield, sMatDate, iPeriod in lBonds])
+        self.oConnector.insert_many(
+            'BondDescription',
+            'SECID, ISQUALIFIEDINVESTORS, FACEUNIT, INITIALFACEVALUE, '
+            'FACEVALUE, EMITTER',
+            [(tBond[0], 0, 'SUR', 1000, 1000, 'ПАО') for tBond in lBonds])
+        self.oConnector.insert_many('BondsMarketData', 'SECID',
+                                    [(tBond[0],) for tBond in lBonds])
+        migrate(self.oConnector)
+
+    def tearDown(self):
+        del self.oConnector
+
+    def test_sql_get_bonds_by_value(self):
+        """ Check the filters and that the text of the query is the same
+        for all values. """
+        oProfiler = self.oConnector.start_profiling(bExplain=False)
+
+        oFrame = self.oConnector.get_bonds_by_value(pd, bOFZ=True,
+                                                    iMaxPeriod=182)
+        self.assertEqual(oFrame['SECID'].tolist(), ['SU1'])
+
+        oFrame = self.oConnector.get_bonds_by_value(pd, iMinPeriod=30,
+                                                    iMaxPeriod=182,
+                                                    sMatDate='2026-01-01')
+        self.assertEqual(oFrame['SECID'].tolist(), ['RU1', 'SU1'])
+
+        oFrame = self.oConnector.get_bonds_by_value(pd, iMinPeriod=1,
+                                                    iMaxPeriod=400,
+                                                    fMaxYield=None,
+                                                    sMatDate=None)
+        self.assertEqual(oFrame['SECID'].tolist(), ['RU2', 'RU1', 'SU1'])
+
+        self.assertEqual(len(oProfiler.summary()), 1)
+
+    def test_sql_refresh_bond_screen(self):
+        """ Check that only changed bonds are rewritten and the version of
+        the data is raised. """
+        iVersion = self.oConnector.get_data_version('BondScreen')[0]
+        self.oConnector.update('BondsSecurities', 'YIELDATPREVWAPRICE',
+                               'SECID', (16.0, 'RU1'))
+        self.oConnector.update('BondsSecurities', 'SHORTNAME',
+                               'SECID', ('Корп 2 новая', 'RU2'))
+        self.assertEqual(self.oConnector.refresh_bond_screen(['RU1']), 1)
+        self.assertEqual(self.oConnector.get_data_version('BondScreen')[0],
+                         iVersion + 1)
+        self.assertEqual(self.oConnector.refresh_bond_screen([]), 0)
+
+        dScreen = dict(self.oConnector.sql_get_all(
+            'BondScreen', 'SECID, YIELDATPREVWAPRICE'))
+        self.assertEqual(dScreen['RU1'], 16.0)
+        lNames = self.oConnector.sql_get_values('BondScreen', 'SHORTNAME',
+                                                'SECID', ('RU2',))
+        self.assertEqual(lNames, [('Корп 2',)])
+
+        self.assertEqual(self.oConnector.refresh_bond_screen(), 3)
+        lNames = self.oConnector.sql_get_values('BondScreen', 'SHORTNAME',
+                                                'SECID', ('RU2',))
+        self.assertEqual(lNames, [('Корп 2 новая',)])
+
+    def test_sql_get_period_list(self):
+        lPeriods = self.oConnector.get_period_list(
+            sMatDateStart='2026-01-01').fetchall()
+        self.assertEqual(lPeriods, [(30,), (91,), (182,)])
+
+
 if __name__ == '__main__':
     runner = unittest.TextTestRunner()
     runner.run(suite())
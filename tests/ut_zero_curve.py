@@ -0,0 +1,127 @@
+#     This code is a part of program Advisor
+#     Copyright (C) 2022 contributors Advisor
+#     The full list is available at the link
+#     https://github.com/tagezi/advisor/blob/master/contributors.txt
+#
+#     This program is free software: you can redistribute it and/or modify
+#     it under the terms of the GNU General Public License as published by
+#     the Free Software Foundation, either version 3 of the License, or
+#     (at your option) any later version.
+#
+#     This program is distributed in the hope that it will be useful,
+#     but WITHOUT ANY WARRANTY; without even the implied warranty of
+#     MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#     GNU General Public License for more details.
+#
+#     You should have received a copy of the GNU General Public License
+#     along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+import os
+import timeit
+import unittest
+
+import numpy as np
+import pandas as pd
+
+from advisor.lib.math import F_0_T_eff, P_0_T, get_KBD_in_year_precent
+from advisor.lib.zero_curve import CURVE_COLUMNS, CurveHistory, ZeroCurve
+
+# Замеры времени только по запросу: ADVISOR_BENCHMARK=1
+BENCHMARK = bool(os.environ.get('ADVISOR_BENCHMARK'))
+
+# id, tradedate, tradetime, beta0, beta1, beta2, tau, g1..g9
+ROW = (1, '2024-01-05', '18:40:00', 1130.4, -117.3, -385.7, 1.92,
+       -13.2, 71.4, -118.9, 62.2, -24.5, 8.7, -2.1, 0.4, 15.0)
+
+
+def suite():
+    oSuite = unittest.TestSuite()
+    oSuite.addTest(TestZeroCurve('test_zero_curve_spot'))
+    oSuite.addTest(TestZeroCurve('test_zero_curve_forward'))
+    oSuite.addTest(TestZeroCurve('test_zero_curve_history'))
+    oSuite.addTest(TestZeroCurve('test_zero_curve_history_benchmark'))
+
+    return oSuite
+
+
+class TestZeroCurve(unittest.TestCase):
+    def setUp(self):
+        self.oCurve = ZeroCurve.from_row(ROW)
+        self.tParams = ROW[3], ROW[4], ROW[5], ROW[6], ROW[7:]
+        self.aTenors = np.linspace(0.01, 17.5, 1500)
+
+    def test_zero_curve_spot(self):
+        """ The same values as math.GT, the ninth term is skipped. """
+        np.testing.assert_allclose(
+            self.oCurve.spot_percent(self.aTenors),
+            get_KBD_in_year_precent(self.aTenors, *self.tParams),
+            rtol=1e-12)
+        np.testing.assert_allclose(
+            self.oCurve.discount(self.aTenors),
+            P_0_T(*self.tParams, self.aTenors), rtol=1e-12)
+        self.assertEqual(np.shape(self.oCurve.spot(5.0)), ())
+        self.assertEqual(self.oCurve.spot(np.ones((2, 3))).shape, (2, 3))
+        oCurve = ZeroCurve.from_row(ROW[:-1] + (-1000.0,))
+        self.assertEqual(oCurve.spot_percent(8.0),
+                         self.oCurve.spot_percent(8.0))
+
+    def test_zero_curve_forward(self):
+        """ The analytic forward is the derivative of G(t) * t. """
+        fDt = 1e-6
+        aForward = -(np.log(self.oCurve.discount(self.aTenors + fDt)) -
+                     np.log(self.oCurve.discount(self.aTenors - fDt))) / \
+            (2 * fDt)
+        np.testing.assert_allclose(self.oCurve.forward(self.aTenors),
+                                   aForward, atol=1e-8)
+        np.testing.assert_allclose(
+            self.oCurve.forward_percent(self.aTenors),
+            F_0_T_eff(self.aTenors, *self.tParams), atol=1e-3)
+
+    def get_history(self, iDays):
+        """ Returns a history of curves that drift day by day. """
+        aDays = np.arange(iDays)
+        oRows = pd.DataFrame(np.tile(ROW[3:], (iDays, 1)),
+                             columns=CURVE_COLUMNS)
+        oRows['B1'] += aDays
+        oRows['G2'] -= aDays / 10
+        oRows.insert(0, 'tradedate',
+                     pd.bdate_range('2023-01-02', periods=iDays
+                                    ).strftime('%Y-%m-%d'))
+        return CurveHistory(oRows.iloc[::-1])
+
+    def test_zero_curve_history(self):
+        """ Rows of the matrix are the curves of the days. """
+        oHistory = self.get_history(10)
+        aSpot = oHistory.spot_percent(self.aTenors)
+        aForward = oHistory.forward(self.aTenors)
+        self.assertEqual(aSpot.shape, (10, 1500))
+        for i in (0, 9):
+            oCurve = oHistory.as_of(oHistory.aDates[i])
+            np.testing.assert_allclose(aSpot[i],
+                                       oCurve.spot_percent(self.aTenors))
+            np.testing.assert_allclose(aForward[i],
+                                       oCurve.forward(self.aTenors))
+
+        self.assertIsNone(oHistory.as_of('2022-12-31'))
+        self.assertEqual(oHistory.as_of('2023-01-08').fBeta0,
+                         oHistory.as_of('2023-01-06').fBeta0)
+
+        oAttribution = oHistory.attribution('2023-01-02', '2023-01-13',
+                                            [1.0, 5.0])
+        aSpot = oHistory.spot([1.0, 5.0])
+        np.testing.assert_allclose(oAttribution.loc['total'],
+                                   (aSpot[9] - aSpot[0]) * 10000)
+        np.testing.assert_allclose(oAttribution.loc['level'], [9, 9])
+
+    @unittest.skipUnless(BENCHMARK, 'set ADVISOR_BENCHMARK=1 to run')
+    def test_zero_curve_history_benchmark(self):
+        """ A year of daily curves at 1500 tenors in well under a second.
+        The benchmark is opt-in and is not a part of unit_tests.py. """
+        oHistory = self.get_history(250)
+        fSeconds = min(timeit.repeat(
+            lambda: oHistory.spot_percent(self.aTenors), number=1, repeat=3))
+        self.assertLess(fSeconds, 0.5)
+
+
+if __name__ == '__main__':
+    unittest.TextTestRunner(verbosity=2).run(suite())